@@ -0,0 +1,38 @@
+"""index_refresh_tokens_expires_at
+
+Revision ID: 3f6c2a9d8e41
+Revises: b02575c85d42
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9d8e41'
+down_revision: Union[str, Sequence[str], None] = 'b02575c85d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The expired-token purge filters and limits on expires_at; without an index every batch
+    # is a full table scan. CONCURRENTLY (outside the migration transaction) keeps logins and
+    # refreshes writing to the table while the index builds.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens', ['expires_at'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens',
+            postgresql_concurrently=True, if_exists=True,
+        )
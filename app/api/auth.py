@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
@@ -17,9 +17,13 @@ class RefreshTokenRequest(BaseModel):
 
 
 @router.post("/request-otp")
-async def request_otp(schema: RequestOtpSchema, auth_service: AuthService = Depends(get_auth_service)):
+async def request_otp(
+		schema: RequestOtpSchema,
+		response: Response,
+		auth_service: AuthService = Depends(get_auth_service),
+):
 	try:
-		return await auth_service.request_register_otp(
+		result = await auth_service.request_register_otp(
 			email = str(schema.email),
 			username = schema.username,
 			password = schema.password,
@@ -32,6 +36,10 @@ async def request_otp(schema: RequestOtpSchema, auth_service: AuthService = Depe
 		raise HTTPException(status_code = 423, detail = str(exc)) from exc
 	except EmailDeliveryError as exc:
 		raise HTTPException(status_code = 503, detail = str(exc)) from exc
+	# Queued for the background email worker: accepted, not yet delivered.
+	if result.get("delivery") == "queued":
+		response.status_code = 202
+	return result
 
 
 @router.post("/register-with-otp")
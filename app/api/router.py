@@ -2,18 +2,23 @@ import os
 import uuid
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, UploadFile
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from starlette import status
 
-from app.core.dependencies import get_current_user_id, get_file_repo, get_file_service, get_message_service, get_user_id_from_token
+from app.core.dependencies import get_current_user_id, get_file_repo, get_file_service, get_message_service
 from app.core.enums import DeviceType, MessageType
+from app.core.security import get_user_id_from_token
+from app.core.settings import settings
+from app.core.timing import StageTimer, stage, track
+from app.realtime.sse import event_stream
 from app.realtime.ws_manager import ws_manager
 from app.schemas.schemas import (
 	CompleteDirectUploadRequest,
 	DirectUploadRequest,
 	DirectUploadResponse,
 	FileMessageCreate,
+	MessageContentResponse,
 	MessageResponse,
 	TextMessageCreate,
 	TextMessageRequest,
@@ -21,6 +26,7 @@ from app.schemas.schemas import (
 from app.services.exceptions import (
 	FilePathNotFoundError,
 	FileUploadAbortedError,
+	MessageNotFoundError,
 	MessagePermissionError,
 	QuotaExceededError,
 )
@@ -60,6 +66,12 @@ def _resolve_request_user_id(token: str | None, authorization: str | None) -> in
 		raise HTTPException(status_code = 401, detail = "Invalid access token") from exc
 
 
+def _set_server_timing(response: Response, timer: StageTimer):
+	"""Expose the request's stage timings to the browser's devtools when enabled."""
+	if settings.SERVER_TIMING_ENABLED:
+		response.headers["Server-Timing"] = timer.server_timing()
+
+
 async def _file_response(file_repo: FileRepo, relative_path: str, as_download: bool, download_name: str | None = None):
 	"""Build a file response with optional download filename behavior."""
 	if hasattr(file_repo, "get_presigned_url"):
@@ -98,15 +110,61 @@ async def send_text(
 @router.get("/history", response_model = list[MessageResponse])
 async def get_history(
 		page: int = Query(1, ge = 1),
+		content_chars: int | None = Query(None, ge = 0),
+		user_id: int = Depends(get_current_user_id),
+		service: MessageService = Depends(get_message_service),
+):
+	"""Return paginated message history for current user.
+
+	The body is encoded straight from the selected columns in the MessageResponse wire
+	format; response_model only documents it. content_chars (default
+	HISTORY_CONTENT_PREVIEW_CHARS, 0 = full) cuts long text content.
+	"""
+	if content_chars is None:
+		content_chars = settings.HISTORY_CONTENT_PREVIEW_CHARS
+	body = await service.get_history_json(user_id = user_id, page = page, content_chars = content_chars)
+	return Response(content = body, media_type = "application/json")
+
+
+@router.get("/{message_id}/content", response_model = MessageContentResponse)
+async def get_message_content(
+		message_id: int,
 		user_id: int = Depends(get_current_user_id),
 		service: MessageService = Depends(get_message_service),
 ):
-	"""Return paginated message history for current user."""
-	return await service.get_history(user_id = user_id, page = page)
+	"""Full text of a message whose history entry came back with contentTruncated=true."""
+	try:
+		content = await service.get_message_content(message_id = message_id, user_id = user_id)
+	except MessageNotFoundError as exc:
+		raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = str(exc)) from exc
+	except MessagePermissionError as exc:
+		raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = str(exc)) from exc
+	return {"id":message_id, "content":content}
+
+
+@router.get("/events")
+async def message_events(
+		request: Request,
+		token: str | None = Query(None),
+		authorization: str | None = Header(None),
+		last_event_id: str | None = Header(None),
+):
+	"""Server-Sent Events stream of realtime message events (alternative to the WebSocket).
+
+	EventSource cannot set headers, so the token may be passed as ?token=<jwt>.
+	Reconnecting clients send Last-Event-ID and receive the events they missed.
+	"""
+	user_id = _resolve_request_user_id(token = token, authorization = authorization)
+	return StreamingResponse(
+		event_stream(request, ws_manager, user_id, last_event_id),
+		media_type = "text/event-stream",
+		headers = {"Cache-Control":"no-cache", "X-Accel-Buffering":"no"},
+	)
 
 
 @router.post("/upload", response_model = MessageResponse)
 async def upload_file(
+		response: Response,
 		file: UploadFile = File(...),
 		device: DeviceType = Form(DeviceType.desktop),
 		user_id: int = Depends(get_current_user_id),
@@ -117,33 +175,36 @@ async def upload_file(
 		raise HTTPException(status_code = 400, detail = "Missing filename.")
 
 	try:
-		upload_info = await service.handle_initial_upload(file)
-		extension = Path(upload_info["original_filename"]).suffix
-		final_filename = f"{user_id}/{uuid.uuid4().hex}{extension}"
-		message_type = MessageType.image if (upload_info["mime_type"] or "").startswith("image/") else MessageType.file
-
-		schema = FileMessageCreate.model_validate(
-			{
-				"user_id":user_id,
-				"device":device,
-				"type":message_type,
-				"file_size":upload_info["size_bytes"],
-				"file_type":upload_info["mime_type"] or "application/octet-stream",
-				"file_name":upload_info["original_filename"],
-				"file_path":final_filename
-			}
-		)
-		message = await service.finalize_file_message(
-			schema = schema,
-			temp_filename = upload_info["temp_filename"],
-			file_size = upload_info["size_bytes"],
-		)
-		message_id = _extract_message_id(message)
-		await ws_manager.broadcast_to_user(
-			user_id,
-			{"event":"message.updated", "message_id":message_id},
-		)
-		return message
+		with track("upload") as timer:
+			upload_info = await service.handle_initial_upload(file)
+			extension = Path(upload_info["original_filename"]).suffix
+			final_filename = f"{user_id}/{uuid.uuid4().hex}{extension}"
+			message_type = MessageType.image if (upload_info["mime_type"] or "").startswith("image/") else MessageType.file
+
+			schema = FileMessageCreate.model_validate(
+				{
+					"user_id":user_id,
+					"device":device,
+					"type":message_type,
+					"file_size":upload_info["size_bytes"],
+					"file_type":upload_info["mime_type"] or "application/octet-stream",
+					"file_name":upload_info["original_filename"],
+					"file_path":final_filename
+				}
+			)
+			message = await service.finalize_file_message(
+				schema = schema,
+				temp_filename = upload_info["temp_filename"],
+				file_size = upload_info["size_bytes"],
+			)
+			message_id = _extract_message_id(message)
+			with stage("broadcast"):
+				await ws_manager.broadcast_to_user(
+					user_id,
+					{"event":"message.updated", "message_id":message_id},
+				)
+			_set_server_timing(response, timer)
+			return message
 	except QuotaExceededError as exc:
 		raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = str(exc)) from exc
 	except (FileUploadAbortedError, FilePathNotFoundError, MessagePermissionError) as exc:
@@ -153,18 +214,22 @@ async def upload_file(
 @router.post("/upload-url", response_model = DirectUploadResponse)
 async def create_upload_url(
 		payload: DirectUploadRequest,
+		response: Response,
 		user_id: int = Depends(get_current_user_id),
 		service: FileService = Depends(get_file_service),
 ):
 	"""Create a signed R2 URL so the browser can upload directly."""
 	try:
-		return await service.create_direct_upload(
-			user_id = user_id,
-			file_name = payload.file_name,
-			file_size = payload.file_size,
-			file_type = payload.file_type,
-			device = payload.device,
-		)
+		with track("upload_url") as timer:
+			upload = await service.create_direct_upload(
+				user_id = user_id,
+				file_name = payload.file_name,
+				file_size = payload.file_size,
+				file_type = payload.file_type,
+				device = payload.device,
+			)
+			_set_server_timing(response, timer)
+			return upload
 	except QuotaExceededError as exc:
 		raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = str(exc)) from exc
 	except FileUploadAbortedError as exc:
@@ -174,29 +239,33 @@ async def create_upload_url(
 @router.post("/upload-complete", response_model = MessageResponse)
 async def complete_upload(
 		payload: CompleteDirectUploadRequest,
+		response: Response,
 		user_id: int = Depends(get_current_user_id),
 		service: FileService = Depends(get_file_service),
 ):
 	"""Persist DB metadata after the browser finishes direct R2 upload."""
 	try:
-		schema = FileMessageCreate.model_validate(
-			{
-				"user_id":user_id,
-				"device":payload.device,
-				"type":payload.type,
-				"file_size":payload.file_size,
-				"file_type":payload.file_type,
-				"file_name":payload.file_name,
-				"file_path":payload.file_path,
-			}
-		)
-		message = await service.complete_direct_upload(schema)
-		message_id = _extract_message_id(message)
-		await ws_manager.broadcast_to_user(
-			user_id,
-			{"event":"message.updated", "message_id":message_id},
-		)
-		return message
+		with track("upload_complete") as timer:
+			schema = FileMessageCreate.model_validate(
+				{
+					"user_id":user_id,
+					"device":payload.device,
+					"type":payload.type,
+					"file_size":payload.file_size,
+					"file_type":payload.file_type,
+					"file_name":payload.file_name,
+					"file_path":payload.file_path,
+				}
+			)
+			message = await service.complete_direct_upload(schema)
+			message_id = _extract_message_id(message)
+			with stage("broadcast"):
+				await ws_manager.broadcast_to_user(
+					user_id,
+					{"event":"message.updated", "message_id":message_id},
+				)
+			_set_server_timing(response, timer)
+			return message
 	except QuotaExceededError as exc:
 		raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = str(exc)) from exc
 	except (FileUploadAbortedError, FilePathNotFoundError, MessagePermissionError) as exc:
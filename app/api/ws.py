@@ -1,6 +1,8 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from app.core.dependencies import get_user_id_from_token
+from app.core.enums import DeviceType
+from app.core.security import get_user_id_from_token
+from app.realtime.encoding import negotiate_subprotocol
 from app.realtime.ws_manager import ws_manager
 
 router = APIRouter(prefix = "/ws", tags = ["realtime"])
@@ -10,8 +12,12 @@ router = APIRouter(prefix = "/ws", tags = ["realtime"])
 async def messages_ws(websocket: WebSocket):
 	"""WebSocket endpoint for per-user realtime message events.
 
-	Client must pass access token via query string: ?token=<jwt>.
+	Client must pass access token via query string: ?token=<jwt>, and may add
+	?device=phone|desktop so connection metrics can be split by device type.
 	Once connected, server can push message update/delete events to this socket.
+	Events are JSON text frames; clients offering the "sendme.msgpack" subprotocol
+	receive MessagePack binary frames instead. The server sends {"event": "ping"} after
+	a period of silence; any client frame (e.g. "pong") counts as the answer.
 	"""
 	token = websocket.query_params.get("token")
 	if not token:
@@ -24,10 +30,21 @@ async def messages_ws(websocket: WebSocket):
 		await websocket.close(code = 1008, reason = "Invalid token")
 		return
 
-	await ws_manager.connect(user_id, websocket)
+	device = websocket.query_params.get("device")
+	if device not in DeviceType.__members__:
+		device = "unknown"
+	subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+	if not await ws_manager.connect(user_id, websocket, subprotocol = subprotocol, device = device):
+		return
 	try:
 		while True:
-			# Keep connection open; client can send ping/noop.
-			await websocket.receive_text()
+			message = await websocket.receive()
+			if message["type"] == "websocket.disconnect":
+				break
+			# Any inbound frame (pong, ping or noop) proves the connection is alive.
+			ws_manager.touch(user_id, websocket)
 	except WebSocketDisconnect:
+		pass
+	finally:
+		# Also covers sockets the manager already evicted and closed as slow consumers.
 		ws_manager.disconnect(user_id, websocket)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import math
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.asgi import bearer_user_id, scope_headers, send_json_error
+from app.core.exceptions import CREDENTIALS_EXCEPTION
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class AdmissionRejected(Exception):
+	"""The upload gate is full; the client should retry after `retry_after` seconds."""
+
+	def __init__(self, reason: str, retry_after: float):
+		self.reason = reason
+		self.retry_after = retry_after
+		super().__init__(reason)
+
+
+class UploadTicket:
+	__slots__ = ("user_id", "size_bytes")
+
+	def __init__(self, user_id: Optional[int], size_bytes: int):
+		self.user_id = user_id
+		self.size_bytes = size_bytes
+
+
+class UploadAdmissionController:
+	"""Bounds concurrent uploads globally, per user and by total in-flight bytes.
+
+	Requests over a limit wait briefly in a bounded queue; when the queue is full, the
+	wait times out or the user already has too many uploads running, they are rejected.
+	"""
+
+	def __init__(
+			self,
+			max_concurrent: int = settings.UPLOAD_MAX_CONCURRENT,
+			max_per_user: int = settings.UPLOAD_MAX_CONCURRENT_PER_USER,
+			max_inflight_bytes: int = settings.UPLOAD_MAX_INFLIGHT_BYTES,
+			max_waiters: int = settings.UPLOAD_MAX_WAITERS,
+			wait_seconds: float = settings.UPLOAD_ADMISSION_WAIT_SECONDS,
+			retry_after_seconds: float = settings.UPLOAD_RETRY_AFTER_SECONDS,
+	):
+		self.max_concurrent = max_concurrent
+		self.max_per_user = max_per_user
+		self.max_inflight_bytes = max_inflight_bytes
+		self.max_waiters = max_waiters
+		self.wait_seconds = wait_seconds
+		self.retry_after_seconds = retry_after_seconds
+
+		self.in_flight = 0
+		self.in_flight_bytes = 0
+		self.waiting = 0
+		self.admitted_total = 0
+		self.rejected_total = 0
+		self._per_user: Dict[int, int] = {}
+		self._condition: Optional[asyncio.Condition] = None
+
+	def _can_admit(self, size_bytes: int) -> bool:
+		if self.in_flight >= self.max_concurrent:
+			return False
+		# A single upload larger than the byte budget is admitted only when nothing else is running.
+		return self.in_flight == 0 or self.in_flight_bytes + size_bytes <= self.max_inflight_bytes
+
+	def _user_full(self, user_id: Optional[int]) -> bool:
+		return user_id is not None and self._per_user.get(user_id, 0) >= self.max_per_user
+
+	def _reject(self, reason: str) -> AdmissionRejected:
+		self.rejected_total += 1
+		return AdmissionRejected(reason, self.retry_after_seconds)
+
+	async def acquire(self, user_id: Optional[int], size_bytes: int) -> UploadTicket:
+		if self._condition is None:
+			self._condition = asyncio.Condition()
+
+		async with self._condition:
+			if self._user_full(user_id):
+				raise self._reject("too many uploads for this user")
+			if not self._can_admit(size_bytes):
+				if self.waiting >= self.max_waiters:
+					raise self._reject("upload queue full")
+				self.waiting += 1
+				try:
+					await asyncio.wait_for(
+						self._condition.wait_for(lambda:self._can_admit(size_bytes)), timeout = self.wait_seconds
+					)
+				except asyncio.TimeoutError:
+					raise self._reject("upload queue wait timed out") from None
+				finally:
+					self.waiting -= 1
+
+				# Other uploads of the same user may have been admitted while this one waited.
+				if self._user_full(user_id):
+					raise self._reject("too many uploads for this user")
+
+			self.in_flight += 1
+			self.in_flight_bytes += size_bytes
+			if user_id is not None:
+				self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+			self.admitted_total += 1
+			return UploadTicket(user_id, size_bytes)
+
+	async def release(self, ticket: UploadTicket):
+		async with self._condition:
+			self.in_flight -= 1
+			self.in_flight_bytes -= ticket.size_bytes
+			if ticket.user_id is not None:
+				remaining = self._per_user.get(ticket.user_id, 1) - 1
+				if remaining > 0:
+					self._per_user[ticket.user_id] = remaining
+				else:
+					self._per_user.pop(ticket.user_id, None)
+			self._condition.notify_all()
+
+	def stats(self) -> dict:
+		return {
+			"in_flight":self.in_flight,
+			"in_flight_bytes":self.in_flight_bytes,
+			"waiting":self.waiting,
+			"admitted_total":self.admitted_total,
+			"rejected_total":self.rejected_total,
+		}
+
+
+class UploadAdmissionMiddleware:
+	"""Applies the admission controller to upload requests before their body is read.
+
+	FastAPI parses multipart bodies before the endpoint or its dependencies run, so the gate
+	has to sit in front of the app. The declared Content-Length is used as the upload size.
+	Requests without a valid bearer token are refused with 401 before admission.
+	"""
+
+	def __init__(self, app: ASGIApp, controller: UploadAdmissionController, paths: tuple):
+		self.app = app
+		self.controller = controller
+		self.paths = paths
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+			await self.app(scope, receive, send)
+			return
+
+		headers = scope_headers(scope)
+		try:
+			size_bytes = int(headers.get("content-length", ""))
+		except ValueError:
+			# Chunked request: assume the largest allowed file.
+			size_bytes = settings.MAX_FILE_SIZE_BYTES
+		user_id = bearer_user_id(headers)
+		if user_id is None:
+			# The route would answer 401 anyway; refusing here keeps anonymous requests from taking
+			# global slots and in-flight bytes that the per-user cap cannot account to anyone.
+			await send_json_error(
+				send, CREDENTIALS_EXCEPTION.status_code, CREDENTIALS_EXCEPTION.detail,
+				headers = [(k.lower().encode(), v.encode()) for k, v in CREDENTIALS_EXCEPTION.headers.items()],
+			)
+			return
+
+		try:
+			ticket = await self.controller.acquire(user_id, size_bytes)
+		except AdmissionRejected as exc:
+			logger.warning(
+				"upload.admission.rejected user_id=%s reason=%s stats=%s", user_id, exc.reason, self.controller.stats()
+			)
+			await send_json_error(
+				send, 503, "Server is busy with other uploads. Please retry.",
+				headers = [(b"retry-after", str(max(1, math.ceil(exc.retry_after))).encode())],
+			)
+			return
+
+		try:
+			await self.app(scope, receive, send)
+		finally:
+			await self.controller.release(ticket)
+
+
+upload_admission = UploadAdmissionController()
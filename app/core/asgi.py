@@ -0,0 +1,39 @@
+"""Helpers shared by the plain ASGI middlewares (rate limiting, upload admission)."""
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.types import Scope, Send
+
+from app.core.security import get_user_id_from_token
+
+
+def scope_headers(scope: Scope) -> Dict[str, str]:
+	return {k.decode("latin-1"):v.decode("latin-1") for k, v in scope["headers"]}
+
+
+def bearer_user_id(headers: Dict[str, str]) -> Optional[int]:
+	"""User id from a valid bearer token, or None; verifications are cached, so the route's own check is free."""
+	authorization = headers.get("authorization", "")
+	if not authorization.lower().startswith("bearer "):
+		return None
+	try:
+		return get_user_id_from_token(authorization.split(" ", 1)[1])
+	except ValueError:
+		return None
+
+
+async def send_json_error(
+		send: Send, status: int, detail: str, headers: Iterable[Tuple[bytes, bytes]] = ()
+):
+	"""Answer a request directly from middleware with a FastAPI-style {"detail": ...} body."""
+	body = json.dumps({"detail":detail}).encode()
+	await send({
+		"type":"http.response.start",
+		"status":status,
+		"headers":[
+			(b"content-type", b"application/json"),
+			(b"content-length", str(len(body)).encode()),
+			*headers,
+		],
+	})
+	await send({"type":"http.response.body", "body":body})
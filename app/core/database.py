@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
+from app.core.query_metrics import instrument_engine
 from app.core.settings import settings
 
 
@@ -20,6 +21,7 @@ engine = create_async_engine(
 		"statement_cache_size":0
 	}
 )
+instrument_engine(engine)
 SessionLocal = async_sessionmaker(bind = engine, class_ = AsyncSession, expire_on_commit = False)
 
 Base = declarative_base()
@@ -1,14 +1,15 @@
 from pathlib import Path
+from typing import Optional
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
 from app.core.exceptions import CREDENTIALS_EXCEPTION
 from app.core.orm_models import User
 from app.core.settings import settings
+from app.core.security import get_user_id_from_token
 from app.services.account_service import AccountService
 from app.services.auth_service import AuthService
 from app.services.file_service import FileService
@@ -16,7 +17,10 @@ from app.services.message_service import MessageService
 from app.storage.exceptions import UserNotFoundErrorById
 from app.storage.file_repo import FileRepo
 from app.storage.r2_repo import R2FileRepo
+from app.storage.abstract_metadata_repo import AbstractRefreshTokenRepository
+from app.storage.email_outbox import EmailOutbox
 from app.storage.redis_repo import RedisRepo
+from app.storage.redis_token_repo import RedisRefreshTokenRepository
 from app.storage.sqlalchemy_repo import MessageRepository, RefreshTokenRepository, UserRepository
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl = "/api/v1/auth/login")
@@ -30,14 +34,21 @@ def get_message_repository(db: AsyncSession = Depends(get_db)) -> MessageReposit
 	return MessageRepository(db)
 
 
-def get_refresh_token_repository(db: AsyncSession = Depends(get_db)) -> RefreshTokenRepository:
-	return RefreshTokenRepository(db)
-
-
 def get_redis_repo() -> RedisRepo:
 	return RedisRepo(settings.REDIS_URL)
 
 
+def get_refresh_token_repository(
+		db: AsyncSession = Depends(get_db),
+		redis_repo: RedisRepo = Depends(get_redis_repo),
+) -> AbstractRefreshTokenRepository:
+	sql_repo = RefreshTokenRepository(db)
+	if settings.REFRESH_TOKEN_BACKEND.lower() == "redis":
+		fallback = sql_repo if settings.REFRESH_TOKEN_SQL_FALLBACK else None
+		return RedisRefreshTokenRepository(redis_repo.client, fallback = fallback)
+	return sql_repo
+
+
 def get_file_repo() -> R2FileRepo | FileRepo:
 	if settings.STORAGE_BACKEND.lower() == "r2":
 		missing = [
@@ -64,12 +75,21 @@ def get_file_repo() -> R2FileRepo | FileRepo:
 	return FileRepo(upload_dir = Path(settings.UPLOAD_DIR))
 
 
+def get_email_outbox(redis_repo: RedisRepo = Depends(get_redis_repo)) -> Optional[EmailOutbox]:
+	if not settings.EMAIL_OUTBOX_ENABLED:
+		return None
+	return EmailOutbox(redis_repo.client)
+
+
 def get_auth_service(
 		user_repo: UserRepository = Depends(get_user_repository),
-		token_repo: RefreshTokenRepository = Depends(get_refresh_token_repository),
+		token_repo: AbstractRefreshTokenRepository = Depends(get_refresh_token_repository),
 		redis_repo: RedisRepo = Depends(get_redis_repo),
+		email_outbox: Optional[EmailOutbox] = Depends(get_email_outbox),
 ) -> AuthService:
-	return AuthService(user_repo = user_repo, token_repo = token_repo, redis_repo = redis_repo)
+	return AuthService(
+		user_repo = user_repo, token_repo = token_repo, redis_repo = redis_repo, email_outbox = email_outbox
+	)
 
 
 def get_file_service(
@@ -88,7 +108,7 @@ def get_file_service(
 def get_account_service(
 		user_repo: UserRepository = Depends(get_user_repository),
 		message_repo: MessageRepository = Depends(get_message_repository),
-		token_repo: RefreshTokenRepository = Depends(get_refresh_token_repository),
+		token_repo: AbstractRefreshTokenRepository = Depends(get_refresh_token_repository),
 		file_service: FileService = Depends(get_file_service),
 		redis_repo: RedisRepo = Depends(get_redis_repo),
 ) -> AccountService:
@@ -118,23 +138,10 @@ def get_message_service(
 async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
 	try:
 		return get_user_id_from_token(token)
-	except (JWTError, ValueError, TypeError):
+	except ValueError:
 		raise CREDENTIALS_EXCEPTION
 
 
-def get_user_id_from_token(token: str) -> int:
-	try:
-		payload = jwt.decode(token, settings.SECRET_KEY, algorithms = [settings.ALGORITHM])
-		if payload.get("type") != "access":
-			raise ValueError("Invalid token type")
-		user_id = payload.get("sub")
-		if user_id is None:
-			raise ValueError("Missing user id")
-		return int(user_id)
-	except (JWTError, ValueError, TypeError):
-		raise ValueError("Invalid access token")
-
-
 async def get_current_user(
 		user_id: int = Depends(get_current_user_id),
 		user_repo: UserRepository = Depends(get_user_repository),
@@ -18,3 +18,11 @@ class MessageStatus(StrEnum):
 class DeviceType(StrEnum):
 	phone = "phone"
 	desktop = "desktop"
+
+
+class OtpStatus(StrEnum):
+	"""Outcome of an atomic OTP step in Redis."""
+	ok = "ok"
+	locked = "locked"
+	cooldown = "cooldown"
+	invalid = "invalid"
@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+T = TypeVar("T")
+
+
+class InstrumentedThreadPool(Executor):
+	"""Thread pool that tracks queue depth, active workers and time spent waiting for a thread.
+
+	Works anywhere an Executor is accepted (loop.run_in_executor, aiofiles' `executor=`).
+	Worker threads are started on first use; after shutdown() the next submit starts a new pool.
+	"""
+
+	def __init__(self, name: str, max_workers: int):
+		self.name = name
+		self.max_workers = max_workers
+		self.queued = 0
+		self.active = 0
+		self.completed = 0
+		self.wait_seconds_total = 0.0
+		self.wait_seconds_max = 0.0
+		self._stats_lock = threading.Lock()
+		self._pool: Optional[ThreadPoolExecutor] = None
+
+	def _get_pool(self) -> ThreadPoolExecutor:
+		with self._stats_lock:
+			if self._pool is None:
+				self._pool = ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = f"sendme-{self.name}")
+			return self._pool
+
+	def submit(self, fn, /, *args, **kwargs) -> Future:
+		submitted_at = time.perf_counter()
+		started = False
+
+		def _timed():
+			nonlocal started
+			started = True
+			waited = time.perf_counter() - submitted_at
+			with self._stats_lock:
+				self.queued -= 1
+				self.active += 1
+				self.wait_seconds_total += waited
+				self.wait_seconds_max = max(self.wait_seconds_max, waited)
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				with self._stats_lock:
+					self.active -= 1
+					self.completed += 1
+
+		def _on_done(future: Future):
+			# Cancelled before a worker picked it up: it never left the queue through _timed.
+			if not started:
+				with self._stats_lock:
+					self.queued -= 1
+
+		pool = self._get_pool()
+		with self._stats_lock:
+			self.queued += 1
+		try:
+			future = pool.submit(_timed)
+		except RuntimeError:
+			with self._stats_lock:
+				self.queued -= 1
+			raise
+		future.add_done_callback(_on_done)
+		return future
+
+	def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+		with self._stats_lock:
+			pool, self._pool = self._pool, None
+		if pool is not None:
+			pool.shutdown(wait = wait, cancel_futures = cancel_futures)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._stats_lock:
+			return {
+				"max_workers":self.max_workers,
+				"queued":self.queued,
+				"active":self.active,
+				"completed":self.completed,
+				"wait_seconds_total":self.wait_seconds_total,
+				"wait_ms_avg":round(self.wait_seconds_total / self.completed * 1000, 3) if self.completed else 0.0,
+				"wait_ms_max":round(self.wait_seconds_max * 1000, 3),
+			}
+
+
+# Local disk reads/writes/renames (uploads, temp files).
+disk_executor = InstrumentedThreadPool("disk", settings.EXECUTOR_DISK_WORKERS)
+# Blocking object-storage SDK calls (boto3 uploads, presigning, head/get/delete).
+storage_executor = InstrumentedThreadPool("storage", settings.EXECUTOR_STORAGE_WORKERS)
+# CPU-bound work that releases the GIL (bcrypt).
+cpu_executor = InstrumentedThreadPool("cpu", settings.EXECUTOR_CPU_WORKERS)
+
+EXECUTORS = (disk_executor, storage_executor, cpu_executor)
+
+
+async def run_in(executor: Executor, func: Callable[..., T], *args, **kwargs) -> T:
+	"""Run a blocking call on a specific pool instead of the loop's shared default executor.
+
+	Like asyncio.to_thread, the call sees the caller's contextvars.
+	"""
+	loop = asyncio.get_running_loop()
+	context = contextvars.copy_context()
+	return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+	return {executor.name:executor.stats() for executor in EXECUTORS}
+
+
+def log_executor_stats():
+	for name, stats in executor_stats().items():
+		logger.info(
+			"executor.stats name=%s queued=%s active=%s completed=%s wait_ms_avg=%s wait_ms_max=%s",
+			name, stats["queued"], stats["active"], stats["completed"], stats["wait_ms_avg"], stats["wait_ms_max"],
+		)
+
+
+def shutdown_executors(wait: bool = True):
+	"""Stop the worker threads of every pool; used on application shutdown."""
+	for executor in EXECUTORS:
+		executor.shutdown(wait = wait)
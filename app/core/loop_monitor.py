@@ -0,0 +1,106 @@
+"""Event-loop lag monitor and blocking-call detector.
+
+A task sleeps for a fixed interval and records how late it wakes up: the lag is the time
+other callbacks held the loop. With LOOP_BLOCKING_DEBUG a watchdog thread also watches that
+task's heartbeat; once it is overdue by LOOP_BLOCKING_THRESHOLD_SECONDS the loop thread's
+current stack is logged, which names the synchronous call that is blocking it.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.metrics import registry
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+LOOP_LAG = registry.histogram(
+	"sendme_event_loop_lag_seconds",
+	"How late the event loop ran a timer callback (time spent in other callbacks).",
+	buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_BLOCKED = registry.counter(
+	"sendme_event_loop_blocked_total",
+	"Stalls longer than LOOP_BLOCKING_THRESHOLD_SECONDS seen by the watchdog (debug mode).",
+)
+
+
+class LoopMonitor:
+	def __init__(
+			self,
+			interval_seconds: float = settings.LOOP_MONITOR_INTERVAL_SECONDS,
+			capture_stacks: bool = settings.LOOP_BLOCKING_DEBUG,
+			block_threshold_seconds: float = settings.LOOP_BLOCKING_THRESHOLD_SECONDS,
+	):
+		self.interval_seconds = interval_seconds
+		self.capture_stacks = capture_stacks
+		self.block_threshold_seconds = block_threshold_seconds
+		self.max_lag_seconds = 0.0
+		self._heartbeat = time.monotonic()
+		self._loop_thread_id: Optional[int] = None
+		self._task: Optional[asyncio.Task] = None
+		self._watchdog: Optional[threading.Thread] = None
+		self._stop = threading.Event()
+
+	def start(self):
+		if self._task is not None:
+			return
+		self._loop_thread_id = threading.get_ident()
+		self._heartbeat = time.monotonic()
+		self._stop.clear()
+		self._task = asyncio.get_running_loop().create_task(self._run())
+		if self.capture_stacks:
+			self._watchdog = threading.Thread(target = self._watch, name = "loop-watchdog", daemon = True)
+			self._watchdog.start()
+
+	async def stop(self):
+		self._stop.set()
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		if self._watchdog is not None:
+			self._watchdog.join(timeout = 1)
+			self._watchdog = None
+
+	async def _run(self):
+		while True:
+			expected = time.monotonic() + self.interval_seconds
+			await asyncio.sleep(self.interval_seconds)
+			now = time.monotonic()
+			lag = max(0.0, now - expected)
+			self._heartbeat = now
+			self.max_lag_seconds = max(self.max_lag_seconds, lag)
+			LOOP_LAG.observe(lag)
+
+	def _watch(self):
+		# The heartbeat is due every interval; anything later than that plus the threshold is a stall.
+		overdue_after = self.interval_seconds + self.block_threshold_seconds
+		reported = None
+		while not self._stop.wait(self.block_threshold_seconds / 2):
+			heartbeat = self._heartbeat
+			stalled = time.monotonic() - heartbeat
+			if stalled < overdue_after or heartbeat == reported:
+				continue
+			# One report per stall: the same heartbeat stays stale until the loop runs again.
+			reported = heartbeat
+			frame = sys._current_frames().get(self._loop_thread_id)
+			if frame is None:
+				continue
+			LOOP_BLOCKED.inc()
+			logger.warning(
+				"loop.blocked stalled_ms=%.0f stack:\n%s",
+				(stalled - self.interval_seconds) * 1000,
+				"".join(traceback.format_stack(frame)),
+			)
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,391 @@
+"""In-process metrics with Prometheus text exposition.
+
+Metrics are plain per-process counters updated from the event loop without locks. With
+several uvicorn workers, each worker periodically writes a snapshot to a shared directory
+(METRICS_MULTIPROCESS_DIR) and a scrape merges all live snapshots.
+"""
+
+import bisect
+import json
+import logging
+import math
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.executors import disk_executor, run_in
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds; roughly the Prometheus client defaults, extended for slow uploads.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (metric name, help, labels, value[, multiprocess mode]) produced at scrape time by a collector.
+CollectedSample = Tuple
+# How a gauge's per-worker values combine: "sum" for amounts (connections, queued tasks),
+# "max"/"min" for extremes and per-worker settings, which must not be added up.
+GAUGE_MERGE_MODES = ("sum", "max", "min")
+
+
+class _Metric:
+	type = ""
+
+	def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+		self.name = name
+		self.documentation = documentation
+		self.labelnames = tuple(labelnames)
+		self._children: Dict[Tuple[str, ...], object] = {}
+
+	def labels(self, *values):
+		"""The child for one label combination; callers on hot paths may keep it."""
+		key = tuple(str(value) for value in values)
+		child = self._children.get(key)
+		if child is None:
+			if len(key) != len(self.labelnames):
+				raise ValueError(f"{self.name} expects labels {self.labelnames}")
+			child = self._children[key] = self._new_child()
+		return child
+
+	def _new_child(self):
+		raise NotImplementedError
+
+	def snapshot(self) -> dict:
+		return {
+			"type":self.type,
+			"help":self.documentation,
+			"labelnames":list(self.labelnames),
+			"samples":{json.dumps(key):child.value() for key, child in self._children.items()},
+		}
+
+
+class _Value:
+	__slots__ = ("_value",)
+
+	def __init__(self):
+		self._value = 0.0
+
+	def inc(self, amount: float = 1):
+		self._value += amount
+
+	def dec(self, amount: float = 1):
+		self._value -= amount
+
+	def set(self, value: float):
+		self._value = value
+
+	def value(self) -> float:
+		return self._value
+
+
+class Counter(_Metric):
+	type = "counter"
+
+	def _new_child(self):
+		return _Value()
+
+	def inc(self, amount: float = 1):
+		self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+	type = "gauge"
+
+	def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), multiprocess_mode: str = "sum"):
+		super().__init__(name, documentation, labelnames)
+		if multiprocess_mode not in GAUGE_MERGE_MODES:
+			raise ValueError(f"{name}: unknown multiprocess_mode {multiprocess_mode!r}")
+		self.multiprocess_mode = multiprocess_mode
+
+	def snapshot(self) -> dict:
+		return {**super().snapshot(), "merge":self.multiprocess_mode}
+
+	def _new_child(self):
+		return _Value()
+
+	def inc(self, amount: float = 1):
+		self.labels().inc(amount)
+
+	def dec(self, amount: float = 1):
+		self.labels().dec(amount)
+
+	def set(self, value: float):
+		self.labels().set(value)
+
+
+class _HistogramValue:
+	__slots__ = ("_bounds", "_counts", "_sum")
+
+	def __init__(self, bounds: Tuple[float, ...]):
+		self._bounds = bounds
+		# One slot per bucket plus +Inf; made cumulative when rendered.
+		self._counts = [0] * (len(bounds) + 1)
+		self._sum = 0.0
+
+	def observe(self, value: float):
+		self._counts[bisect.bisect_left(self._bounds, value)] += 1
+		self._sum += value
+
+	def value(self) -> list:
+		return [*self._counts, self._sum]
+
+
+class Histogram(_Metric):
+	type = "histogram"
+
+	def __init__(
+			self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+			buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+	):
+		super().__init__(name, documentation, labelnames)
+		self.buckets = tuple(sorted(buckets))
+
+	def _new_child(self):
+		return _HistogramValue(self.buckets)
+
+	def observe(self, value: float):
+		self.labels().observe(value)
+
+	def snapshot(self) -> dict:
+		return {**super().snapshot(), "buckets":list(self.buckets)}
+
+
+class MetricsRegistry:
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+		self._collectors: List[Callable[[], Iterable[CollectedSample]]] = []
+
+	def _register(self, metric: _Metric) -> _Metric:
+		existing = self._metrics.get(metric.name)
+		if existing is not None:
+			return existing
+		self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+		return self._register(Counter(name, documentation, labelnames))
+
+	def gauge(
+			self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), multiprocess_mode: str = "sum",
+	) -> Gauge:
+		return self._register(Gauge(name, documentation, labelnames, multiprocess_mode))
+
+	def histogram(
+			self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+			buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+	) -> Histogram:
+		return self._register(Histogram(name, documentation, labelnames, buckets))
+
+	def add_collector(self, collector: Callable[[], Iterable[CollectedSample]]):
+		"""Register a callable read at scrape/flush time (e.g. connection counts) as gauges.
+
+		Samples may carry a fifth element, the gauge's multiprocess mode (default "sum").
+		"""
+		self._collectors.append(collector)
+
+	def snapshot(self) -> Dict[str, dict]:
+		snapshot = {name:metric.snapshot() for name, metric in self._metrics.items()}
+		for collector in self._collectors:
+			try:
+				samples = list(collector())
+			except Exception:
+				logger.exception("metrics.collector_failed collector=%r", collector)
+				continue
+			for name, documentation, labels, value, *mode in samples:
+				entry = snapshot.setdefault(name, {
+					"type":"gauge", "help":documentation, "labelnames":sorted(labels), "samples":{},
+					"merge":mode[0] if mode else "sum",
+				})
+				key = json.dumps([str(labels[label]) for label in entry["labelnames"]])
+				entry["samples"][key] = float(value)
+		return snapshot
+
+
+_GAUGE_MERGE = {"sum":lambda a, b:a + b, "max":max, "min":min}
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, dict]]) -> Dict[str, dict]:
+	"""Combine per-worker snapshots.
+
+	Counters and histogram buckets add up; gauges combine by their multiprocess mode.
+	"""
+	merged: Dict[str, dict] = {}
+	for snapshot in snapshots:
+		for name, entry in snapshot.items():
+			target = merged.get(name)
+			if target is None:
+				merged[name] = {**entry, "samples":dict(entry["samples"])}
+				continue
+			combine = _GAUGE_MERGE[target.get("merge", "sum")] if target["type"] == "gauge" else _GAUGE_MERGE["sum"]
+			for key, value in entry["samples"].items():
+				current = target["samples"].get(key)
+				if current is None:
+					target["samples"][key] = value
+				elif isinstance(value, list):
+					target["samples"][key] = [a + b for a, b in zip(current, value)]
+				else:
+					target["samples"][key] = combine(current, value)
+	return merged
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+	parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+	if extra:
+		parts.append(extra)
+	return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+	if value == math.inf:
+		return "+Inf"
+	if float(value).is_integer():
+		return str(int(value))
+	return repr(float(value))
+
+
+def render(snapshot: Dict[str, dict]) -> str:
+	"""Prometheus text exposition format (version 0.0.4)."""
+	lines = []
+	for name in sorted(snapshot):
+		entry = snapshot[name]
+		labelnames = entry["labelnames"]
+		lines.append(f"# HELP {name} {entry['help']}")
+		lines.append(f"# TYPE {name} {entry['type']}")
+		for key in sorted(entry["samples"]):
+			values = json.loads(key)
+			value = entry["samples"][key]
+			if entry["type"] != "histogram":
+				lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+				continue
+			*counts, total = value
+			cumulative = 0
+			for bound, count in zip([*entry["buckets"], math.inf], counts):
+				cumulative += count
+				le = f'le="{_format_value(bound)}"'
+				lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+			lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+			lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+	return "\n".join(lines) + "\n"
+
+
+class MultiprocessStore:
+	"""Per-worker snapshot files in a shared directory, merged on scrape."""
+
+	def __init__(self, directory: str, stale_seconds: float):
+		self.directory = Path(directory)
+		self.stale_seconds = stale_seconds
+		self.path = self.directory / f"worker-{os.getpid()}.json"
+
+	def write(self, snapshot: Dict[str, dict]):
+		self.directory.mkdir(parents = True, exist_ok = True)
+		temp_path = self.path.with_suffix(".tmp")
+		temp_path.write_text(json.dumps(snapshot))
+		os.replace(temp_path, self.path)
+
+	def read_all(self) -> List[Dict[str, dict]]:
+		snapshots = []
+		now = time.time()
+		for path in self.directory.glob("worker-*.json"):
+			try:
+				# Workers that stopped flushing (crashed) are left out instead of freezing their numbers.
+				if path != self.path and now - path.stat().st_mtime > self.stale_seconds:
+					continue
+				snapshots.append(json.loads(path.read_text()))
+			except (OSError, ValueError):
+				continue
+		return snapshots
+
+	def exchange(self, snapshot: Dict[str, dict]) -> Dict[str, dict]:
+		"""Publish this worker's snapshot and return the merge of every live worker's."""
+		self.write(snapshot)
+		return merge_snapshots(self.read_all())
+
+	def remove(self):
+		try:
+			self.path.unlink()
+		except FileNotFoundError:
+			pass
+
+
+registry = MetricsRegistry()
+_store: Optional[MultiprocessStore] = None
+
+
+def get_multiprocess_store() -> Optional[MultiprocessStore]:
+	global _store
+	if _store is None and settings.METRICS_MULTIPROCESS_DIR:
+		_store = MultiprocessStore(
+			settings.METRICS_MULTIPROCESS_DIR, stale_seconds = settings.METRICS_FLUSH_INTERVAL_SECONDS * 5
+		)
+	return _store
+
+
+async def flush_metrics() -> int:
+	"""Write this worker's snapshot for the other workers' scrapes (multiprocess mode only)."""
+	store = get_multiprocess_store()
+	if store is not None:
+		await run_in(disk_executor, store.write, registry.snapshot())
+	return 0
+
+
+async def render_metrics() -> str:
+	# Snapshots are taken on the event loop (which owns the metric values); file I/O is not.
+	snapshot = registry.snapshot()
+	store = get_multiprocess_store()
+	if store is not None:
+		snapshot = await run_in(disk_executor, store.exchange, snapshot)
+	return render(snapshot)
+
+
+REQUEST_DURATION = registry.histogram(
+	"sendme_http_request_duration_seconds",
+	"HTTP request duration by route template, method and status.",
+	("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+	"sendme_http_requests_in_flight", "HTTP requests currently being handled.", ("method",)
+)
+
+
+class MetricsMiddleware:
+	"""Records request duration per route template and the number of in-flight requests.
+
+	The route template (e.g. /api/v1/messages/{message_id}) comes from the matched route, so
+	label cardinality stays bounded; unmatched paths share one label.
+	"""
+
+	def __init__(self, app: ASGIApp, exclude_paths: Tuple[str, ...] = ()):
+		self.app = app
+		self.exclude_paths = exclude_paths
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+			await self.app(scope, receive, send)
+			return
+
+		method = scope["method"]
+		in_flight = REQUESTS_IN_FLIGHT.labels(method)
+		status = 500
+
+		async def send_with_status(message):
+			nonlocal status
+			if message["type"] == "http.response.start":
+				status = message["status"]
+			await send(message)
+
+		in_flight.inc()
+		started_at = time.perf_counter()
+		try:
+			await self.app(scope, receive, send_with_status)
+		finally:
+			in_flight.dec()
+			route = scope.get("route")
+			template = getattr(route, "path", None) or "<unmatched>"
+			REQUEST_DURATION.labels(method, template, status).observe(time.perf_counter() - started_at)
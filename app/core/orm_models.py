@@ -74,7 +74,8 @@ class RefreshToken(Base):
 	__tablename__ = "refresh_tokens"
 	jti = Column(String(36), primary_key = True, index = True, nullable = False)
 	user_id = Column(Integer, ForeignKey("users.id"), nullable = False)
-	expires_at = Column(DateTime(timezone = True), nullable = False)
+	# Indexed for the batched purge of expired tokens (WHERE expires_at <= now() LIMIT n).
+	expires_at = Column(DateTime(timezone = True), nullable = False, index = True)
 	created_at = Column(DateTime(timezone = True), default = datetime.now(timezone.utc), server_default = func.now())
 	user = relationship("User", back_populates = "refresh_tokens")
 
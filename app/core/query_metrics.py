@@ -0,0 +1,159 @@
+"""SQLAlchemy statement instrumentation: timings, per-request query counts, slow-query log.
+
+instrument_engine() hooks cursor execution on an engine. Every statement is timed into a
+histogram keyed by its normalized SQL; statements slower than DB_SLOW_QUERY_SECONDS are
+logged with their bound parameters redacted to types. count_queries() (used by
+QueryCountMiddleware and tests) counts the statements issued in the current context.
+"""
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.metrics import registry
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+_STATEMENT_LABEL_MAX = 200
+
+STATEMENT_DURATION = registry.histogram(
+	"sendme_db_statement_duration_seconds",
+	"Database statement execution time by normalized SQL.",
+	("statement",),
+	buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+QUERIES_PER_REQUEST = registry.histogram(
+	"sendme_db_queries_per_request",
+	"Number of database statements issued while handling one HTTP request.",
+	("method", "route"),
+	buckets = (0, 1, 2, 3, 4, 5, 8, 12, 20, 50),
+)
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_NUMBERED_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize = 1024)
+def normalize_sql(statement: str) -> str:
+	"""Reduce a statement to its shape: placeholders and literals become ?, IN lists collapse."""
+	normalized = _WHITESPACE.sub(" ", statement).strip()
+	normalized = _STRING_LITERAL.sub("?", normalized)
+	normalized = _NUMBERED_PLACEHOLDER.sub("?", normalized)
+	normalized = _NUMBER_LITERAL.sub("?", normalized)
+	normalized = _PLACEHOLDER_LIST.sub("(?)", normalized)
+	return normalized[:_STATEMENT_LABEL_MAX]
+
+
+def redact_parameters(parameters) -> str:
+	"""Describe bound parameters by type (and length for strings/bytes) without their values."""
+
+	def describe(value) -> str:
+		if value is None:
+			return "None"
+		if isinstance(value, (str, bytes)):
+			return f"{type(value).__name__}[{len(value)}]"
+		return type(value).__name__
+
+	if isinstance(parameters, dict):
+		return "{" + ", ".join(f"{key}: {describe(value)}" for key, value in parameters.items()) + "}"
+	if isinstance(parameters, (list, tuple)):
+		if parameters and isinstance(parameters[0], (dict, list, tuple)):
+			# executemany: describe the first row only.
+			return f"{len(parameters)} rows of {redact_parameters(parameters[0])}"
+		return "(" + ", ".join(describe(value) for value in parameters) + ")"
+	return describe(parameters)
+
+
+class QueryCounter:
+	__slots__ = ("count", "seconds")
+
+	def __init__(self):
+		self.count = 0
+		self.seconds = 0.0
+
+
+_current_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default = None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+	"""Count the statements executed in this context (the request task and its session greenlets)."""
+	counter = QueryCounter()
+	token = _current_counter.set(counter)
+	try:
+		yield counter
+	finally:
+		_current_counter.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+	started = conn.info.get("query_started_at")
+	if not started:
+		return
+	duration = time.perf_counter() - started.pop()
+	STATEMENT_DURATION.labels(normalize_sql(statement)).observe(duration)
+	counter = _current_counter.get()
+	if counter is not None:
+		counter.count += 1
+		counter.seconds += duration
+	threshold = settings.DB_SLOW_QUERY_SECONDS
+	if 0 < threshold <= duration:
+		logger.warning(
+			"db.slow_query duration_ms=%.1f statement=%s params=%s",
+			duration * 1000,
+			_WHITESPACE.sub(" ", statement).strip(),
+			redact_parameters(parameters),
+		)
+
+
+def _handle_error(exception_context):
+	# A failed statement never reaches after_cursor_execute; drop its start time.
+	started = exception_context.connection.info.get("query_started_at") \
+		if exception_context.connection is not None else None
+	if started:
+		started.pop()
+
+
+def instrument_engine(engine) -> Engine:
+	"""Attach the hooks to an Engine or AsyncEngine (idempotent)."""
+	sync_engine = getattr(engine, "sync_engine", engine)
+	if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+		event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+		event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+		event.listen(sync_engine, "handle_error", _handle_error)
+	return sync_engine
+
+
+class QueryCountMiddleware:
+	"""Counts the statements each HTTP request issues, per route template."""
+
+	def __init__(self, app: ASGIApp):
+		self.app = app
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		with count_queries() as counter:
+			try:
+				await self.app(scope, receive, send)
+			finally:
+				route = scope.get("route")
+				template = getattr(route, "path", None) or "<unmatched>"
+				QUERIES_PER_REQUEST.labels(scope["method"], template).observe(counter.count)
@@ -0,0 +1,251 @@
+import ipaddress
+import logging
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from redis import asyncio as aioredis
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.asgi import bearer_user_id, scope_headers, send_json_error
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Token bucket stored as a hash {tokens, ts}; refilled lazily on each call.
+# KEYS: bucket | ARGV: capacity, refill per second, now (seconds), cost
+# Returns {allowed, remaining tokens, milliseconds until the next token}.
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+	tokens = tokens - cost
+	allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+local wait_ms = 0
+if tokens < cost then
+	wait_ms = math.ceil((cost - tokens) / rate * 1000)
+end
+return {allowed, math.floor(tokens), wait_ms}
+"""
+
+
+class RateLimitRule:
+	"""A route group's bucket: `capacity` requests of burst, refilled evenly over `period_seconds`."""
+
+	__slots__ = ("name", "capacity", "period_seconds", "per")
+
+	def __init__(self, name: str, capacity: int, period_seconds: float, per: str = "user"):
+		self.name = name
+		self.capacity = capacity
+		self.period_seconds = period_seconds
+		# "user" falls back to the client IP for unauthenticated requests; "ip" always uses the IP.
+		self.per = per
+
+	@property
+	def refill_rate(self) -> float:
+		return self.capacity / self.period_seconds
+
+	@classmethod
+	def parse(cls, name: str, spec: str, per: str = "user") -> Optional["RateLimitRule"]:
+		"""Build a rule from a "<requests>/<seconds>" setting; empty or "0/..." disables the group."""
+		if not spec:
+			return None
+		capacity, _, period = spec.partition("/")
+		if int(capacity) <= 0:
+			return None
+		return cls(name, int(capacity), float(period or 60), per)
+
+
+class RateLimitResult:
+	__slots__ = ("allowed", "limit", "remaining", "retry_after", "reset")
+
+	def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float, reset: float):
+		self.allowed = allowed
+		self.limit = limit
+		self.remaining = remaining
+		self.retry_after = retry_after
+		self.reset = reset
+
+
+class LocalTokenBuckets:
+	"""In-process buckets used while Redis is unavailable (approximate: per worker, not global)."""
+
+	def __init__(self, max_keys: int = 10000):
+		self.max_keys = max_keys
+		self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+	def take(self, key: str, capacity: int, rate: float, now: float, cost: int = 1) -> Tuple[bool, int, int]:
+		tokens, ts = self._buckets.pop(key, (capacity, now))
+		tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+		allowed = tokens >= cost
+		if allowed:
+			tokens -= cost
+		self._buckets[key] = (tokens, now)
+		while len(self._buckets) > self.max_keys:
+			self._buckets.popitem(last = False)
+		wait_ms = 0 if tokens >= cost else math.ceil((cost - tokens) / rate * 1000)
+		return allowed, math.floor(tokens), wait_ms
+
+
+class RateLimiter:
+	"""Token-bucket limiter evaluated in one Redis round-trip, with an in-process fallback."""
+
+	def __init__(
+			self,
+			rules: List[Tuple[str, str, RateLimitRule]],
+			redis_client: Optional[aioredis.Redis] = None,
+			redis_retry_seconds: float = 5,
+	):
+		# (method, path prefix, rule); the first match wins.
+		self.rules = rules
+		self._redis = redis_client
+		self._script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT) if redis_client is not None else None
+		self._local = LocalTokenBuckets()
+		self._redis_retry_seconds = redis_retry_seconds
+		self._redis_down_until = 0.0
+
+	def match(self, method: str, path: str) -> Optional[RateLimitRule]:
+		for rule_method, prefix, rule in self.rules:
+			if (rule_method == "*" or rule_method == method) and path.startswith(prefix):
+				return rule
+		return None
+
+	async def hit(self, rule: RateLimitRule, identity: str, now: Optional[float] = None) -> RateLimitResult:
+		now = time.time() if now is None else now
+		key = f"ratelimit:{rule.name}:{identity}"
+		allowed, remaining, wait_ms = await self._take(key, rule, now)
+		missing = rule.capacity - remaining
+		return RateLimitResult(
+			allowed = bool(allowed),
+			limit = rule.capacity,
+			remaining = remaining,
+			retry_after = wait_ms / 1000,
+			reset = missing / rule.refill_rate,
+		)
+
+	async def _take(self, key: str, rule: RateLimitRule, now: float) -> Tuple[int, int, int]:
+		if self._script is not None and now >= self._redis_down_until:
+			try:
+				allowed, remaining, wait_ms = await self._script(
+					keys = [key], args = [rule.capacity, rule.refill_rate, now, 1]
+				)
+				return int(allowed), int(remaining), int(wait_ms)
+			except Exception as e:
+				# Degrade to per-process buckets and retry Redis after a short pause.
+				self._redis_down_until = now + self._redis_retry_seconds
+				logger.warning("ratelimit.redis_unavailable error=%s fallback=local", e)
+		return self._local.take(key, rule.capacity, rule.refill_rate, now)
+
+
+@lru_cache(maxsize = 8)
+def _trusted_networks(spec: str) -> Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], ...]:
+	return tuple(ipaddress.ip_network(item.strip(), strict = False) for item in spec.split(",") if item.strip())
+
+
+def _is_trusted_proxy(host: str) -> bool:
+	try:
+		address = ipaddress.ip_address(host)
+	except ValueError:
+		return False
+	return any(address in network for network in _trusted_networks(settings.RATE_LIMIT_TRUSTED_PROXIES))
+
+
+def _client_ip(scope: Scope, headers: Dict[str, str]) -> str:
+	client = scope.get("client")
+	peer = client[0] if client else "unknown"
+	if not settings.RATE_LIMIT_TRUST_FORWARDED_FOR or "x-forwarded-for" not in headers or not _is_trusted_proxy(peer):
+		return peer
+	# Each trusted proxy appends the address it received from, so the client controls only the
+	# left of the list: the first hop from the right that is not one of our proxies is the client.
+	hops = [hop.strip() for hop in headers["x-forwarded-for"].split(",") if hop.strip()]
+	for hop in reversed(hops):
+		if not _is_trusted_proxy(hop):
+			return hop
+	return hops[0] if hops else peer
+
+
+class RateLimitMiddleware:
+	"""ASGI middleware applying RateLimiter to HTTP requests.
+
+	Every limited response carries RateLimit-Limit/Remaining/Reset and RateLimit-Policy;
+	rejected requests get 429 with Retry-After.
+	"""
+
+	def __init__(self, app: ASGIApp, limiter: RateLimiter):
+		self.app = app
+		self.limiter = limiter
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send):
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		rule = self.limiter.match(scope["method"], scope["path"])
+		if rule is None:
+			await self.app(scope, receive, send)
+			return
+
+		headers = scope_headers(scope)
+		identity = None
+		if rule.per == "user":
+			user_id = bearer_user_id(headers)
+			if user_id is not None:
+				identity = f"user:{user_id}"
+		if identity is None:
+			identity = f"ip:{_client_ip(scope, headers)}"
+
+		result = await self.limiter.hit(rule, identity)
+		limit_headers = [
+			(b"ratelimit-limit", str(result.limit).encode()),
+			(b"ratelimit-remaining", str(result.remaining).encode()),
+			(b"ratelimit-reset", str(math.ceil(result.reset)).encode()),
+			(b"ratelimit-policy", f"{rule.capacity};w={math.ceil(rule.period_seconds)}".encode()),
+		]
+
+		if not result.allowed:
+			await send_json_error(
+				send, 429, "Too many requests.",
+				headers = [(b"retry-after", str(max(1, math.ceil(result.retry_after))).encode()), *limit_headers],
+			)
+			return
+
+		async def send_with_headers(message):
+			if message["type"] == "http.response.start":
+				message = {**message, "headers":[*message.get("headers", []), *limit_headers]}
+			await send(message)
+
+		await self.app(scope, receive, send_with_headers)
+
+
+def build_rate_limiter(api_prefix: str = "/api/v1") -> RateLimiter:
+	"""Route groups from Settings (a "<requests>/<seconds>" spec each) wired to the shared Redis."""
+	groups = [
+		("POST", "/auth/login", "login", settings.RATE_LIMIT_LOGIN, "ip"),
+		("POST", "/auth/", "auth", settings.RATE_LIMIT_AUTH, "ip"),
+		("POST", "/messages/upload", "upload", settings.RATE_LIMIT_UPLOAD, "user"),
+		("POST", "/messages/text", "text", settings.RATE_LIMIT_TEXT, "user"),
+		("GET", "/messages/history", "history", settings.RATE_LIMIT_HISTORY, "user"),
+	]
+	rules = []
+	for method, path, name, spec, per in groups:
+		rule = RateLimitRule.parse(name, spec, per)
+		if rule is not None:
+			rules.append((method, api_prefix + path, rule))
+	client = aioredis.from_url(
+		settings.REDIS_URL,
+		decode_responses = True,
+		socket_timeout = settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+		socket_connect_timeout = settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+	)
+	return RateLimiter(rules, redis_client = client)
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+JobFunc = Callable[[], Awaitable[Optional[int]]]
+
+
+class MaintenanceJob:
+	"""A periodic background job; its coroutine returns the number of rows/items it removed.
+
+	Batched jobs remove at most `batch_size` items per run. A full batch means more work is
+	pending, so the next run starts after `backlog_pause_seconds` instead of the interval.
+	"""
+
+	__slots__ = (
+		"name", "interval_seconds", "func", "batch_size", "backlog_pause_seconds",
+		"runs", "last_removed", "total_removed", "last_duration_ms",
+	)
+
+	def __init__(
+			self,
+			name: str,
+			interval_seconds: float,
+			func: JobFunc,
+			batch_size: Optional[int] = None,
+			backlog_pause_seconds: float = 0,
+	):
+		self.name = name
+		self.interval_seconds = interval_seconds
+		self.func = func
+		self.batch_size = batch_size
+		self.backlog_pause_seconds = backlog_pause_seconds
+		self.runs = 0
+		self.last_removed = 0
+		self.total_removed = 0
+		self.last_duration_ms = 0.0
+
+
+class MaintenanceScheduler:
+	"""Runs registered maintenance jobs on their own intervals, at most `concurrency` at a time.
+
+	Each job waits for its interval after a run finishes, so a slow run never overlaps with
+	the next one. A failing run is logged and retried on the next tick. The concurrency slot
+	is held for one run only, so a batched job working through a backlog lets other jobs
+	run between its batches.
+	"""
+
+	def __init__(self, concurrency: int = 1):
+		self._jobs: List[MaintenanceJob] = []
+		self._semaphore = asyncio.Semaphore(max(1, concurrency))
+		self._stop_event = asyncio.Event()
+		self._tasks: List[asyncio.Task] = []
+
+	def add_job(
+			self,
+			name: str,
+			interval_seconds: float,
+			func: JobFunc,
+			batch_size: Optional[int] = None,
+			backlog_pause_seconds: float = 0,
+	) -> MaintenanceJob:
+		job = MaintenanceJob(name, interval_seconds, func, batch_size, backlog_pause_seconds)
+		self._jobs.append(job)
+		return job
+
+	async def run_job(self, job: MaintenanceJob) -> int:
+		"""Run one job now (waiting for a free slot) and record how much it removed."""
+		async with self._semaphore:
+			started_at = time.perf_counter()
+			try:
+				removed = await job.func() or 0
+			except Exception:
+				logger.exception("maintenance.job.failed name=%s", job.name)
+				return 0
+			job.runs += 1
+			job.last_removed = removed
+			job.total_removed += removed
+			job.last_duration_ms = (time.perf_counter() - started_at) * 1000
+		if removed:
+			logger.info(
+				"maintenance.job name=%s removed=%s duration_ms=%.1f", job.name, removed, job.last_duration_ms
+			)
+		return removed
+
+	async def _job_loop(self, job: MaintenanceJob):
+		while not self._stop_event.is_set():
+			removed = await self.run_job(job)
+			delay = job.interval_seconds
+			if job.batch_size and removed >= job.batch_size:
+				delay = job.backlog_pause_seconds
+			try:
+				await asyncio.wait_for(self._stop_event.wait(), timeout = delay)
+			except asyncio.TimeoutError:
+				continue
+
+	def start(self):
+		self._stop_event.clear()
+		self._tasks = [asyncio.create_task(self._job_loop(job)) for job in self._jobs]
+
+	async def stop(self):
+		self._stop_event.set()
+		for task in self._tasks:
+			task.cancel()
+		for task in self._tasks:
+			try:
+				await task
+			except asyncio.CancelledError:
+				pass
+		self._tasks = []
+
+	def stats(self) -> Dict[str, dict]:
+		return {
+			job.name:{
+				"runs":job.runs,
+				"last_removed":job.last_removed,
+				"total_removed":job.total_removed,
+				"last_duration_ms":round(job.last_duration_ms, 1),
+			}
+			for job in self._jobs
+		}
@@ -3,7 +3,9 @@ from datetime import timedelta, datetime, timezone
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 
+from app.core.executors import cpu_executor, run_in
 from app.core.settings import settings
+from app.core.token_cache import verified_token_cache
 
 pwd_context = CryptContext(
 	schemes = ["bcrypt"],
@@ -25,6 +27,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 	return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+	"""hash_password on the CPU pool, so bcrypt does not block the event loop."""
+	return await run_in(cpu_executor, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+	"""verify_password on the CPU pool, so bcrypt does not block the event loop."""
+	return await run_in(cpu_executor, verify_password, plain_password, hashed_password)
+
+
 def password_needs_rehash(hashed_password: str) -> bool:
 	"""Return whether a stored hash should be upgraded to current password policy."""
 	return pwd_context.needs_update(hashed_password)
@@ -67,6 +79,27 @@ def decode_token(token):
 		raise ValueError(f"Could not validate credentials: {str(e)}")
 
 
+def get_user_id_from_token(token: str) -> int:
+	"""Resolve the user id of an access token, reusing earlier verifications of the same token."""
+	cached_user_id = verified_token_cache.get(token)
+	if cached_user_id is not None:
+		return cached_user_id
+	try:
+		payload = jwt.decode(token, settings.SECRET_KEY, algorithms = [settings.ALGORITHM])
+		if payload.get("type") != "access":
+			raise ValueError("Invalid token type")
+		user_id = payload.get("sub")
+		if user_id is None:
+			raise ValueError("Missing user id")
+		user_id = int(user_id)
+	except (JWTError, ValueError, TypeError):
+		raise ValueError("Invalid access token")
+	exp = payload.get("exp")
+	if isinstance(exp, (int, float)):
+		verified_token_cache.put(token, user_id, exp)
+	return user_id
+
+
 def encode_jwt(payload):
 	"""Encode JWT"""
 	try:
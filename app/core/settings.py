@@ -23,6 +23,18 @@ class Settings(BaseSettings):
 	# --- SMTP ---
 	RESEND_API_KEY: str = "re_your_default_key_for_test"
 	RESEND_FROM_EMAIL: str = "onboarding@send-me.dev"
+	# Delivery backend: "resend" or "local" (in-memory, logs only).
+	EMAIL_TRANSPORT: str = "resend"
+	# Queue verification emails in Redis and deliver them from a background worker.
+	EMAIL_OUTBOX_ENABLED: bool = True
+	EMAIL_OUTBOX_CONCURRENCY: int = 4
+	EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+	# Retry delays double from the base up to the max.
+	EMAIL_OUTBOX_RETRY_BASE_SECONDS: float = 2
+	EMAIL_OUTBOX_RETRY_MAX_SECONDS: float = 60
+	# Redacted records of undeliverable emails (no body, masked recipients).
+	EMAIL_OUTBOX_DEAD_LETTER_MAX: int = 1000
+	EMAIL_OUTBOX_DEAD_LETTER_TTL_SECONDS: int = 7 * 86400
 
 	# --- JWT ---
 	SECRET_KEY: str = Field(
@@ -34,6 +46,12 @@ class Settings(BaseSettings):
 	# --- Token validity period configuration (unit: minutes or days) ---
 	ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 	REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+	# Refresh token store: "sql" (refresh_tokens table) or "redis" (per-jti keys with native TTL).
+	REFRESH_TOKEN_BACKEND: str = "sql"
+	# With the redis backend, still accept (and migrate on refresh) tokens issued into the SQL table.
+	REFRESH_TOKEN_SQL_FALLBACK: bool = True
+	# Verified access tokens remembered in-process (until their exp) to skip repeat JWT decoding; 0 disables.
+	TOKEN_CACHE_MAX_ENTRIES: int = 10000
 
 	# --- Service Capacity Configuration ---
 	# Default per-user storage capacity limit (100MB).
@@ -43,6 +61,29 @@ class Settings(BaseSettings):
 		validation_alias = AliasChoices("MAX_FILE_SIZE_BYTES", "MAX_FILE_SIZE"),
 	)
 	GLOBAL_MAX_STORAGE_BYTES: int = 9 * 1024 * 1024 * 1024
+	# Upload copy buffer, sized from the upload's length within these bounds.
+	UPLOAD_CHUNK_MIN_BYTES: int = 64 * 1024
+	UPLOAD_CHUNK_MAX_BYTES: int = 4 * 1024 * 1024
+	# Reserve the temp file's full size before writing (posix_fallocate, where supported).
+	UPLOAD_PREALLOCATE: bool = True
+
+	# --- Thread pools (per worker) ---
+	# Blocking work runs on dedicated pools instead of the event loop's shared default executor.
+	EXECUTOR_DISK_WORKERS: int = 8
+	EXECUTOR_STORAGE_WORKERS: int = 16
+	EXECUTOR_CPU_WORKERS: int = 4
+	# Queue depth and wait times per pool are logged this often; 0 disables.
+	EXECUTOR_STATS_LOG_INTERVAL_SECONDS: float = 60
+
+	# --- Upload admission (per worker) ---
+	UPLOAD_MAX_CONCURRENT: int = 16
+	UPLOAD_MAX_CONCURRENT_PER_USER: int = 3
+	# Sum of Content-Length of uploads being processed at once.
+	UPLOAD_MAX_INFLIGHT_BYTES: int = 256 * 1024 * 1024
+	# Uploads allowed to wait for a slot, and for how long, before 503 Retry-After.
+	UPLOAD_MAX_WAITERS: int = 32
+	UPLOAD_ADMISSION_WAIT_SECONDS: float = 2
+	UPLOAD_RETRY_AFTER_SECONDS: int = 5
 
 	# --- Auth (OTP) ---
 	BCRYPT_ROUNDS: int = Field(default = 10, ge = 10, le = 14)
@@ -53,6 +94,79 @@ class Settings(BaseSettings):
 
 	# --- Message DELETE TTL ---
 	MESSAGE_TTL_SECONDS: int = 86400
+	# History lists cut text content to this many characters (contentTruncated=true); clients
+	# load the rest from GET /messages/{id}/content. 0 sends full content.
+	HISTORY_CONTENT_PREVIEW_CHARS: int = 0
+
+	# --- Rate limiting (token buckets, "<requests>/<seconds>", empty disables a group) ---
+	RATE_LIMIT_ENABLED: bool = True
+	RATE_LIMIT_LOGIN: str = "10/60"
+	RATE_LIMIT_AUTH: str = "20/60"
+	RATE_LIMIT_UPLOAD: str = "30/60"
+	RATE_LIMIT_TEXT: str = "60/60"
+	RATE_LIMIT_HISTORY: str = "120/60"
+	# Only enable behind a proxy that sets X-Forwarded-For; otherwise clients can spoof it.
+	RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False
+	# Proxy addresses/CIDRs (comma-separated). X-Forwarded-For is read only from these peers,
+	# and the client is the rightmost hop outside them.
+	RATE_LIMIT_TRUSTED_PROXIES: str = "127.0.0.1,::1"
+	# Redis calls slower than this fall back to approximate in-process buckets.
+	RATE_LIMIT_REDIS_TIMEOUT_SECONDS: float = 0.2
+
+	# --- Metrics (Prometheus text format) ---
+	METRICS_ENABLED: bool = True
+	METRICS_PATH: str = "/metrics"
+	# Scrapes must send "Authorization: Bearer <token>"; /metrics is not served while this is empty.
+	METRICS_TOKEN: str = ""
+	# Shared directory for multi-worker uvicorn: each worker writes its snapshot there and a
+	# scrape of any worker returns the merge. Empty means this worker's numbers only.
+	METRICS_MULTIPROCESS_DIR: str = ""
+	METRICS_FLUSH_INTERVAL_SECONDS: float = 5
+	# Send per-stage upload timings (save, quota, move_to_final, ...) as a Server-Timing header.
+	SERVER_TIMING_ENABLED: bool = False
+	# Statements slower than this are logged (parameters redacted to their types); 0 disables.
+	DB_SLOW_QUERY_SECONDS: float = 0.5
+	# Event-loop lag is sampled every interval. The debug watchdog logs the loop thread's stack
+	# whenever the loop stays blocked longer than the threshold (keep it off in production).
+	LOOP_MONITOR_ENABLED: bool = True
+	LOOP_MONITOR_INTERVAL_SECONDS: float = 0.5
+	LOOP_BLOCKING_DEBUG: bool = False
+	LOOP_BLOCKING_THRESHOLD_SECONDS: float = 0.1
+
+	# --- Maintenance jobs ---
+	# Background jobs (message expiry, refresh token purge) running at the same time.
+	MAINTENANCE_CONCURRENCY: int = 1
+	MESSAGE_CLEANUP_INTERVAL_SECONDS: float = 60
+	REFRESH_TOKEN_PURGE_INTERVAL_SECONDS: float = 3600
+	# Expired refresh tokens are deleted in batches with a pause in between to limit lock pressure.
+	REFRESH_TOKEN_PURGE_BATCH_SIZE: int = 1000
+	REFRESH_TOKEN_PURGE_PAUSE_SECONDS: float = 0.5
+
+	# --- Realtime (WebSocket / SSE) ---
+	# Recent events kept per user so SSE clients can resume with Last-Event-ID.
+	REALTIME_REPLAY_BUFFER_SIZE: int = 100
+	# Upper bound on users with a replay buffer; least recently active users are dropped first.
+	REALTIME_REPLAY_MAX_USERS: int = 10000
+	# Outbound frames buffered per websocket before events are coalesced or dropped.
+	REALTIME_SEND_QUEUE_SIZE: int = 32
+	REALTIME_SEND_TIMEOUT_SECONDS: float = 10
+	# Sockets whose queue stays full for longer than this are closed as slow consumers.
+	REALTIME_SLOW_CONSUMER_SECONDS: float = 5
+	# Server-driven heartbeats: a {"event": "ping"} frame is sent after this much inbound silence
+	# and the client must answer (any frame counts) within the pong timeout.
+	REALTIME_PING_INTERVAL_SECONDS: float = 25
+	REALTIME_PONG_TIMEOUT_SECONDS: float = 10
+	REALTIME_IDLE_TIMEOUT_SECONDS: float = 120
+	REALTIME_REAPER_INTERVAL_SECONDS: float = 5
+	REALTIME_MAX_SOCKETS_PER_USER: int = 10
+	REALTIME_MAX_SOCKETS: int = 100000
+	# Connection registry shards (keyed by user id) and global broadcast fan-out.
+	REALTIME_SHARD_COUNT: int = 64
+	REALTIME_BROADCAST_CONCURRENCY: int = 4
+	REALTIME_BROADCAST_BATCH_SIZE: int = 500
+	SSE_QUEUE_SIZE: int = 200
+	SSE_KEEPALIVE_SECONDS: int = 15
+	SSE_RETRY_MILLISECONDS: int = 3000
 
 	# Pydantic V2 Configuration
 	model_config = SettingsConfigDict(
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.settings import settings
+
+
+class VerifiedTokenCache:
+	"""Bounded LRU of access tokens whose signature and claims were already checked.
+
+	Entries are keyed by a SHA-256 digest of the token (the raw JWT is never stored) and
+	expire together with the token's own `exp` claim, so a hit never outlives the token.
+	Only successful verifications are cached; invalid tokens always take the slow path.
+	"""
+
+	def __init__(self, max_entries: int = settings.TOKEN_CACHE_MAX_ENTRIES):
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		# {token_digest: (user_id, exp_timestamp)}
+		self._entries: "OrderedDict[bytes, Tuple[int, float]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def _key(token: str) -> bytes:
+		return hashlib.sha256(token.encode()).digest()
+
+	def get(self, token: str, now: Optional[float] = None) -> Optional[int]:
+		"""Return the cached user id for a token, or None on a miss or expired entry."""
+		key = self._key(token)
+		now = time.time() if now is None else now
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None or entry[1] <= now:
+				if entry is not None:
+					del self._entries[key]
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, token: str, user_id: int, exp: float):
+		if self.max_entries <= 0:
+			return
+		key = self._key(token)
+		with self._lock:
+			self._entries[key] = (user_id, exp)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last = False)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def stats(self) -> dict:
+		return {"entries":len(self._entries), "hits":self.hits, "misses":self.misses}
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+
+verified_token_cache = VerifiedTokenCache()
@@ -1,9 +1,11 @@
 # General-purpose helper functions.
+_SIZE_UNITS = ("Bytes", "KB", "MB", "GB", "TB")
+
+
 def format_file_size(byte_count: int) -> str:
 	"""Format bytes to human-readable string"""
 	if byte_count <= 0: return "0 Bytes"
-	units = ["Bytes", "KB", "MB", "GB", "TB"]
-	import math
-	i = int(math.floor(math.log(byte_count, 1024)))
-	size = round(byte_count / math.pow(1024, i), 2)
-	return f"{size} {units[i]}"
+	# floor(log1024(n)) from the bit length: no float log, no rounding error just below 1024**i.
+	i = min((byte_count.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+	size = round(byte_count / (1 << (10 * i)), 2)
+	return f"{size} {_SIZE_UNITS[i]}"
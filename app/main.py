@@ -4,61 +4,123 @@ import time
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.auth import router as auth_router
 from app.api.router import router as message_router
 from app.api.ws import router as ws_router
+from app.core.admission import UploadAdmissionMiddleware, upload_admission
 from app.core.database import Base, SessionLocal, engine
 from app.core.exception_handlers import register_exception_handlers
+from app.core.executors import executor_stats, log_executor_stats, shutdown_executors
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import MetricsMiddleware, flush_metrics, get_multiprocess_store, registry, render_metrics
+from app.core.query_metrics import QueryCountMiddleware
+from app.core.rate_limit import RateLimitMiddleware, build_rate_limiter
+from app.core.scheduler import MaintenanceScheduler
 from app.core.settings import settings
+from app.core.token_cache import verified_token_cache
+from app.realtime.ws_manager import ws_manager
+from app.services.email_worker import EmailOutboxWorker
 from app.services.file_service import FileService
 from app.services.message_service import MessageService
+from app.services.notification_service import notification_service
+from app.storage.email_outbox import EmailOutbox
 from app.storage.file_repo import FileRepo
 from app.storage.r2_repo import R2FileRepo
 from app.storage.redis_repo import RedisRepo
-from app.storage.sqlalchemy_repo import MessageRepository, UserRepository
+from app.storage.sqlalchemy_repo import MessageRepository, RefreshTokenRepository, UserRepository
 
 logger = logging.getLogger("uvicorn.error")
 
 
-async def _expired_message_cleanup_loop(stop_event: asyncio.Event):
-	while not stop_event.is_set():
-		try:
-			async with SessionLocal() as db:
-				message_repo = MessageRepository(db)
-				user_repo = UserRepository(db)
-				redis_repo = RedisRepo(settings.REDIS_URL)
-				file_repo = FileRepo(upload_dir = Path(settings.UPLOAD_DIR))
-				r2_repo = R2FileRepo(
-					upload_dir = Path(settings.UPLOAD_DIR), endpoint = settings.R2_ENDPOINT,
-					bucket = settings.R2_BUCKET, access_key_id = settings.R2_ACCESS_KEY_ID,
-					secret_access_key = settings.R2_SECRET_ACCESS_KEY
-				)
-				file_service = FileService(
-					file_repo = file_repo,
-					message_repo = message_repo,
-					user_repo = user_repo,
-					redis_repo = redis_repo,
-					r2_repo = r2_repo
-				)
-				message_service = MessageService(
-					message_repo = message_repo,
-					user_repo = user_repo,
-					file_service = file_service,
-					redis_repo = redis_repo,
-				)
-				cleaned = await message_service.cleanup_expired_messages(limit = 200)
-				if cleaned:
-					logger.info("Expired message cleanup removed %s messages", cleaned)
-		except Exception:
-			logger.exception("Expired message cleanup failed")
+async def _cleanup_expired_messages() -> int:
+	async with SessionLocal() as db:
+		message_repo = MessageRepository(db)
+		user_repo = UserRepository(db)
+		redis_repo = RedisRepo(settings.REDIS_URL)
+		file_repo = FileRepo(upload_dir = Path(settings.UPLOAD_DIR))
+		r2_repo = R2FileRepo(
+			upload_dir = Path(settings.UPLOAD_DIR), endpoint = settings.R2_ENDPOINT,
+			bucket = settings.R2_BUCKET, access_key_id = settings.R2_ACCESS_KEY_ID,
+			secret_access_key = settings.R2_SECRET_ACCESS_KEY
+		)
+		file_service = FileService(
+			file_repo = file_repo,
+			message_repo = message_repo,
+			user_repo = user_repo,
+			redis_repo = redis_repo,
+			r2_repo = r2_repo
+		)
+		message_service = MessageService(
+			message_repo = message_repo,
+			user_repo = user_repo,
+			file_service = file_service,
+			redis_repo = redis_repo,
+		)
+		return await message_service.cleanup_expired_messages(limit = 200)
 
-		try:
-			await asyncio.wait_for(stop_event.wait(), timeout = 60)
-		except asyncio.TimeoutError:
-			continue
+
+async def _purge_expired_refresh_tokens() -> int:
+	"""Delete one batch of expired refresh_tokens rows; the scheduler repeats full batches."""
+	async with SessionLocal() as db:
+		return await RefreshTokenRepository(db).delete_expired_tokens(limit = settings.REFRESH_TOKEN_PURGE_BATCH_SIZE)
+
+
+async def _log_executor_stats() -> int:
+	log_executor_stats()
+	return 0
+
+
+def _collect_runtime_stats():
+	"""Expose the stats() of long-lived components as gauges on /metrics."""
+	realtime = ws_manager.stats()
+	yield "sendme_ws_sockets", "Open WebSocket connections.", {}, realtime["sockets"]
+	yield "sendme_ws_users", "Users with at least one open WebSocket.", {}, realtime["users"]
+	yield "sendme_sse_subscribers", "Open SSE streams.", {}, realtime["sse_subscribers"]
+	for device, count in realtime["devices"].items():
+		yield "sendme_ws_sockets_by_device", "Open WebSocket connections by device.", {"device":device}, count
+
+	for key, value in upload_admission.stats().items():
+		yield f"sendme_upload_admission_{key}", f"Upload admission controller {key}.", {}, value
+
+	for pool, stats in executor_stats().items():
+		labels = {"pool":pool}
+		yield "sendme_executor_queued", "Tasks waiting for a worker thread.", labels, stats["queued"]
+		yield "sendme_executor_active", "Tasks running on a worker thread.", labels, stats["active"]
+		yield "sendme_executor_completed", "Tasks completed since start.", labels, stats["completed"]
+		yield "sendme_executor_max_workers", "Worker threads allowed per worker process.", labels, \
+			stats["max_workers"], "max"
+		# An average cannot be merged across workers; wait total / completed gives it for any set of workers.
+		yield "sendme_executor_wait_seconds_total", "Total time tasks waited for a thread.", labels, \
+			stats["wait_seconds_total"]
+		yield "sendme_executor_wait_ms_max", "Longest time a task waited for a thread.", labels, \
+			stats["wait_ms_max"], "max"
+
+	for key, value in verified_token_cache.stats().items():
+		yield f"sendme_token_cache_{key}", f"Verified access token cache {key}.", {}, value
+
+
+registry.add_collector(_collect_runtime_stats)
+
+
+def build_maintenance_scheduler() -> MaintenanceScheduler:
+	scheduler = MaintenanceScheduler(concurrency = settings.MAINTENANCE_CONCURRENCY)
+	scheduler.add_job("expired_messages", settings.MESSAGE_CLEANUP_INTERVAL_SECONDS, _cleanup_expired_messages)
+	scheduler.add_job(
+		"expired_refresh_tokens",
+		settings.REFRESH_TOKEN_PURGE_INTERVAL_SECONDS,
+		_purge_expired_refresh_tokens,
+		batch_size = settings.REFRESH_TOKEN_PURGE_BATCH_SIZE,
+		backlog_pause_seconds = settings.REFRESH_TOKEN_PURGE_PAUSE_SECONDS,
+	)
+	if get_multiprocess_store() is not None:
+		scheduler.add_job("metrics_flush", settings.METRICS_FLUSH_INTERVAL_SECONDS, flush_metrics)
+	if settings.EXECUTOR_STATS_LOG_INTERVAL_SECONDS > 0:
+		scheduler.add_job("executor_stats", settings.EXECUTOR_STATS_LOG_INTERVAL_SECONDS, _log_executor_stats)
+	return scheduler
 
 
 @asynccontextmanager
@@ -66,15 +128,35 @@ async def lifespan(_: FastAPI):
 	# Auto-create tables for local development convenience.
 	async with engine.begin() as conn:
 		await conn.run_sync(Base.metadata.create_all)
-	stop_event = asyncio.Event()
-	cleanup_task = asyncio.create_task(_expired_message_cleanup_loop(stop_event))
+	notification_service.warm_up()
+	if settings.LOOP_MONITOR_ENABLED:
+		loop_monitor.start()
+	scheduler = build_maintenance_scheduler()
+	scheduler.start()
+	email_stop_event = asyncio.Event()
+	email_worker = None
+	email_task = None
+	if settings.EMAIL_OUTBOX_ENABLED:
+		email_outbox = EmailOutbox(RedisRepo(settings.REDIS_URL).client)
+		email_worker = EmailOutboxWorker(email_outbox, notification_service.transport)
+		email_task = asyncio.create_task(email_worker.run(email_stop_event))
 	yield
-	stop_event.set()
-	cleanup_task.cancel()
-	try:
-		await cleanup_task
-	except asyncio.CancelledError:
-		pass
+	await scheduler.stop()
+	if email_task is not None:
+		email_stop_event.set()
+		email_task.cancel()
+		try:
+			await email_task
+		except asyncio.CancelledError:
+			pass
+		await email_worker.drain(timeout = 5)
+	await ws_manager.shutdown()
+	await loop_monitor.stop()
+	shutdown_executors()
+	store = get_multiprocess_store()
+	if store is not None:
+		# This worker's numbers leave the merged view with it.
+		store.remove()
 
 
 app = FastAPI(title = "SendMe API", version = settings.APP_VERSION, lifespan = lifespan)
@@ -111,6 +193,16 @@ async def log_request_timing(request: Request, call_next):
 	return response
 
 
+app.add_middleware(
+	UploadAdmissionMiddleware, controller = upload_admission, paths = ("/api/v1/messages/upload",)
+)
+if settings.RATE_LIMIT_ENABLED:
+	app.add_middleware(RateLimitMiddleware, limiter = build_rate_limiter())
+if settings.METRICS_ENABLED:
+	app.add_middleware(QueryCountMiddleware)
+	# Outside the rate limiter and upload gate so their rejections are counted too.
+	app.add_middleware(MetricsMiddleware, exclude_paths = (settings.METRICS_PATH,))
+
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins = [
@@ -125,6 +217,17 @@ app.add_middleware(
 )
 
 
+if settings.METRICS_ENABLED:
+	@app.get(settings.METRICS_PATH, include_in_schema = False)
+	async def metrics(authorization: str | None = Header(None)):
+		"""Prometheus scrape endpoint; only served with a METRICS_TOKEN configured."""
+		if not settings.METRICS_TOKEN:
+			raise HTTPException(status_code = 404, detail = "Not Found")
+		if authorization != f"Bearer {settings.METRICS_TOKEN}":
+			raise HTTPException(status_code = 401, detail = "Invalid metrics token")
+		return PlainTextResponse(await render_metrics(), media_type = "text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
 	return {"message":"SendMe API is running"}
@@ -0,0 +1,60 @@
+import json
+from typing import Iterable, Optional
+
+try:
+	import orjson
+except ImportError:  # optional speedup, stdlib json is used instead
+	orjson = None
+
+try:
+	import msgpack
+except ImportError:  # binary frames are only offered when msgpack is installed
+	msgpack = None
+
+JSON_SUBPROTOCOL = "sendme.json"
+MSGPACK_SUBPROTOCOL = "sendme.msgpack"
+
+
+def encode_json(payload: dict) -> str:
+	"""Compact JSON text for one event (orjson when available)."""
+	if orjson is not None:
+		return orjson.dumps(payload).decode()
+	return json.dumps(payload, separators = (",", ":"))
+
+
+def negotiate_subprotocol(requested: Iterable[str]) -> Optional[str]:
+	"""Pick the first supported subprotocol the client offered, in the client's order."""
+	for subprotocol in requested:
+		if subprotocol == JSON_SUBPROTOCOL:
+			return subprotocol
+		if subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None:
+			return subprotocol
+	return None
+
+
+class EncodedEvent:
+	"""An event payload plus its wire frames, each encoded at most once.
+
+	The same instance is handed to every recipient of a broadcast, so the encoding cost
+	is paid per event rather than per socket.
+	"""
+
+	__slots__ = ("payload", "event", "_text", "_binary")
+
+	def __init__(self, payload: dict):
+		self.payload = payload
+		self.event = payload.get("event")
+		self._text: Optional[str] = None
+		self._binary: Optional[bytes] = None
+
+	@property
+	def text(self) -> str:
+		if self._text is None:
+			self._text = encode_json(self.payload)
+		return self._text
+
+	@property
+	def binary(self) -> bytes:
+		if self._binary is None:
+			self._binary = msgpack.packb(self.payload, use_bin_type = True)
+		return self._binary
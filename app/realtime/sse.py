@@ -0,0 +1,46 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+from starlette.requests import Request
+
+from app.core.settings import settings
+from app.realtime.encoding import EncodedEvent
+from app.realtime.ws_manager import ConnectionManager
+
+
+def format_sse(event: EncodedEvent, event_id: Optional[str] = None) -> str:
+	"""Frame one event in text/event-stream format, reusing its cached JSON encoding."""
+	lines = []
+	if event_id is not None:
+		lines.append(f"id: {event_id}")
+	lines.append(f"event: {event.event or 'message'}")
+	lines.append(f"data: {event.text}")
+	return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(
+		request: Request,
+		manager: ConnectionManager,
+		user_id: int,
+		last_event_id: Optional[str] = None,
+		keepalive_seconds: float = settings.SSE_KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+	"""Yield SSE frames for one user until the client disconnects or falls too far behind.
+
+	Missed events since last_event_id are replayed first. Comment lines are sent while idle
+	so proxies keep the connection open and disconnects are noticed.
+	"""
+	subscription = manager.subscribe(user_id, last_event_id)
+	try:
+		yield f"retry: {settings.SSE_RETRY_MILLISECONDS}\n\n"
+		while not subscription.overflowed:
+			try:
+				event_id, event = await asyncio.wait_for(subscription.queue.get(), timeout = keepalive_seconds)
+			except asyncio.TimeoutError:
+				if await request.is_disconnected():
+					break
+				yield ": keepalive\n\n"
+				continue
+			yield format_sse(event, event_id)
+	finally:
+		manager.unsubscribe(subscription)
@@ -1,57 +1,535 @@
 import asyncio
-from collections import defaultdict
-from typing import Dict, Set
+import logging
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
 
 from fastapi import WebSocket
 
+from app.core.settings import settings
+from app.realtime.encoding import MSGPACK_SUBPROTOCOL, EncodedEvent
 
-class ConnectionManager:
-	"""Tracks active websocket sessions and sends events to target users."""
+logger = logging.getLogger("uvicorn.error")
+
+# Sent to SSE clients whose Last-Event-ID can no longer be replayed; they should refetch history.
+RESET_EVENT = EncodedEvent({"event":"stream.reset"})
+
+# Clients refetch history on these events, so a queued one can be replaced by a newer one
+# for the same message. Updates for different messages are merged into an id-less update:
+# clients skip the refetch for ids they updated themselves, so keeping either id could
+# hide another device's change.
+COALESCIBLE_EVENTS = frozenset({"message.updated"})
+
+# Heartbeat sent to sockets that have been silent; clients answer with any frame (e.g. "pong").
+PING_EVENT = EncodedEvent({"event":"ping"})
+
+# "Try again later": the client is too slow to keep up or the server is at capacity.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# "Going away": the client stopped answering heartbeats.
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 1001
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+	"""Whether the caller is running on the given event loop."""
+	try:
+		return asyncio.get_running_loop() is loop
+	except RuntimeError:
+		return False
+
+
+class EventSubscription:
+	"""A single SSE listener: a bounded queue of (event_id, EncodedEvent) pairs for one user."""
+
+	__slots__ = ("user_id", "queue", "loop", "overflowed")
+
+	def __init__(self, user_id: int, maxsize: int):
+		self.user_id = user_id
+		self.queue: asyncio.Queue = asyncio.Queue(maxsize = maxsize)
+		self.loop = asyncio.get_running_loop()
+		# Set when the listener fell behind and was dropped; the client resumes via Last-Event-ID.
+		self.overflowed = False
+
+	def push(self, event_id: Optional[str], event: EncodedEvent) -> bool:
+		"""Queue an event; returns False if the listener is known to have overflowed."""
+		if not _on_loop(self.loop):
+			self.loop.call_soon_threadsafe(self._push, event_id, event)
+			return True
+		return self._push(event_id, event)
+
+	def _push(self, event_id: Optional[str], event: EncodedEvent) -> bool:
+		try:
+			self.queue.put_nowait((event_id, event))
+			return True
+		except asyncio.QueueFull:
+			self.overflowed = True
+			return False
+
+
+class SocketChannel:
+	"""Outbound side of one websocket: a bounded queue drained by its own writer task.
+
+	Publishers only enqueue, so a stalled device never delays the request that emitted
+	the event or the user's other devices. Slotted to keep per-connection overhead small.
+	"""
+
+	__slots__ = (
+		"user_id", "websocket", "device", "maxsize", "binary", "queue", "full_since", "dropped",
+		"last_seen", "ping_sent_at", "_on_evict", "_wakeup", "loop", "writer",
+	)
+
+	def __init__(
+			self,
+			user_id: int,
+			websocket: WebSocket,
+			on_evict: Callable[["SocketChannel", str], None],
+			maxsize: Optional[int] = None,
+			binary: bool = False,
+			device: str = "unknown",
+	):
+		self.user_id = user_id
+		self.websocket = websocket
+		self.device = device
+		self.maxsize = maxsize or settings.REALTIME_SEND_QUEUE_SIZE
+		# MessagePack frames when negotiated via subprotocol, JSON text frames otherwise.
+		self.binary = binary
+		self.queue: Deque[EncodedEvent] = deque()
+		# Monotonic time at which the queue was found full. Cleared only once the writer has
+		# drained it below half, so a client that takes one frame now and then still counts as
+		# backed up and is evicted after REALTIME_SLOW_CONSUMER_SECONDS.
+		self.full_since: Optional[float] = None
+		self.dropped = 0
+		# Liveness: refreshed by every inbound frame; ping_sent_at is set while a ping is unanswered.
+		self.last_seen = time.monotonic()
+		self.ping_sent_at: Optional[float] = None
+		self._on_evict = on_evict
+		self._wakeup = asyncio.Event()
+		self.loop = asyncio.get_running_loop()
+		self.writer = self.loop.create_task(self._drain())
+
+	def offer(self, event: EncodedEvent):
+		"""Enqueue an event from any thread or loop."""
+		if not _on_loop(self.loop):
+			self.loop.call_soon_threadsafe(self._offer, event)
+			return
+		self._offer(event)
+
+	def close(self):
+		self.writer.cancel()
+
+	def mark_alive(self):
+		self.last_seen = time.monotonic()
+		self.ping_sent_at = None
+
+	def _offer(self, event: EncodedEvent):
+		if self.writer.done():
+			return
+		if len(self.queue) < self.maxsize:
+			self.queue.append(event)
+			self._wakeup.set()
+			return
+
+		now = time.monotonic()
+		if self.full_since is None:
+			self.full_since = now
+		elif now - self.full_since > settings.REALTIME_SLOW_CONSUMER_SECONDS:
+			self._on_evict(self, "send queue full")
+			return
+		if self._coalesce(event):
+			return
+
+		# Full and nothing to merge with: drop the event. Anything still queued makes the
+		# client refetch history, so it converges once it catches up.
+		self.dropped += 1
+
+	def _coalesce(self, event: EncodedEvent) -> bool:
+		if event.event not in COALESCIBLE_EVENTS:
+			return False
+		message_id = event.payload.get("message_id")
+		other = None
+		for index, queued in enumerate(self.queue):
+			if queued.event != event.event:
+				continue
+			if queued.payload.get("message_id") == message_id:
+				del self.queue[index]
+				self.queue.append(event)
+				return True
+			if other is None:
+				other = index
+		if other is None:
+			return False
+		# Two different messages: fold them into one update without an id, which every
+		# client answers with a history refetch.
+		del self.queue[other]
+		self.queue.append(EncodedEvent({"event":event.event}))
+		return True
+
+	async def _drain(self):
+		while True:
+			while not self.queue:
+				self._wakeup.clear()
+				await self._wakeup.wait()
+			event = self.queue.popleft()
+			if self.full_since is not None and len(self.queue) <= self.maxsize // 2:
+				self.full_since = None
+			if self.binary:
+				send = self.websocket.send_bytes(event.binary)
+			else:
+				send = self.websocket.send_text(event.text)
+			try:
+				await asyncio.wait_for(send, timeout = settings.REALTIME_SEND_TIMEOUT_SECONDS)
+			except asyncio.TimeoutError:
+				self._on_evict(self, "send timed out")
+				return
+			except Exception:
+				# Client closed abruptly; stop writing and drop the registration.
+				self._on_evict(self, "send failed")
+				return
+
+
+class _ReplayBuffer:
+	"""Bounded per-user history of recent events, used for Last-Event-ID resume."""
+
+	__slots__ = ("events", "floor")
+
+	def __init__(self, maxlen: int, floor: int = 0):
+		self.events: Deque[Tuple[int, EncodedEvent]] = deque(maxlen = maxlen)
+		# Highest sequence number that fell out of the buffer; anything at or below it is lost.
+		self.floor = floor
+
+	def append(self, seq: int, event: EncodedEvent):
+		if len(self.events) == self.events.maxlen:
+			self.floor = self.events[0][0] if self.events else seq
+		self.events.append((seq, event))
+
+	@property
+	def last_seq(self) -> int:
+		return self.events[-1][0] if self.events else self.floor
+
+
+class _Shard:
+	"""One slice of the connection registry; users map to shards by user_id % shard count."""
+
+	__slots__ = ("connections", "subscribers", "lock", "socket_count")
 
 	def __init__(self):
-		# Store active connections: {user_id: {websocket1, websocket2}}
-		# Using a set allows a single user to stay connected on multiple devices (phone/PC)
-		self._connections: Dict[int, Set[WebSocket]] = defaultdict(set)
+		# {user_id: {websocket1: channel1, websocket2: channel2}}
+		self.connections: Dict[int, Dict[WebSocket, SocketChannel]] = {}
+		# SSE listeners share the same per-user fan-out: {user_id: {subscription1, ...}}
+		self.subscribers: Dict[int, Set[EventSubscription]] = {}
+		# Serializes the awaiting part of connect (cap check + handshake) within the shard.
+		# Other registry mutations are synchronous and therefore atomic on the event loop.
+		self.lock = asyncio.Lock()
+		self.socket_count = 0
 
-	async def connect(self, user_id: int, websocket: WebSocket):
-		"""Accepts a new connection and tracks it by user_id."""
-		await websocket.accept()
-		self._connections[user_id].add(websocket)
+	def user_ids(self) -> Set[int]:
+		return self.connections.keys() | self.subscribers.keys()
+
+
+class ConnectionManager:
+	"""Tracks active websocket sessions and SSE listeners and sends events to target users.
+
+	Connections live in a sharded registry so per-user lookups stay O(1) and global
+	operations (broadcast, heartbeat sweeps) can work shard by shard without holding
+	the event loop for the whole registry at once.
+	"""
+
+	def __init__(
+			self,
+			replay_buffer_size: int = settings.REALTIME_REPLAY_BUFFER_SIZE,
+			replay_max_users: int = settings.REALTIME_REPLAY_MAX_USERS,
+			shard_count: int = settings.REALTIME_SHARD_COUNT,
+	):
+		# A user can stay connected on multiple devices (phone/PC); each socket has its own send queue.
+		self._shards = [_Shard() for _ in range(max(1, shard_count))]
+		self._socket_count = 0
+		# Pings and reaps silent sockets; runs only while at least one socket is connected.
+		self._heartbeat_task: Optional[asyncio.Task] = None
+
+		# Event ids are "<epoch>-<seq>"; the epoch changes per process so ids from a
+		# previous run (or another worker) are detected instead of silently misread.
+		self._epoch = uuid.uuid4().hex[:8]
+		self._seq = 0
+		self._replay_buffer_size = replay_buffer_size
+		self._replay_max_users = replay_max_users
+		self._replay: "OrderedDict[int, _ReplayBuffer]" = OrderedDict()
+		# Highest sequence dropped together with an evicted user buffer.
+		self._evicted_floor = 0
+
+	def _shard_for(self, user_id: int) -> _Shard:
+		return self._shards[user_id % len(self._shards)]
+
+	async def connect(
+			self,
+			user_id: int,
+			websocket: WebSocket,
+			subprotocol: Optional[str] = None,
+			device: str = "unknown",
+	) -> bool:
+		"""Accepts a new connection and tracks it by user_id.
+
+		Returns False (and rejects the handshake) when the per-user or global socket cap is reached.
+		"""
+		shard = self._shard_for(user_id)
+		async with shard.lock:
+			if (
+					self._socket_count >= settings.REALTIME_MAX_SOCKETS
+					or len(shard.connections.get(user_id, ())) >= settings.REALTIME_MAX_SOCKETS_PER_USER
+			):
+				logger.warning("realtime.socket.rejected user_id=%s total=%s", user_id, self._socket_count)
+				await websocket.close(code = SLOW_CONSUMER_CLOSE_CODE, reason = "Too many connections")
+				return False
+
+			# Reserve the slot before awaiting the handshake so the global cap holds across shards.
+			self._socket_count += 1
+			try:
+				await websocket.accept(subprotocol = subprotocol)
+			except Exception:
+				self._socket_count -= 1
+				raise
+			shard.connections.setdefault(user_id, {})[websocket] = SocketChannel(
+				user_id, websocket, on_evict = self._evict, binary = subprotocol == MSGPACK_SUBPROTOCOL,
+				device = device,
+			)
+			shard.socket_count += 1
+		self._ensure_heartbeat()
+		return True
 
 	def disconnect(self, user_id: int, websocket: WebSocket):
 		"""Removes a disconnected socket and cleans up the user entry if empty."""
-		if user_id in self._connections:
-			self._connections[user_id].discard(websocket)
+		shard = self._shard_for(user_id)
+		channels = shard.connections.get(user_id)
+		if channels is not None:
+			channel = channels.pop(websocket, None)
+			if channel is not None:
+				channel.close()
+				shard.socket_count -= 1
+				self._socket_count -= 1
 			# Remove the key if no more active sockets for this user to save memory
-			if not self._connections[user_id]:
-				self._connections.pop(user_id)
+			if not channels:
+				shard.connections.pop(user_id)
+		if self._socket_count == 0 and self._heartbeat_task is not None:
+			self._heartbeat_task.cancel()
+			self._heartbeat_task = None
+
+	def touch(self, user_id: int, websocket: WebSocket):
+		"""Record inbound traffic (pong or any client frame) for a socket."""
+		channel = self.get_channel(user_id, websocket)
+		if channel is not None:
+			channel.mark_alive()
+
+	def get_channel(self, user_id: int, websocket: WebSocket) -> Optional[SocketChannel]:
+		return self._shard_for(user_id).connections.get(user_id, {}).get(websocket)
+
+	async def shutdown(self):
+		"""Stop heartbeats and writer tasks; used on application shutdown."""
+		if self._heartbeat_task is not None:
+			self._heartbeat_task.cancel()
+			self._heartbeat_task = None
+		for channel in list(self._channels()):
+			self.disconnect(channel.user_id, channel.websocket)
 
+	# --- Introspection (metrics) ---
+	def connection_count(self, user_id: Optional[int] = None) -> int:
+		"""Open sockets for one user, or for the whole process when user_id is None."""
+		if user_id is None:
+			return self._socket_count
+		return len(self._shard_for(user_id).connections.get(user_id, ()))
+
+	def subscriber_count(self, user_id: Optional[int] = None) -> int:
+		if user_id is not None:
+			return len(self._shard_for(user_id).subscribers.get(user_id, ()))
+		return sum(len(subs) for shard in self._shards for subs in shard.subscribers.values())
+
+	def shard_counts(self) -> List[int]:
+		"""Open sockets per shard, to spot skew."""
+		return [shard.socket_count for shard in self._shards]
+
+	def device_counts(self) -> Dict[str, int]:
+		"""Open sockets per device type reported by clients."""
+		return dict(Counter(channel.device for channel in self._channels()))
+
+	def stats(self) -> dict:
+		return {
+			"sockets":self._socket_count,
+			"users":sum(len(shard.connections) for shard in self._shards),
+			"sse_subscribers":self.subscriber_count(),
+			"shards":self.shard_counts(),
+			"devices":self.device_counts(),
+			"replay_users":len(self._replay),
+		}
+
+	def _channels(self) -> Iterator[SocketChannel]:
+		for shard in self._shards:
+			for channels in list(shard.connections.values()):
+				yield from list(channels.values())
+
+	# --- SSE ---
+	def subscribe(self, user_id: int, last_event_id: Optional[str] = None) -> EventSubscription:
+		"""Register an SSE listener, pre-filled with events missed since last_event_id."""
+		replay, reset = self._events_since(user_id, last_event_id)
+		subscription = EventSubscription(
+			user_id, maxsize = max(settings.SSE_QUEUE_SIZE, self._replay_buffer_size + 1)
+		)
+		if reset:
+			subscription.push(None, RESET_EVENT)
+		for seq, event in replay:
+			subscription.push(self._format_event_id(seq), event)
+		self._shard_for(user_id).subscribers.setdefault(user_id, set()).add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription: EventSubscription):
+		"""Remove an SSE listener and clean up the user entry if empty."""
+		subscribers = self._shard_for(subscription.user_id).subscribers
+		listeners = subscribers.get(subscription.user_id)
+		if listeners is not None:
+			listeners.discard(subscription)
+			if not listeners:
+				subscribers.pop(subscription.user_id)
+
+	# --- Fan-out ---
 	async def send_personal_message(self, user_id: int, payload: dict):
-		"""Sends a JSON message to all active sessions of a specific user."""
-		sockets = self._connections.get(user_id, set())
-		if not sockets:
-			return
+		"""Queues a JSON message for all active sessions of a specific user.
 
-		# Use asyncio.gather to send messages to all user's devices concurrently
-		tasks = [self._safe_send(user_id, ws, payload) for ws in list(sockets)]
-		await asyncio.gather(*tasks)
+		Returns once the event is enqueued; each socket's writer task does the actual send.
+		"""
+		self._publish(user_id, EncodedEvent(payload))
 
-	async def _safe_send(self, user_id: int, websocket: WebSocket, payload: dict):
-		"""Internal helper to handle individual send errors."""
-		try:
-			await websocket.send_json(payload)
-		except Exception:
-			# If sending fails (e.g., client closed abruptly), clean up immediately
-			self.disconnect(user_id, websocket)
+	def _publish(self, user_id: int, event: EncodedEvent):
+		event_id = self._record_event(user_id, event)
+		shard = self._shard_for(user_id)
+
+		for subscription in list(shard.subscribers.get(user_id, ())):
+			if not subscription.push(event_id, event):
+				# Slow SSE reader: drop it, the client reconnects and replays from the buffer.
+				self.unsubscribe(subscription)
+
+		for channel in list(shard.connections.get(user_id, {}).values()):
+			channel.offer(event)
 
 	async def broadcast_all(self, payload: dict):
-		"""Broadcasts a message to EVERY connected user in the system."""
-		for user_id in list(self._connections.keys()):
-			await self.send_personal_message(user_id, payload)
+		"""Broadcasts a message to EVERY connected user in the system, encoding it once.
+
+		Shards are fanned out by a bounded number of workers that yield to the event loop
+		between batches, so a large broadcast does not stall other requests.
+		"""
+		event = EncodedEvent(payload)
+		semaphore = asyncio.Semaphore(max(1, settings.REALTIME_BROADCAST_CONCURRENCY))
+		batch_size = max(1, settings.REALTIME_BROADCAST_BATCH_SIZE)
+
+		async def _fan_out(shard: _Shard):
+			async with semaphore:
+				user_ids = list(shard.user_ids())
+				for start in range(0, len(user_ids), batch_size):
+					for user_id in user_ids[start:start + batch_size]:
+						self._publish(user_id, event)
+					await asyncio.sleep(0)
+
+		await asyncio.gather(*(_fan_out(shard) for shard in self._shards))
 
 	async def broadcast_to_user(self, user_id: int, payload: dict):
 		"""Backward-compatible alias used by API routers."""
 		await self.send_personal_message(user_id, payload)
 
+	def _evict(self, channel: SocketChannel, reason: str, close_code: int = SLOW_CONSUMER_CLOSE_CODE):
+		"""Drop a socket that failed, cannot keep up or went silent, closing it in the background."""
+		if self.get_channel(channel.user_id, channel.websocket) is not channel:
+			return
+		logger.info(
+			"realtime.socket.evicted user_id=%s reason=%s dropped=%s", channel.user_id, reason, channel.dropped
+		)
+		self.disconnect(channel.user_id, channel.websocket)
+		if reason != "send failed":
+			channel.loop.create_task(self._close_quietly(channel.websocket, close_code, reason))
+
+	@staticmethod
+	async def _close_quietly(websocket: WebSocket, code: int, reason: str):
+		try:
+			await asyncio.wait_for(websocket.close(code = code, reason = reason), timeout = 1)
+		except Exception:
+			pass
+
+	# --- Heartbeats ---
+	def _ensure_heartbeat(self):
+		if self._heartbeat_task is None or self._heartbeat_task.done():
+			self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+	async def _heartbeat_loop(self):
+		while True:
+			await asyncio.sleep(settings.REALTIME_REAPER_INTERVAL_SECONDS)
+			now = time.monotonic()
+			for shard in self._shards:
+				try:
+					self._sweep_shard(shard, now)
+				except Exception:
+					logger.exception("realtime.heartbeat.failed")
+				await asyncio.sleep(0)
+
+	def sweep(self, now: Optional[float] = None) -> int:
+		"""Ping silent sockets and reap those past the pong deadline or idle timeout.
+
+		Returns the number of sockets reaped.
+		"""
+		now = time.monotonic() if now is None else now
+		return sum(self._sweep_shard(shard, now) for shard in self._shards)
+
+	def _sweep_shard(self, shard: _Shard, now: float) -> int:
+		reaped = 0
+		for channels in list(shard.connections.values()):
+			for channel in list(channels.values()):
+				silent_for = now - channel.last_seen
+				pong_overdue = (
+						channel.ping_sent_at is not None
+						and now - channel.ping_sent_at > settings.REALTIME_PONG_TIMEOUT_SECONDS
+				)
+				if pong_overdue or silent_for > settings.REALTIME_IDLE_TIMEOUT_SECONDS:
+					self._evict(channel, "heartbeat timeout", close_code = HEARTBEAT_TIMEOUT_CLOSE_CODE)
+					reaped += 1
+				elif channel.ping_sent_at is None and silent_for >= settings.REALTIME_PING_INTERVAL_SECONDS:
+					channel.ping_sent_at = now
+					channel.offer(PING_EVENT)
+		return reaped
+
+	# --- Replay buffer ---
+	def _record_event(self, user_id: int, event: EncodedEvent) -> str:
+		self._seq += 1
+		buffer = self._replay.get(user_id)
+		if buffer is None:
+			if len(self._replay) >= self._replay_max_users:
+				_, evicted = self._replay.popitem(last = False)
+				self._evicted_floor = max(self._evicted_floor, evicted.last_seq)
+			# This user's earlier buffer may have been evicted, so events up to the
+			# evicted floor cannot be replayed from the new one.
+			buffer = _ReplayBuffer(self._replay_buffer_size, floor = self._evicted_floor)
+			self._replay[user_id] = buffer
+		else:
+			self._replay.move_to_end(user_id)
+		buffer.append(self._seq, event)
+		return self._format_event_id(self._seq)
+
+	def _events_since(
+			self, user_id: int, last_event_id: Optional[str]
+	) -> Tuple[List[Tuple[int, EncodedEvent]], bool]:
+		"""Return (events after last_event_id, whether the gap could not be fully replayed)."""
+		if not last_event_id:
+			return [], False
+		seq = self._parse_event_id(last_event_id)
+		if seq is None or seq > self._seq:
+			return [], True
+
+		buffer = self._replay.get(user_id)
+		if buffer is None:
+			return [], seq < self._evicted_floor
+		return [event for event in buffer.events if event[0] > seq], seq < buffer.floor
+
+	def _format_event_id(self, seq: int) -> str:
+		return f"{self._epoch}-{seq}"
+
+	def _parse_event_id(self, event_id: str) -> Optional[int]:
+		epoch, _, seq = event_id.strip().partition("-")
+		if epoch != self._epoch or not seq.isdigit():
+			return None
+		return int(seq)
+
 
 ws_manager = ConnectionManager()
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Optional, Annotated
 from uuid import UUID
 
+import orjson
 from pydantic import BaseModel, computed_field, field_validator, ConfigDict, Field, EmailStr
 
 from app.core.enums import MessageType, DeviceType, MessageStatus
@@ -63,6 +64,11 @@ class DirectUploadRequest(BaseModel):
 	model_config = ConfigDict(populate_by_name = True)
 
 
+class MessageContentResponse(BaseModel):
+	id: int
+	content: Optional[str] = None
+
+
 class DirectUploadResponse(BaseModel):
 	upload_url: str = Field(..., alias = "uploadUrl")
 	file_name: str = Field(..., alias = "fileName")
@@ -112,6 +118,8 @@ class MessageResponse(BaseModel):
 	updated_at: datetime
 	device: DeviceType
 	copied: bool = False
+	# History lists may cut long text; the full text is at GET /messages/{id}/content.
+	content_truncated: bool = Field(False, alias = "contentTruncated")
 
 	@field_validator('id', mode = 'before')
 	@classmethod
@@ -135,6 +143,46 @@ class MessageResponse(BaseModel):
 		return None
 
 
+def encode_message_rows(rows) -> bytes:
+	"""JSON for list[MessageResponse], built directly from history rows.
+
+	Rows are (id, type, status, content, file_name, mime_type, file_path, file_size,
+	created_at, updated_at, device, content_truncated), as MessageRepository.get_history_rows
+	returns them.
+	The output is byte-for-byte what FastAPI renders for response_model=list[MessageResponse]
+	(key order, fileSize string, imageUrl, "Z" for UTC), without a model per row.
+	"""
+	image = MessageType.image
+	return orjson.dumps(
+		[
+			{
+				"id":message_id,
+				"type":message_type,
+				"status":status,
+				"content":content,
+				"fileName":file_name,
+				"fileType":mime_type,
+				"filePath":file_path,
+				"fileSize":format_file_size(file_size) if file_size else None,
+				"progress":None,
+				"error":None,
+				"created_at":created_at,
+				"updated_at":updated_at,
+				"device":device,
+				"copied":False,
+				# SQLite returns the flag as 0/1.
+				"contentTruncated":bool(content_truncated),
+				"imageUrl":f"{BASE_URL}/view/{file_path}" if message_type == image and file_path else None,
+			}
+			for (
+				message_id, message_type, status, content, file_name, mime_type, file_path, file_size,
+				created_at, updated_at, device, content_truncated,
+			) in rows
+		],
+		option = orjson.OPT_UTC_Z,
+	)
+
+
 # User Schemas
 class UserBase(BaseModel):
 	# Usernames are restricted to contain only letters, numbers, and underscores, and must be 3-20 characters long.
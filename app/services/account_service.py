@@ -1,7 +1,8 @@
 from app.core.enums import MessageType
 from app.services.file_service import FileService
+from app.storage.abstract_metadata_repo import AbstractRefreshTokenRepository
 from app.storage.redis_repo import RedisRepo
-from app.storage.sqlalchemy_repo import MessageRepository, RefreshTokenRepository, UserRepository
+from app.storage.sqlalchemy_repo import MessageRepository, UserRepository
 
 
 class AccountService:
@@ -9,7 +10,7 @@ class AccountService:
 			self,
 			user_repo: UserRepository,
 			message_repo: MessageRepository,
-			token_repo: RefreshTokenRepository,
+			token_repo: AbstractRefreshTokenRepository,
 			file_service: FileService,
 			redis_repo: RedisRepo,
 	):
@@ -3,12 +3,15 @@ import secrets
 import time
 import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from app.core import security
+from app.core.enums import OtpStatus
 from app.core.settings import settings
 from app.services.exceptions import OtpInvalidError, OtpLockedError, RateLimitError, EmailDeliveryError
 from app.services.notification_service import notification_service
 from app.storage.abstract_metadata_repo import AbstractRefreshTokenRepository, AbstractUserRepository
+from app.storage.email_outbox import EmailOutbox
 from app.storage.exceptions import UserConstraintError
 from app.storage.redis_repo import RedisRepo
 
@@ -21,24 +24,34 @@ class AuthService:
 			user_repo: AbstractUserRepository,
 			token_repo: AbstractRefreshTokenRepository,
 			redis_repo: RedisRepo,
+			email_outbox: Optional[EmailOutbox] = None,
 	):
 		self.user_repo = user_repo
 		self.token_repo = token_repo
 		self.redis_repo = redis_repo
+		# When set, verification emails are queued for the background worker instead of sent inline.
+		self.email_outbox = email_outbox
 
 	@staticmethod
 	def _generate_otp() -> str:
 		return f"{secrets.randbelow(1_000_000):06d}"
 
+	@staticmethod
+	def _raise_for_otp_request_status(status: OtpStatus):
+		if status == OtpStatus.locked:
+			raise OtpLockedError("Too many failed attempts. Try again later.")
+		if status == OtpStatus.cooldown:
+			raise RateLimitError("OTP sent too frequently. Please wait.")
+
 	async def request_register_otp(self, email: str, username: str, password: str) -> dict:
 		"""
 		Step 1: send OTP email first; only persist user after email delivery succeeds.
 		Redis stores OTP state only.
 		"""
-		if await self.redis_repo.is_otp_locked(email):
-			raise OtpLockedError("Too many failed attempts. Try again later.")
-		if await self.redis_repo.has_otp_cooldown(email):
-			raise RateLimitError("OTP sent too frequently. Please wait.")
+		# 1) cheap lock/cooldown check first, so rejected (locked / too frequent) requests cost
+		#    a single Redis round-trip and no DB query
+		status = await self.redis_repo.otp_request_status(email)
+		self._raise_for_otp_request_status(status)
 
 		existing_by_email = await self.user_repo.get_user_by_email(email)
 		existing_by_username = await self.user_repo.get_user_by_username(username)
@@ -51,21 +64,28 @@ class AuthService:
 		if existing_by_email and existing_by_email.is_verified:
 			raise UserConstraintError(f"Email {email} already exists.")
 
+		# 2) only a valid request replaces the pending code: the lock/cooldown re-check and the
+		#    OTP write are one atomic Redis step, which also settles concurrent requests
 		otp = self._generate_otp()
-		hashed_password = security.hash_password(password)
+		status = await self.redis_repo.begin_otp_request(email, otp)
+		self._raise_for_otp_request_status(status)
 
-		# 1) write OTP state first
-		await self.redis_repo.set_otp(email, otp, ex = settings.OTP_EXPIRATION_SECONDS)
-		await self.redis_repo.set_otp_cooldown(email, settings.OTP_RESEND_COOLDOWN_SECONDS)
+		hashed_password = await security.hash_password_async(password)
 
-		# 2) send email; if fails, rollback OTP state
+		# 3) send (or queue) email; if fails, rollback OTP state
 		try:
-			await notification_service.send_verification_mail(email, username, otp)
+			if self.email_outbox is not None:
+				message = notification_service.build_verification_mail(email, username, otp)
+				await self.email_outbox.enqueue(message, ttl_seconds = settings.OTP_EXPIRATION_SECONDS)
+				delivery = "queued"
+			else:
+				await notification_service.send_verification_mail(email, username, otp)
+				delivery = "sent"
 		except Exception:
 			await self.redis_repo.clear_otp_state(email)
 			raise EmailDeliveryError
 
-		# 3) persist/update unverified user only after email sent
+		# 4) persist/update unverified user only after email sent
 		if existing_by_email:
 			await self.user_repo.update_user(
 				existing_by_email.id,
@@ -83,31 +103,36 @@ class AuthService:
 				is_verified = False,
 			)
 
-		return {"message":"Verification code sent."}
+		if delivery == "queued":
+			return {"message":"Verification code queued.", "delivery":delivery}
+		return {"message":"Verification code sent.", "delivery":delivery}
 
 	async def register_with_otp(self, email: str, otp_code: str) -> dict:
 		"""
 		Step 2: verify OTP and mark DB user as verified.
 		"""
-		if await self.redis_repo.is_otp_locked(email):
+		# Lock check, comparison, attempt counting and consuming the code happen in one Redis step.
+		status = await self.redis_repo.verify_otp(email, otp_code)
+		if status == OtpStatus.locked:
 			raise OtpLockedError("Too many failed attempts. Try again later.")
-
-		saved_otp = await self.redis_repo.get_otp(email)
-		if not saved_otp or saved_otp != otp_code:
-			attempts = await self.redis_repo.incr_otp_attempts(email, ex = settings.OTP_EXPIRATION_SECONDS)
-			if attempts >= settings.OTP_MAX_ATTEMPTS:
-				await self.redis_repo.lock_otp(email, ex = settings.OTP_LOCK_SECONDS)
+		if status != OtpStatus.ok:
 			raise OtpInvalidError("Invalid or expired verification code.")
 
-		user = await self.user_repo.get_user_by_email(email)
-		if not user:
-			raise OtpInvalidError("No pending registration for this email.")
-		if user.is_verified:
-			return {"id":user.id, "username":user.username, "email":user.email}
-
-		updated_user = await self.user_repo.update_user(user.id, {"is_verified":True})
-		await self.redis_repo.clear_otp_state(email)
-		await self.redis_repo.clear_otp_attempts(email)
+		# The code is consumed before the DB write; if that write fails, put it back so the
+		# user can retry with the same code instead of requesting a new one.
+		try:
+			user = await self.user_repo.get_user_by_email(email)
+			if not user:
+				raise OtpInvalidError("No pending registration for this email.")
+			if user.is_verified:
+				return {"id":user.id, "username":user.username, "email":user.email}
+
+			updated_user = await self.user_repo.update_user(user.id, {"is_verified":True})
+		except OtpInvalidError:
+			raise
+		except Exception:
+			await self.redis_repo.restore_otp(email, otp_code)
+			raise
 
 		return {"id":updated_user.id, "username":updated_user.username, "email":updated_user.email}
 
@@ -130,7 +155,7 @@ class AuthService:
 			raise ValueError("Invalid username or password.")
 
 		verify_started_at = time.perf_counter()
-		password_valid = security.verify_password(password, user.hashed_password)
+		password_valid = await security.verify_password_async(password, user.hashed_password)
 		verify_ms = (time.perf_counter() - verify_started_at) * 1000
 		if not password_valid:
 			logger.info(
@@ -157,7 +182,7 @@ class AuthService:
 			try:
 				await self.user_repo.update_user(
 					user.id,
-					{"hashed_password":security.hash_password(password)},
+					{"hashed_password":await security.hash_password_async(password)},
 				)
 			except Exception:
 				logger.warning("auth.login.password_rehash_failed user_id=%s", user.id, exc_info = True)
@@ -195,17 +220,31 @@ class AuthService:
 		}
 
 	async def refresh_access_token(self, refresh_token: str) -> dict:
+		"""Issue a new access token and rotate the refresh token (the old one becomes unusable)."""
 		payload = security.decode_token(refresh_token)
 		if payload.get("type") != "refresh":
 			raise ValueError("Invalid token type.")
 
 		user_id = payload.get("sub")
 		jti = payload.get("jti")
-		db_token = await self.token_repo.get_unused_token(jti)
-		if not db_token:
-			raise ValueError("Refresh token has been revoked or used.")
-		if user_id is None:
+		if user_id is None or jti is None:
 			raise ValueError("Invalid refresh token payload.")
+		user_id = int(user_id)
+
+		new_jti = str(uuid.uuid4())
+		expires_at = datetime.now(timezone.utc) + timedelta(days = settings.REFRESH_TOKEN_EXPIRE_DAYS)
+		rotated = await self.token_repo.rotate_token_record(
+			old_jti = jti,
+			user_id = user_id,
+			new_jti = new_jti,
+			expires_at = expires_at,
+		)
+		if not rotated:
+			logger.info("auth.refresh.rejected user_id=%s", user_id)
+			raise ValueError("Refresh token has been revoked or used.")
 
-		new_access_token = security.create_access_token(int(user_id))
-		return {"access_token":new_access_token, "token_type":"bearer"}
+		return {
+			"access_token":security.create_access_token(user_id),
+			"refresh_token":security.create_refresh_token(user_id, new_jti),
+			"token_type":"bearer",
+		}
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, List, cast
+
+from app.core.settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class EmailTransport(ABC):
+	"""Delivers one rendered message ({"from", "to", "subject", "html"}); raises on failure."""
+
+	@abstractmethod
+	async def send(self, message: dict) -> Any:
+		raise NotImplementedError
+
+
+class ResendTransport(EmailTransport):
+	"""Resend API. The SDK is synchronous, so calls run in a worker thread.
+
+	The SDK is imported and configured on first send, so processes that never email skip it.
+	"""
+
+	def __init__(self, api_key: str = settings.RESEND_API_KEY):
+		self.api_key = api_key
+		self._resend = None
+
+	def _client(self):
+		if self._resend is None:
+			import resend
+
+			resend.api_key = self.api_key
+			self._resend = resend
+		return self._resend
+
+	async def send(self, message: dict) -> Any:
+		resend = self._client()
+		return await asyncio.to_thread(resend.Emails.send, cast(resend.Emails.SendParams, message))
+
+
+class LocalTransport(EmailTransport):
+	"""Keeps messages in memory and logs them; for local development and tests."""
+
+	def __init__(self):
+		self.sent: List[dict] = []
+
+	async def send(self, message: dict) -> Any:
+		self.sent.append(message)
+		logger.info("email.local.sent to=%s subject=%s", message.get("to"), message.get("subject"))
+		return {"id":f"local-{len(self.sent)}"}
+
+
+def get_email_transport() -> EmailTransport:
+	if settings.EMAIL_TRANSPORT.lower() == "local":
+		return LocalTransport()
+	return ResendTransport()
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Set
+
+from app.core.settings import settings
+from app.services.email_transport import EmailTransport
+from app.storage.email_outbox import EmailOutbox
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class EmailOutboxWorker:
+	"""Delivers queued emails with bounded concurrency, exponential backoff and dead-lettering."""
+
+	def __init__(
+			self,
+			outbox: EmailOutbox,
+			transport: EmailTransport,
+			concurrency: int = settings.EMAIL_OUTBOX_CONCURRENCY,
+			max_attempts: int = settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+			retry_base_seconds: float = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+			retry_max_seconds: float = settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS,
+	):
+		self.outbox = outbox
+		self.transport = transport
+		self.max_attempts = max_attempts
+		self.retry_base_seconds = retry_base_seconds
+		self.retry_max_seconds = retry_max_seconds
+		self._semaphore = asyncio.Semaphore(max(1, concurrency))
+		self._in_flight: Set[asyncio.Task] = set()
+
+	def retry_delay(self, attempts: int) -> float:
+		return min(self.retry_base_seconds * (2 ** (attempts - 1)), self.retry_max_seconds)
+
+	async def deliver(self, envelope: dict) -> bool:
+		"""Attempt one delivery; on failure schedule a retry or dead-letter the message."""
+		expires_at = envelope.get("expires_at")
+		if expires_at is not None and time.time() >= expires_at:
+			logger.warning("email.outbox.expired id=%s attempts=%s", envelope["id"], envelope["attempts"])
+			return False
+
+		try:
+			await self.transport.send(envelope["message"])
+		except Exception as e:
+			envelope = {**envelope, "attempts":envelope["attempts"] + 1}
+			if envelope["attempts"] >= self.max_attempts:
+				logger.error("email.outbox.dead id=%s attempts=%s error=%s", envelope["id"], envelope["attempts"], e)
+				await self.outbox.dead_letter(envelope, str(e))
+			elif expires_at is not None and time.time() + self.retry_delay(envelope["attempts"]) >= expires_at:
+				# The next attempt would come too late (e.g. the OTP code expired): drop it now.
+				logger.warning(
+					"email.outbox.expired id=%s attempts=%s error=%s", envelope["id"], envelope["attempts"], e
+				)
+			else:
+				delay = self.retry_delay(envelope["attempts"])
+				logger.warning(
+					"email.outbox.retry id=%s attempts=%s delay_s=%.1f error=%s",
+					envelope["id"], envelope["attempts"], delay, e,
+				)
+				await self.outbox.schedule_retry(envelope, delay)
+			return False
+
+		logger.info(
+			"email.outbox.sent id=%s attempts=%s queued_ms=%.1f",
+			envelope["id"], envelope["attempts"] + 1, (time.time() - envelope["enqueued_at"]) * 1000,
+		)
+		return True
+
+	async def _deliver_and_release(self, envelope: dict):
+		try:
+			await self.deliver(envelope)
+		except Exception:
+			logger.exception("email.outbox.deliver_failed id=%s", envelope.get("id"))
+		finally:
+			self._semaphore.release()
+
+	async def run(self, stop_event: asyncio.Event, poll_seconds: float = 1):
+		"""Pull messages until stop_event is set; at most `concurrency` deliveries run at once."""
+		while not stop_event.is_set():
+			try:
+				await self.outbox.promote_due_retries()
+				await self._semaphore.acquire()
+				try:
+					envelope = await self.outbox.dequeue(timeout = poll_seconds)
+				except BaseException:
+					self._semaphore.release()
+					raise
+				if envelope is None:
+					self._semaphore.release()
+					continue
+				task = asyncio.create_task(self._deliver_and_release(envelope))
+				self._in_flight.add(task)
+				task.add_done_callback(self._in_flight.discard)
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				logger.exception("email.outbox.poll_failed")
+				await asyncio.sleep(poll_seconds)
+
+	async def drain(self, timeout: Optional[float] = None):
+		"""Wait for in-flight deliveries (used on shutdown)."""
+		if self._in_flight:
+			await asyncio.wait(set(self._in_flight), timeout = timeout)
@@ -6,6 +6,7 @@ from fastapi import UploadFile
 from app.core.enums import DeviceType, MessageStatus, MessageType
 from app.core.orm_models import Message
 from app.core.settings import settings
+from app.core.timing import record_upload_throughput, stage
 from app.schemas.schemas import FileMessageCreate
 from app.services.exceptions import QuotaExceededError, FilePathNotFoundError, MessageNotFoundError, \
 	MessagePermissionError, FileUploadAbortedError
@@ -49,11 +50,13 @@ class FileService:
 		# Stream the file to the temp folder via Repo
 		# If the connection is aborted, FileRepo handles the cleanup internally
 		try:
-			size_bytes = await self.file_repo.save(file.file, temp_filename, is_temp = True)
+			with stage("save") as span:
+				size_bytes = await self.file_repo.save(file.file, temp_filename, is_temp = True, size_hint = file.size)
 		except CapacityExceededError as e:
 			raise QuotaExceededError(f"File too large. Max allowed is {settings.MAX_FILE_SIZE_BYTES} bytes.") from e
 		except Exception as e:
 			raise FileUploadAbortedError() from e
+		record_upload_throughput(size_bytes, span.seconds)
 
 		if size_bytes > settings.MAX_FILE_SIZE_BYTES:
 			await self.file_repo.delete_temp(temp_filename)
@@ -78,23 +81,27 @@ class FileService:
 			raise FilePathNotFoundError(f"Temporary file {temp_filename} not found.")
 
 		# 2. Logic & Safety Check (The method you extracted)
-		await self._check_quota(schema.user_id, temp_filename, file_size)
+		with stage("quota"):
+			await self._check_quota(schema.user_id, temp_filename, file_size)
 
 		# 3. Physical Move: Temp -> Final
 		# Using the path from schema (populated by handle_initial_upload or controller)
-		await self.file_repo.move_to_final(temp_filename, schema.file_path)
+		with stage("move_to_final"):
+			await self.file_repo.move_to_final(temp_filename, schema.file_path)
 
 		# 4. Database Persistence
 		# schema.model_dump() already contains the finalized file_path and metadata
 		data = schema.model_dump()
 		data["status"] = MessageStatus.sent
 		data["mime_type"] = data.pop("file_type")
-		uploaded_messages = await self.message_repo.create_message(data)
-		await self.redis_repo.set_message_ttl(uploaded_messages.id)
+		with stage("create_message"):
+			uploaded_messages = await self.message_repo.create_message(data)
+			await self.redis_repo.set_message_ttl(uploaded_messages.id)
 
 		# 5. Calculate capacity
-		await self.user_repo.update_used_capacity(schema.user_id, file_size)
-		await self.redis_repo.incr_storage_used_bytes(file_size)
+		with stage("capacity"):
+			await self.user_repo.update_used_capacity(schema.user_id, file_size)
+			await self.redis_repo.incr_storage_used_bytes(file_size)
 
 		return uploaded_messages
 
@@ -115,13 +122,15 @@ class FileService:
 		if file_size > settings.MAX_FILE_SIZE_BYTES:
 			raise QuotaExceededError(f"File too large. Max allowed is {settings.MAX_FILE_SIZE_BYTES} bytes.")
 
-		await self._check_direct_upload_quota(user_id = user_id, file_size = file_size)
+		with stage("quota"):
+			await self._check_direct_upload_quota(user_id = user_id, file_size = file_size)
 
 		extension = os.path.splitext(file_name)[1]
 		final_filename = f"{user_id}/{uuid.uuid4().hex}{extension}"
 		mime_type = file_type or "application/octet-stream"
 		message_type = MessageType.image if mime_type.startswith("image/") else MessageType.file
-		upload_url = await self.r2_repo.get_presigned_upload_url(final_filename, mime_type)
+		with stage("presign"):
+			upload_url = await self.r2_repo.get_presigned_upload_url(final_filename, mime_type)
 
 		return {
 			"upload_url":upload_url,
@@ -144,21 +153,25 @@ class FileService:
 			raise MessagePermissionError("Message Permission denied.")
 
 		if hasattr(self.file_repo, "get_object_metadata"):
-			metadata = await self.file_repo.get_object_metadata(schema.file_path)
+			with stage("verify_object"):
+				metadata = await self.file_repo.get_object_metadata(schema.file_path)
 			actual_size = int(metadata.get("ContentLength", 0))
 			if actual_size != schema.file_size:
 				await self.file_repo.delete(schema.file_path, is_temp = False)
 				raise FileUploadAbortedError("Uploaded file size does not match metadata.")
 
-		await self._check_direct_upload_quota(user_id = schema.user_id, file_size = schema.file_size)
+		with stage("quota"):
+			await self._check_direct_upload_quota(user_id = schema.user_id, file_size = schema.file_size)
 
 		data = schema.model_dump()
 		data["status"] = MessageStatus.sent
 		data["mime_type"] = data.pop("file_type")
-		uploaded_message = await self.message_repo.create_message(data)
-		await self.redis_repo.set_message_ttl(uploaded_message.id)
-		await self.user_repo.update_used_capacity(schema.user_id, schema.file_size)
-		await self.redis_repo.incr_storage_used_bytes(schema.file_size)
+		with stage("create_message"):
+			uploaded_message = await self.message_repo.create_message(data)
+			await self.redis_repo.set_message_ttl(uploaded_message.id)
+		with stage("capacity"):
+			await self.user_repo.update_used_capacity(schema.user_id, schema.file_size)
+			await self.redis_repo.incr_storage_used_bytes(schema.file_size)
 		return uploaded_message
 
 	async def cancel_pending_upload(self, temp_filename: str):
@@ -197,11 +210,14 @@ class FileService:
 		return used_quota_bytes
 
 	async def delete_file_by_system(self, message_id: int) -> bool:
-		message = await self.message_repo.get_by_message_id(message_id)
-		released_bytes = await self.message_repo.delete_message(message_id)
-		await self.user_repo.update_used_capacity(message.user_id, -released_bytes)
-		if message.file_path:
-			await self.file_repo.delete(message.file_path, is_temp = False)
+		# DELETE ... RETURNING gives the owner and path of the row it removed; no SELECT first.
+		deleted = await self.message_repo.delete_message_row(message_id)
+		if deleted is None:
+			raise RepoMessageNotFoundError(message_id = message_id)
+		released_bytes = deleted.file_size or 0
+		await self.user_repo.update_used_capacity(deleted.user_id, -released_bytes)
+		if deleted.file_path:
+			await self.file_repo.delete(deleted.file_path, is_temp = False)
 		await self.redis_repo.delete_timer(message_id)
 		await self.redis_repo.decr_storage_used_bytes(released_bytes)
 		return True
@@ -1,6 +1,6 @@
 from app.core.enums import MessageStatus, MessageType
 from app.core.orm_models import Message
-from app.schemas.schemas import TextMessageCreate
+from app.schemas.schemas import TextMessageCreate, encode_message_rows
 from app.services.exceptions import MessageNotFoundError, MessagePermissionError
 from app.services.file_service import FileService
 from app.storage.exceptions import MessageNotFoundError as RepoMessageNotFoundError
@@ -41,6 +41,24 @@ class MessageService:
 		offset = (max(1, page) - 1) * page_size
 		return await self.message_repo.get_by_user(user_id, page_size, offset)
 
+	async def get_history_json(
+			self, user_id: int, page: int = 1, page_size: int = 20, content_chars: int = 0
+	) -> bytes:
+		"""History page already encoded as the list[MessageResponse] JSON body."""
+		offset = (max(1, page) - 1) * page_size
+		rows = await self.message_repo.get_history_rows(user_id, page_size, offset, content_chars = content_chars)
+		return encode_message_rows(rows)
+
+	async def get_message_content(self, message_id: int, user_id: int) -> str | None:
+		"""Full text of one of the user's messages."""
+		try:
+			row = await self.message_repo.get_content(message_id)
+		except RepoMessageNotFoundError:
+			raise MessageNotFoundError("Message not found.")
+		if row.user_id != user_id:
+			raise MessagePermissionError("Message Permission denied.")
+		return row.content
+
 	async def delete_message(self, message_id: int, user_id: int) -> bool:
 		"""delete message by id"""
 		# check the permission
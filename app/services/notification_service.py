@@ -1,43 +1,73 @@
-import asyncio
 import os
-from typing import cast
+from typing import Dict, Optional
 
-import resend
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 
 from app.core.settings import settings
+from app.services.email_transport import EmailTransport, get_email_transport
 from app.services.exceptions import EmailDeliveryError
 
 template_dir = os.path.join(os.path.dirname(__file__), "../templates")
-load = Environment(loader = FileSystemLoader(template_dir))
+VERIFICATION_TEMPLATE = "verification_code.html"
 
-resend.api_key = settings.RESEND_API_KEY
+_environment: Optional[Environment] = None
+
+
+def get_template_environment() -> Environment:
+	"""Jinja environment, created on first use. Autoescaping protects user-supplied values (e.g. username)."""
+	global _environment
+	if _environment is None:
+		_environment = Environment(
+			loader = FileSystemLoader(template_dir),
+			autoescape = select_autoescape(["html"]),
+			# Templates ship with the code; skip the per-render mtime check.
+			auto_reload = False,
+		)
+	return _environment
 
 
 class NotificationService:
-	def __init__(self):
+	def __init__(self, transport: Optional[EmailTransport] = None):
 		self.from_email = getattr(settings, "RESEND_FROM_EMAIL", "onboarding@send-me.dev")
+		self._transport = transport
+		self._templates: Dict[str, Template] = {}
+
+	@property
+	def transport(self) -> EmailTransport:
+		if self._transport is None:
+			self._transport = get_email_transport()
+		return self._transport
+
+	def get_template(self, name: str) -> Template:
+		"""Compiled template, loaded and compiled once per process."""
+		template = self._templates.get(name)
+		if template is None:
+			template = get_template_environment().get_template(name)
+			self._templates[name] = template
+		return template
+
+	def warm_up(self):
+		"""Compile email templates ahead of the first send (called at application startup)."""
+		self.get_template(VERIFICATION_TEMPLATE)
+
+	def build_verification_mail(self, recipient: str, username: str, code: str) -> dict:
+		"""Render the verification email into a transport-ready message."""
+		html_content = self.get_template(VERIFICATION_TEMPLATE).render(username = username, code = code)
+
+		return {
+			"from":f"SendMe <{self.from_email}>",
+			"to":[recipient],
+			"subject":"Your Verification Code",
+			"html":html_content,
+		}
 
 	async def send_verification_mail(self, recipient: str, username: str, code: str):
 		"""
-		Sends an HTML email with the verification code using Resend API.
+		Sends an HTML email with the verification code through the configured transport (Resend by default).
 		"""
 		try:
-			template = load.get_template('verification_code.html')
-			html_content = template.render(username = username, code = code)
-
-			params = {
-				"from":f"SendMe <{self.from_email}>",
-				"to":[recipient],
-				"subject":"Your Verification Code",
-				"html":html_content,
-			}
-
-			r = await asyncio.to_thread(
-				resend.Emails.send,
-				cast(resend.Emails.SendParams, params)
-			)
-			return r
+			params = self.build_verification_mail(recipient, username, code)
+			return await self.transport.send(params)
 		except Exception as e:
 			print(f"Resend Error: {str(e)}")
 			raise EmailDeliveryError(f"Failed to deliver verification email: {str(e)}") from e
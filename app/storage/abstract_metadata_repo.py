@@ -62,10 +62,24 @@ class AbstractMessageRepository(ABC):
 	async def get_by_user(self, user_id: int) -> List[Message]:
 		raise NotImplementedError
 
+	@abstractmethod
+	async def get_history_rows(
+			self, user_id: int, limit: int = 20, offset: int = 0, content_chars: int = 0
+	) -> List[tuple]:
+		raise NotImplementedError
+
+	@abstractmethod
+	async def get_content(self, message_id: int) -> tuple:
+		raise NotImplementedError
+
 	@abstractmethod
 	async def update_message(self, message_id: int, status: MessageStatus):
 		raise NotImplementedError
 
+	@abstractmethod
+	async def delete_message_row(self, message_id: int) -> Optional[tuple]:
+		raise NotImplementedError
+
 	@abstractmethod
 	async def delete_message(self, message_id: int) -> Optional[int]:
 		raise NotImplementedError
@@ -79,11 +93,28 @@ class AbstractRefreshTokenRepository(ABC):
 		raise NotImplementedError
 
 	@abstractmethod
-	async def get_unused_token(self, token_jti: str) -> Optional[RefreshToken]:
+	async def get_unused_token(self, token_jti: str, user_id: Optional[int] = None) -> Optional[RefreshToken]:
+		"""The live token with this jti; with user_id, only if that user owns it.
+
+		Stores keyed by owner (Redis) need user_id to find the token.
+		"""
+		raise NotImplementedError
+
+	@abstractmethod
+	async def delete_token_record(self, token_jti: str, user_id: Optional[int] = None) -> bool:
+		raise NotImplementedError
+
+	@abstractmethod
+	async def rotate_token_record(self, old_jti: str, user_id: int, new_jti: str, expires_at: datetime) -> bool:
+		"""Atomically consume a valid refresh token and store its replacement.
+
+		Returns False when the old token is unknown, expired, already used or owned by someone else.
+		"""
 		raise NotImplementedError
 
 	@abstractmethod
-	async def delete_token_record(self, token_jti: str) -> bool:
+	async def delete_expired_tokens(self, limit: int = 1000) -> int:
+		"""Delete up to `limit` expired tokens; returns the number removed."""
 		raise NotImplementedError
 
 	@abstractmethod
@@ -0,0 +1,106 @@
+import json
+import time
+import uuid
+from typing import List, Optional
+
+from redis import asyncio as aioredis
+
+from app.core.settings import settings
+
+# Move retries whose time has come back onto the ready list.
+# KEYS: retry zset, ready list | ARGV: now, max items
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, envelope in ipairs(due) do
+	redis.call('ZREM', KEYS[1], envelope)
+	redis.call('LPUSH', KEYS[2], envelope)
+end
+return #due
+"""
+
+
+def _mask_address(address: str) -> str:
+	local, _, domain = address.partition("@")
+	return f"{local[:1]}***@{domain}" if domain else "***"
+
+
+# Redis-backed email outbox.
+# Ready messages sit in a list (LPUSH / BRPOP), failed ones wait in a sorted set scored by
+# their next attempt time, and messages that exhausted their retries go to a dead-letter list.
+# Delivery is at-most-once per dequeue: a worker that dies mid-send loses that attempt.
+class EmailOutbox:
+	def __init__(
+			self,
+			client: aioredis.Redis,
+			prefix: str = "email:outbox",
+			dead_letter_max: int = settings.EMAIL_OUTBOX_DEAD_LETTER_MAX,
+			dead_letter_ttl_seconds: int = settings.EMAIL_OUTBOX_DEAD_LETTER_TTL_SECONDS,
+	):
+		self.client = client
+		self.ready_key = prefix
+		self.retry_key = f"{prefix}:retry"
+		self.dead_key = f"{prefix}:dead"
+		self.dead_letter_max = dead_letter_max
+		self.dead_letter_ttl_seconds = dead_letter_ttl_seconds
+		self._promote = client.register_script(_PROMOTE_SCRIPT)
+
+	async def enqueue(self, message: dict, ttl_seconds: Optional[int] = None) -> str:
+		"""Queue a rendered message; it is dropped if still undelivered after ttl_seconds."""
+		now = time.time()
+		envelope = {
+			"id":uuid.uuid4().hex,
+			"message":message,
+			"attempts":0,
+			"enqueued_at":now,
+			"expires_at":now + ttl_seconds if ttl_seconds else None,
+		}
+		await self.client.lpush(self.ready_key, json.dumps(envelope))
+		return envelope["id"]
+
+	async def dequeue(self, timeout: float = 1) -> Optional[dict]:
+		"""Block up to `timeout` seconds for the next ready message."""
+		item = await self.client.brpop([self.ready_key], timeout = timeout)
+		if item is None:
+			return None
+		return json.loads(item[1])
+
+	async def schedule_retry(self, envelope: dict, delay_seconds: float):
+		await self.client.zadd(self.retry_key, {json.dumps(envelope):time.time() + delay_seconds})
+
+	async def promote_due_retries(self, limit: int = 100) -> int:
+		return await self._promote(keys = [self.retry_key, self.ready_key], args = [time.time(), limit])
+
+	async def dead_letter(self, envelope: dict, error: str):
+		"""Keep a redacted record of a message that exhausted its retries.
+
+		The rendered body (with the OTP code) is dropped and recipients are masked; the list is
+		capped at dead_letter_max entries and expires dead_letter_ttl_seconds after the last failure.
+		"""
+		message = envelope.get("message", {})
+		record = {
+			"id":envelope.get("id"),
+			"attempts":envelope.get("attempts"),
+			"enqueued_at":envelope.get("enqueued_at"),
+			"message":{
+				"subject":message.get("subject"),
+				"to":[_mask_address(address) for address in message.get("to", [])],
+			},
+			"error":error,
+			"failed_at":time.time(),
+		}
+		async with self.client.pipeline(transaction = True) as pipe:
+			await pipe.lpush(self.dead_key, json.dumps(record))
+			await pipe.ltrim(self.dead_key, 0, self.dead_letter_max - 1)
+			await pipe.expire(self.dead_key, self.dead_letter_ttl_seconds)
+			await pipe.execute()
+
+	async def get_dead_letters(self, limit: int = 100) -> List[dict]:
+		return [json.loads(item) for item in await self.client.lrange(self.dead_key, 0, limit - 1)]
+
+	async def stats(self) -> dict:
+		async with self.client.pipeline(transaction = False) as pipe:
+			await pipe.llen(self.ready_key)
+			await pipe.zcard(self.retry_key)
+			await pipe.llen(self.dead_key)
+			ready, retrying, dead = await pipe.execute()
+		return {"ready":ready, "retrying":retrying, "dead":dead}
@@ -1,11 +1,11 @@
-import asyncio
 from pathlib import Path
+from typing import Optional
 
-import aiofiles
 import aiofiles.os as aios
 
-from app.core.settings import settings
+from app.core.executors import disk_executor
 from app.storage.exceptions import FileWriteError, RepositoryError, FileDeleteError, CapacityExceededError
+from app.storage.streaming import stream_to_file
 
 
 class FileRepo:
@@ -17,10 +17,13 @@ class FileRepo:
 		self.upload_dir.mkdir(parents = True, exist_ok = True)
 		self.temp_dir.mkdir(parents = True, exist_ok = True)
 
-	async def save(self, file_stream, file_path: str, is_temp: bool = True) -> int:
+	async def save(
+			self, file_stream, file_path: str, is_temp: bool = True, size_hint: Optional[int] = None
+	) -> int:
 		"""
 		Saves file content.
 		If is_temp=True, it saves to the 'temp' folder for safety during upload.
+		size_hint (e.g. UploadFile.size) sizes the copy buffer and preallocates the file.
 		"""
 		# Determine base directory
 		base = self.temp_dir if is_temp else self.upload_dir
@@ -29,49 +32,15 @@ class FileRepo:
 		# Ensure subdirectories exist (e.g., if file_path is 'user1/image.png')
 		full_path.parent.mkdir(parents = True, exist_ok = True)
 
-		bytes_written = 0
-		chunk_size = 1024 * 1024  # 1MB
 		try:
-			async with aiofiles.open(full_path, "wb") as f:
-				# async generator / async iterator
-				if hasattr(file_stream, "__aiter__"):
-					async for chunk in file_stream:
-						if not chunk:
-							continue
-						if bytes_written + len(chunk) > settings.MAX_FILE_SIZE_BYTES:
-							raise CapacityExceededError("File size limit reached during stream.")
-						await f.write(chunk)
-						bytes_written += len(chunk)
-				# async read() style stream
-				elif hasattr(file_stream, "read") and asyncio.iscoroutinefunction(file_stream.read):
-					while True:
-						chunk = await file_stream.read(chunk_size)
-						if not chunk:
-							break
-						if bytes_written + len(chunk) > settings.MAX_FILE_SIZE_BYTES:
-							raise CapacityExceededError("File size limit reached during stream.")
-						await f.write(chunk)
-						bytes_written += len(chunk)
-				# sync read() style stream (e.g. SpooledTemporaryFile)
-				elif hasattr(file_stream, "read"):
-					while True:
-						chunk = await asyncio.to_thread(file_stream.read, chunk_size)
-						if not chunk:
-							break
-						if bytes_written + len(chunk) > settings.MAX_FILE_SIZE_BYTES:
-							raise CapacityExceededError("File size limit reached during stream.")
-						await f.write(chunk)
-						bytes_written += len(chunk)
-				else:
-					raise TypeError(f"Unsupported file stream type: {type(file_stream)!r}")
-			return bytes_written
+			return await stream_to_file(file_stream, full_path, size_hint)
 		except CapacityExceededError:
-			if await aios.path.exists(full_path):
-				await aios.remove(full_path)
+			if await aios.path.exists(full_path, executor = disk_executor):
+				await aios.remove(full_path, executor = disk_executor)
 			raise
 		except Exception as e:
-			if await aios.path.exists(full_path):
-				await aios.remove(full_path)
+			if await aios.path.exists(full_path, executor = disk_executor):
+				await aios.remove(full_path, executor = disk_executor)
 			raise FileWriteError(file_path = str(full_path), original_exception = e) from e
 
 	async def move_to_final(self, temp_filename: str, final_filename: str) -> str:
@@ -86,7 +55,7 @@ class FileRepo:
 
 		try:
 			# move the file from temp to final destination
-			await aios.rename(temp_path, final_path)
+			await aios.rename(temp_path, final_path, executor = disk_executor)
 			return str(final_filename)
 		except Exception as e:
 			raise RepositoryError(f"Atomic move failed: {e}") from e
@@ -102,7 +71,7 @@ class FileRepo:
 
 		try:
 			if full_path.exists():
-				await aios.remove(full_path)
+				await aios.remove(full_path, executor = disk_executor)
 				return True
 			return False
 		except Exception as e:
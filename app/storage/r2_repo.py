@@ -1,13 +1,14 @@
-import asyncio
 import os
 from pathlib import Path
+from typing import Optional
 
-import aiofiles
 import aiofiles.os as aios
 import boto3
 
+from app.core.executors import disk_executor, run_in, storage_executor
 from app.core.settings import settings
 from app.storage.exceptions import CapacityExceededError, FileDeleteError, FileWriteError, RepositoryError
+from app.storage.streaming import stream_to_file
 
 
 class R2FileRepo:
@@ -32,63 +33,38 @@ class R2FileRepo:
 			region_name = "auto",
 		)
 
-	async def save(self, file_stream, file_path: str, is_temp: bool = True) -> int:
+	async def save(
+			self, file_stream, file_path: str, is_temp: bool = True, size_hint: Optional[int] = None
+	) -> int:
 		base = self.temp_dir if is_temp else self.upload_dir
 		full_path = base / file_path
 		full_path.parent.mkdir(parents = True, exist_ok = True)
-		bytes_written = 0
-		chunk_size = 1024 * 1024
 
 		try:
-			async with aiofiles.open(full_path, "wb") as f:
-				if hasattr(file_stream, "__aiter__"):
-					async for chunk in file_stream:
-						bytes_written = await self._write_chunk(f, chunk, bytes_written)
-				elif hasattr(file_stream, "read") and asyncio.iscoroutinefunction(file_stream.read):
-					while True:
-						chunk = await file_stream.read(chunk_size)
-						if not chunk:
-							break
-						bytes_written = await self._write_chunk(f, chunk, bytes_written)
-				elif hasattr(file_stream, "read"):
-					while True:
-						chunk = await asyncio.to_thread(file_stream.read, chunk_size)
-						if not chunk:
-							break
-						bytes_written = await self._write_chunk(f, chunk, bytes_written)
-				else:
-					raise TypeError(f"Unsupported file stream type: {type(file_stream)!r}")
-			return bytes_written
+			return await stream_to_file(file_stream, full_path, size_hint)
 		except CapacityExceededError:
-			if await aios.path.exists(full_path):
-				await aios.remove(full_path)
+			if await aios.path.exists(full_path, executor = disk_executor):
+				await aios.remove(full_path, executor = disk_executor)
 			raise
 		except Exception as e:
-			if await aios.path.exists(full_path):
-				await aios.remove(full_path)
+			if await aios.path.exists(full_path, executor = disk_executor):
+				await aios.remove(full_path, executor = disk_executor)
 			raise FileWriteError(file_path = str(full_path), original_exception = e) from e
 
-	async def _write_chunk(self, file_handle, chunk: bytes, bytes_written: int) -> int:
-		if not chunk:
-			return bytes_written
-		if bytes_written + len(chunk) > settings.MAX_FILE_SIZE_BYTES:
-			raise CapacityExceededError("File size limit reached during stream.")
-		await file_handle.write(chunk)
-		return bytes_written + len(chunk)
-
 	async def move_to_final(self, temp_filename: str, final_filename: str) -> str:
 		temp_path = self.temp_dir / temp_filename
 		if not temp_path.exists():
 			raise RepositoryError(f"Temporary file missing: {temp_filename}")
 
 		try:
-			await asyncio.to_thread(
+			await run_in(
+				storage_executor,
 				self.client.upload_file,
 				str(temp_path),
 				self.bucket,
 				final_filename,
 			)
-			await aios.remove(temp_path)
+			await aios.remove(temp_path, executor = disk_executor)
 			return str(final_filename)
 		except Exception as e:
 			raise RepositoryError(f"R2 upload failed: {e}") from e
@@ -98,14 +74,14 @@ class R2FileRepo:
 			full_path = self.temp_dir / file_path
 			try:
 				if full_path.exists():
-					await aios.remove(full_path)
+					await aios.remove(full_path, executor = disk_executor)
 					return True
 				return False
 			except Exception as e:
 				raise FileDeleteError(str(full_path), e) from e
 
 		try:
-			await asyncio.to_thread(self.client.delete_object, Bucket = self.bucket, Key = file_path)
+			await run_in(storage_executor, self.client.delete_object, Bucket = self.bucket, Key = file_path)
 			return True
 		except Exception as e:
 			raise FileDeleteError(file_path, e) from e
@@ -118,7 +94,8 @@ class R2FileRepo:
 		if as_download:
 			filename = download_name or os.path.basename(file_path)
 			params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
-		return await asyncio.to_thread(
+		return await run_in(
+			storage_executor,
 			self.client.generate_presigned_url,
 			"get_object",
 			Params = params,
@@ -126,7 +103,8 @@ class R2FileRepo:
 		)
 
 	async def get_presigned_upload_url(self, file_path: str, content_type: str) -> str:
-		return await asyncio.to_thread(
+		return await run_in(
+			storage_executor,
 			self.client.generate_presigned_url,
 			"put_object",
 			Params = {
@@ -138,7 +116,7 @@ class R2FileRepo:
 		)
 
 	async def get_object_metadata(self, file_path: str) -> dict:
-		return await asyncio.to_thread(self.client.head_object, Bucket = self.bucket, Key = file_path)
+		return await run_in(storage_executor, self.client.head_object, Bucket = self.bucket, Key = file_path)
 
 	async def get_file_stream(self, file_path: str):
-		return await asyncio.to_thread(self.client.get_object, Bucket = self.bucket, Key = file_path)
+		return await run_in(storage_executor, self.client.get_object, Bucket = self.bucket, Key = file_path)
@@ -3,6 +3,7 @@ from typing import Optional
 
 from redis import asyncio as aioredis
 
+from app.core.enums import OtpStatus
 from app.core.settings import settings
 
 
@@ -22,11 +23,54 @@ def _lock_key(email: str) -> str:
 	return f"auth:otp:lock:{email}"
 
 
+# One script per auth step: the check and the state change happen atomically in one round-trip.
+# Both return a status code mapped to OtpStatus by _OTP_STATUS.
+
+# KEYS: lock, cooldown, otp | ARGV: otp code, otp ttl, cooldown ttl
+_BEGIN_OTP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+	return 1
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+	return 2
+end
+redis.call('SET', KEYS[3], ARGV[1], 'EX', ARGV[2])
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[3])
+return 0
+"""
+
+# KEYS: lock, otp, attempts, cooldown | ARGV: submitted code, max attempts, attempts ttl, lock ttl
+# A correct code is consumed (single use); a wrong one counts an attempt (always with a TTL)
+# and locks the email once the limit is reached.
+_VERIFY_OTP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+	return 1
+end
+local saved = redis.call('GET', KEYS[2])
+if saved and saved == ARGV[1] then
+	redis.call('DEL', KEYS[2], KEYS[3], KEYS[4])
+	return 0
+end
+local attempts = redis.call('INCR', KEYS[3])
+if attempts == 1 then
+	redis.call('EXPIRE', KEYS[3], ARGV[3])
+end
+if attempts >= tonumber(ARGV[2]) then
+	redis.call('SET', KEYS[1], '1', 'EX', ARGV[4])
+end
+return 3
+"""
+
+_OTP_STATUS = {0:OtpStatus.ok, 1:OtpStatus.locked, 2:OtpStatus.cooldown, 3:OtpStatus.invalid}
+
+
 class RedisRepo:
 	def __init__(self, redis_url: str):
 		self.client = aioredis.from_url(redis_url, decode_responses = True)
 		self._ttl_index_key = "msg_ttl:index"
 		self._storage_used_key = "storage:used_bytes"
+		self._begin_otp = self.client.register_script(_BEGIN_OTP_SCRIPT)
+		self._verify_otp = self.client.register_script(_VERIFY_OTP_SCRIPT)
 
 	# --- Message TTL ---
 	async def set_message_ttl(self, message_id: int, expire_sec: int = settings.MESSAGE_TTL_SECONDS):
@@ -71,6 +115,54 @@ class RedisRepo:
 		return used
 
 	# --- Auth (OTP) ---
+	async def otp_request_status(self, email: str) -> OtpStatus:
+		"""Read-only lock/cooldown check (one round-trip) for rejecting requests before any DB work."""
+		async with self.client.pipeline(transaction = False) as pipe:
+			await pipe.exists(_lock_key(email))
+			await pipe.exists(_cooldown_key(email))
+			locked, cooling_down = await pipe.execute()
+		if locked:
+			return OtpStatus.locked
+		if cooling_down:
+			return OtpStatus.cooldown
+		return OtpStatus.ok
+
+	async def begin_otp_request(
+			self,
+			email: str,
+			otp_code: str,
+			otp_ex: int = settings.OTP_EXPIRATION_SECONDS,
+			cooldown_ex: int = settings.OTP_RESEND_COOLDOWN_SECONDS,
+	) -> OtpStatus:
+		"""Store a new OTP and start the resend cooldown unless the email is locked or cooling down."""
+		status = await self._begin_otp(
+			keys = [_lock_key(email), _cooldown_key(email), _otp_key(email)],
+			args = [otp_code, otp_ex, cooldown_ex],
+		)
+		return _OTP_STATUS[int(status)]
+
+	async def verify_otp(
+			self,
+			email: str,
+			otp_code: str,
+			max_attempts: int = settings.OTP_MAX_ATTEMPTS,
+			attempts_ex: int = settings.OTP_EXPIRATION_SECONDS,
+			lock_ex: int = settings.OTP_LOCK_SECONDS,
+	) -> OtpStatus:
+		"""Check a submitted OTP: consume it on success, count the attempt (and maybe lock) on failure."""
+		status = await self._verify_otp(
+			keys = [_lock_key(email), _otp_key(email), _attempt_key(email), _cooldown_key(email)],
+			args = [otp_code, max_attempts, attempts_ex, lock_ex],
+		)
+		return _OTP_STATUS[int(status)]
+
+	async def restore_otp(self, email: str, otp_code: str, ex: int = settings.OTP_EXPIRATION_SECONDS) -> bool:
+		"""Put back a code consumed by verify_otp when the registration could not be completed.
+
+		Does nothing if a newer code was issued in the meantime.
+		"""
+		return bool(await self.client.set(_otp_key(email), otp_code, ex = ex, nx = True))
+
 	async def set_otp(self, mail: str, otp_code: str, ex: int = settings.OTP_EXPIRATION_SECONDS):
 		await self.client.set(_otp_key(mail), otp_code, ex)
 
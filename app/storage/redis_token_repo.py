@@ -0,0 +1,173 @@
+import math
+from datetime import datetime, timezone
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from app.core.orm_models import RefreshToken
+from app.storage.abstract_metadata_repo import AbstractRefreshTokenRepository
+from app.storage.exceptions import TokenNotFoundErrorByJti
+
+
+# Every key of a user shares the {u<user_id>} hash tag, so each script below touches a single
+# Redis Cluster slot. The flip side: a token is found through its owner, not its jti alone.
+def _token_key(user_id: int, jti: str) -> str:
+	return f"auth:refresh:{{u{user_id}}}:{jti}"
+
+
+def _user_tokens_key(user_id: int) -> str:
+	return f"auth:refresh:{{u{user_id}}}:set"
+
+
+# KEYS: token key, user set | ARGV: user id, jti, ttl seconds
+_CREATE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[2])
+if redis.call('TTL', KEYS[2]) < tonumber(ARGV[3]) then
+	redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return 1
+"""
+
+# KEYS: old token key, new token key, user set | ARGV: user id, old jti, new jti, ttl seconds
+_ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+	return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[3], ARGV[2])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[4])
+redis.call('SADD', KEYS[3], ARGV[3])
+if redis.call('TTL', KEYS[3]) < tonumber(ARGV[4]) then
+	redis.call('EXPIRE', KEYS[3], ARGV[4])
+end
+return 1
+"""
+
+# KEYS: token key, user set | ARGV: jti, user id
+_DELETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[2] then
+	return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+# KEYS: user set, token keys... | ARGV: user id, jtis... (same order as the token keys)
+_DELETE_ALL_SCRIPT = """
+local deleted = 0
+for i = 2, #KEYS do
+	if redis.call('GET', KEYS[i]) == ARGV[1] then
+		deleted = deleted + redis.call('DEL', KEYS[i])
+	end
+	redis.call('SREM', KEYS[1], ARGV[i])
+end
+if redis.call('SCARD', KEYS[1]) == 0 then
+	redis.call('DEL', KEYS[1])
+end
+return deleted
+"""
+
+
+def _ttl_seconds(expires_at: datetime) -> int:
+	if expires_at.tzinfo is None:
+		expires_at = expires_at.replace(tzinfo = timezone.utc)
+	return math.ceil((expires_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Redis refresh-token store.
+# One key per jti (value: user id) expiring with the token, plus a per-user set of jtis
+# so all sessions of a user can be revoked at once. Expired tokens vanish on their own,
+# and every operation is a single round-trip. Lookups need the owner (the refresh token's
+# sub claim); without it only the fallback store is consulted.
+class RedisRefreshTokenRepository(AbstractRefreshTokenRepository):
+	"""Refresh tokens in Redis, optionally falling back to another store for legacy tokens.
+
+	With a fallback (the SQL repository during migration), tokens issued before the switch
+	are still accepted; rotating one consumes it there and issues the new token in Redis.
+	"""
+
+	def __init__(self, client: aioredis.Redis, fallback: Optional[AbstractRefreshTokenRepository] = None):
+		self.client = client
+		self.fallback = fallback
+		self._create = client.register_script(_CREATE_SCRIPT)
+		self._rotate = client.register_script(_ROTATE_SCRIPT)
+		self._delete = client.register_script(_DELETE_SCRIPT)
+		self._delete_all = client.register_script(_DELETE_ALL_SCRIPT)
+
+	async def create_token_record(self, user_id: int, token_jti: str, expires_at: datetime) -> RefreshToken:
+		ttl = _ttl_seconds(expires_at)
+		if ttl > 0:
+			await self._create(
+				keys = [_token_key(user_id, token_jti), _user_tokens_key(user_id)],
+				args = [user_id, token_jti, ttl],
+			)
+		return RefreshToken(jti = token_jti, user_id = user_id, expires_at = expires_at)
+
+	async def get_unused_token(self, token_jti: str, user_id: Optional[int] = None) -> Optional[RefreshToken]:
+		stored = ttl = None
+		if user_id is not None:
+			key = _token_key(user_id, token_jti)
+			async with self.client.pipeline(transaction = True) as pipe:
+				await pipe.get(key)
+				await pipe.ttl(key)
+				stored, ttl = await pipe.execute()
+		if stored is None:
+			if self.fallback is not None:
+				return await self.fallback.get_unused_token(token_jti, user_id)
+			raise TokenNotFoundErrorByJti(token_jti)
+		expires_at = datetime.fromtimestamp(datetime.now(timezone.utc).timestamp() + max(ttl, 0), timezone.utc)
+		return RefreshToken(jti = token_jti, user_id = int(stored), expires_at = expires_at)
+
+	async def delete_token_record(self, token_jti: str, user_id: Optional[int] = None) -> bool:
+		deleted = 0
+		if user_id is not None:
+			deleted = await self._delete(
+				keys = [_token_key(user_id, token_jti), _user_tokens_key(user_id)], args = [token_jti, user_id]
+			)
+		if not deleted and self.fallback is not None:
+			return await self.fallback.delete_token_record(token_jti, user_id)
+		return bool(deleted)
+
+	async def delete_all_user_tokens(self, user_id: int) -> int:
+		user_key = _user_tokens_key(user_id)
+		jtis = sorted(await self.client.smembers(user_key))
+		deleted = 0
+		if jtis:
+			deleted = await self._delete_all(
+				keys = [user_key, *(_token_key(user_id, jti) for jti in jtis)],
+				args = [user_id, *jtis],
+			)
+		if self.fallback is not None:
+			deleted += await self.fallback.delete_all_user_tokens(user_id) or 0
+		return deleted
+
+	async def delete_expired_tokens(self, limit: int = 1000) -> int:
+		# Redis keys expire natively; only legacy rows in the fallback store need purging.
+		if self.fallback is not None:
+			return await self.fallback.delete_expired_tokens(limit)
+		return 0
+
+	async def rotate_token_record(self, old_jti: str, user_id: int, new_jti: str, expires_at: datetime) -> bool:
+		ttl = _ttl_seconds(expires_at)
+		rotated = await self._rotate(
+			keys = [_token_key(user_id, old_jti), _token_key(user_id, new_jti), _user_tokens_key(user_id)],
+			args = [user_id, old_jti, new_jti, ttl],
+		)
+		if rotated:
+			return True
+		if self.fallback is None:
+			return False
+
+		# Legacy token: consume it from the fallback store (only one concurrent caller wins the delete).
+		try:
+			legacy = await self.fallback.get_unused_token(old_jti, user_id)
+		except TokenNotFoundErrorByJti:
+			return False
+		if legacy is None or legacy.user_id != user_id:
+			return False
+		if not await self.fallback.delete_token_record(old_jti, user_id):
+			return False
+		await self.create_token_record(user_id, new_jti, expires_at)
+		return True
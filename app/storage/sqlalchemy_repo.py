@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Optional, Sequence
 
-from sqlalchemy import select, delete, func
+from sqlalchemy import Row, false, select, insert, update, delete, func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
 from app.core.enums import MessageStatus
 from app.core.orm_models import User, Message, RefreshToken
@@ -42,16 +43,16 @@ class UserRepository(AbstractUserRepository):
 		return user
 
 	async def create_user(self, username: str, hashed_password: str, email: str, is_verified: bool = False):
-		new_user = User(
+		# INSERT ... RETURNING hands back the row with its generated id and defaults in one round-trip.
+		stmt = insert(User).values(
 			username = username,
 			hashed_password = hashed_password,
 			email = email,
 			is_verified = is_verified,
-		)
+		).returning(User)
 		try:
-			self.db.add(new_user)
+			new_user = (await self.db.execute(stmt)).scalar_one()
 			await self.db.commit()
-			await self.db.refresh(new_user)
 			return new_user
 		except IntegrityError as e:
 			await self.db.rollback()
@@ -59,21 +60,23 @@ class UserRepository(AbstractUserRepository):
 
 	async def update_user(self, user_id: int, updates: dict) -> User:
 		"""Update a user record in the database."""
-		user = await self.get_user_by_id(user_id)
-		current_uid = user.id
-		for key, value in updates.items():
-			if hasattr(user, key):
-				setattr(user, key, value)
+		columns = User.__mapper__.column_attrs.keys()
+		values = {key:value for key, value in updates.items() if key in columns}
+		if not values:
+			return await self.get_user_by_id(user_id)
+		stmt = update(User).where(User.id == user_id).values(**values).returning(User)
 		try:
+			user = (await self.db.execute(stmt)).scalar_one_or_none()
 			await self.db.commit()
-			await self.db.refresh(user)
-			return user
 		except IntegrityError as e:
 			await self.db.rollback()
-			raise UserConstraintError(f"Update failed due to constraint violation {current_uid}.") from e
+			raise UserConstraintError(f"Update failed due to constraint violation {user_id}.") from e
 		except Exception as e:
 			await self.db.rollback()
-			raise RepositoryError(f"Error updating user {current_uid}.") from e
+			raise RepositoryError(f"Error updating user {user_id}.") from e
+		if user is None:
+			raise UserNotFoundErrorById(user_id)
+		return user
 
 	async def delete_user(self, user_id: int) -> bool:
 		try:
@@ -116,6 +119,13 @@ class UserRepository(AbstractUserRepository):
 		return user.used_quota_bytes
 
 
+# History list columns, in the order app.schemas.schemas.encode_message_rows unpacks them.
+HISTORY_COLUMNS = (
+	Message.id, Message.type, Message.status, Message.content, Message.file_name, Message.mime_type,
+	Message.file_path, Message.file_size, Message.created_at, Message.updated_at, Message.device,
+)
+
+
 class MessageRepository(AbstractMessageRepository):
 	"""Implementation of message storage using AsyncSession."""
 
@@ -123,11 +133,9 @@ class MessageRepository(AbstractMessageRepository):
 		self.db = db
 
 	async def create_message(self, data: dict) -> Message:
-		new_message = Message(**data)
 		try:
-			self.db.add(new_message)
+			new_message = (await self.db.execute(insert(Message).values(**data).returning(Message))).scalar_one()
 			await self.db.commit()
-			await self.db.refresh(new_message)
 			return new_message
 		except Exception as e:
 			await self.db.rollback()
@@ -143,6 +151,8 @@ class MessageRepository(AbstractMessageRepository):
 	async def get_by_user(self, user_id: int, limit: int = 20, offset: int = 0) -> Sequence['Message']:
 		stmt = (
 			select(Message)
+			# Only what MessageResponse needs; other columns load lazily if ever touched.
+			.options(load_only(*HISTORY_COLUMNS))
 			.filter(Message.user_id == user_id)
 			.order_by(Message.created_at.desc())
 			.limit(limit)
@@ -151,81 +161,165 @@ class MessageRepository(AbstractMessageRepository):
 		result = await self.db.execute(stmt)
 		return result.scalars().all()
 
-	async def get_all_by_user(self, user_id: int) -> Sequence['Message']:
-		stmt = select(Message).filter(Message.user_id == user_id)
+	async def get_history_rows(
+			self, user_id: int, limit: int = 20, offset: int = 0, content_chars: int = 0
+	) -> Sequence[tuple]:
+		"""One history page as plain column tuples: no ORM identities to build or track.
+
+		Rows are HISTORY_COLUMNS plus a content_truncated flag. With content_chars > 0 the
+		database returns only that many characters of each content, so long texts never
+		leave it in full.
+		"""
+		if content_chars > 0:
+			columns = [
+				func.substr(Message.content, 1, content_chars).label("content") if column is Message.content else column
+				for column in HISTORY_COLUMNS
+			]
+			truncated = func.coalesce(func.length(Message.content), 0) > content_chars
+		else:
+			columns = list(HISTORY_COLUMNS)
+			truncated = false()
+		stmt = (
+			select(*columns, truncated.label("content_truncated"))
+			.filter(Message.user_id == user_id)
+			.order_by(Message.created_at.desc())
+			.limit(limit)
+			.offset(offset)
+		)
 		result = await self.db.execute(stmt)
-		return result.scalars().all()
+		return result.all()
+
+	async def get_all_by_user(self, user_id: int) -> Sequence[Row]:
+		"""(id, type, file_path) of every message of the user, enough to delete them."""
+		stmt = select(Message.id, Message.type, Message.file_path).filter(Message.user_id == user_id)
+		result = await self.db.execute(stmt)
+		return result.all()
+
+	async def get_content(self, message_id: int) -> Row:
+		"""(user_id, content) of one message, without loading the rest of the row."""
+		result = await self.db.execute(select(Message.user_id, Message.content).filter(Message.id == message_id))
+		row = result.first()
+		if row is None:
+			raise MessageNotFoundError(message_id = message_id)
+		return row
 
 	async def update_message(self, message_id: int, status: MessageStatus):
-		message = await self.get_by_message_id(message_id)
+		stmt = update(Message).where(Message.id == message_id).values(status = status).returning(Message.id)
 		try:
-			message.status = status
+			updated = (await self.db.execute(stmt)).scalar_one_or_none()
 			await self.db.commit()
-			await self.db.refresh(message)
 		except Exception:
 			await self.db.rollback()
 			raise MessageUpdateError(message_id = message_id)
+		if updated is None:
+			raise MessageNotFoundError(message_id = message_id)
 
-	async def delete_message(self, message_id: int) -> int:
-		"""Permanently delete the message record and return the file size for capacity deduction."""
-		# Get the file size first
-		stmt_size = select(Message.file_size).filter(Message.id == message_id)
-		result = await self.db.execute(stmt_size)
-		file_size = result.scalar() or 0
+	async def delete_message_row(self, message_id: int) -> Optional[Row]:
+		"""Permanently delete the message record; returns its (file_size, file_path, user_id), or None if absent."""
+		stmt = (
+			delete(Message)
+			.where(Message.id == message_id)
+			.returning(Message.file_size, Message.file_path, Message.user_id)
+		)
 		try:
-			# Perform deletion
-			await self.db.execute(delete(Message).filter(Message.id == message_id))
+			row = (await self.db.execute(stmt)).first()
 			await self.db.commit()
-			return file_size
+			return row
 		except Exception as e:
 			await self.db.rollback()
 			raise RepositoryError(f"Error hard deleting message {message_id}: {e}") from e
 
+	async def delete_message(self, message_id: int) -> int:
+		"""Permanently delete the message record and return the file size for capacity deduction."""
+		row = await self.delete_message_row(message_id)
+		return (row.file_size or 0) if row is not None else 0
+
 
 class RefreshTokenRepository(AbstractRefreshTokenRepository):
 	def __init__(self, db: AsyncSession):
 		self.db = db
 
 	async def create_token_record(self, user_id: int, token_jti: str, expires_at: datetime) -> RefreshToken:
-		new_token = RefreshToken(
+		stmt = insert(RefreshToken).values(
 			jti = token_jti,
 			user_id = user_id,
 			expires_at = expires_at,
-		)
+		).returning(RefreshToken)
 		try:
-			self.db.add(new_token)
+			new_token = (await self.db.execute(stmt)).scalar_one()
 			await self.db.commit()
-			await self.db.refresh(new_token)
 			return new_token
 		except Exception as e:
 			await self.db.rollback()
 			raise RepositoryError(f"Error creating token {token_jti}: {e}") from e
 
-	async def get_unused_token(self, token_jti: str) -> Optional[RefreshToken]:
+	async def get_unused_token(self, token_jti: str, user_id: Optional[int] = None) -> Optional[RefreshToken]:
 		stmt = select(RefreshToken).filter(
 			RefreshToken.jti == token_jti,
 			RefreshToken.expires_at > func.now()
 		)
+		if user_id is not None:
+			stmt = stmt.filter(RefreshToken.user_id == user_id)
 		result = await self.db.execute(stmt)
 		unused_token = result.scalars().first()
 		if not unused_token:
 			raise TokenNotFoundErrorByJti(f"Refresh Token {token_jti} not found or already used.")
 		return unused_token
 
-	async def delete_token_record(self, token_jti: str) -> bool:
+	async def delete_token_record(self, token_jti: str, user_id: Optional[int] = None) -> bool:
+		stmt = delete(RefreshToken).filter(RefreshToken.jti == token_jti)
+		if user_id is not None:
+			stmt = stmt.filter(RefreshToken.user_id == user_id)
 		try:
-			await self.db.execute(delete(RefreshToken).filter(RefreshToken.jti == token_jti))
+			result = await self.db.execute(stmt)
 			await self.db.commit()
-			return True
+			return result.rowcount > 0
 		except Exception as e:
 			await self.db.rollback()
 			raise RepositoryError(f"Error deleting token {token_jti}: {e}") from e
 
-	async def delete_all_user_tokens(self, user_id: int):
+	async def rotate_token_record(self, old_jti: str, user_id: int, new_jti: str, expires_at: datetime) -> bool:
+		try:
+			# The conditional delete is the "compare" step: only one concurrent refresh can consume the row.
+			result = await self.db.execute(
+				delete(RefreshToken).where(
+					RefreshToken.jti == old_jti,
+					RefreshToken.user_id == user_id,
+					RefreshToken.expires_at > func.now(),
+				)
+			)
+			if result.rowcount == 0:
+				# Nothing was deleted; just end the transaction.
+				await self.db.commit()
+				return False
+			self.db.add(RefreshToken(jti = new_jti, user_id = user_id, expires_at = expires_at))
+			await self.db.commit()
+			return True
+		except Exception as e:
+			await self.db.rollback()
+			raise RepositoryError(f"Error rotating token {old_jti}: {e}") from e
+
+	async def delete_expired_tokens(self, limit: int = 1000) -> int:
+		# Bounded batch through the primary key (portable equivalent of a ctid batch delete).
+		expired_batch = (
+			select(RefreshToken.jti)
+			.where(RefreshToken.expires_at <= func.now())
+			.limit(limit)
+		)
+		try:
+			result = await self.db.execute(delete(RefreshToken).where(RefreshToken.jti.in_(expired_batch)))
+			await self.db.commit()
+			return result.rowcount
+		except Exception as e:
+			await self.db.rollback()
+			raise RepositoryError(f"Error deleting expired tokens: {e}") from e
+
+	async def delete_all_user_tokens(self, user_id: int) -> int:
 		try:
 			stmt = delete(RefreshToken).where(RefreshToken.user_id == user_id)
-			await self.db.execute(stmt)
+			result = await self.db.execute(stmt)
 			await self.db.commit()
+			return result.rowcount
 		except Exception as e:
 			await self.db.rollback()
 			raise RepositoryError(f"Error deleting all tokens for user {user_id}: {e}") from e
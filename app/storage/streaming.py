@@ -0,0 +1,118 @@
+"""Copy an upload stream to a local file; shared by FileRepo and R2FileRepo."""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Optional
+
+import aiofiles
+
+from app.core.executors import disk_executor, run_in
+from app.core.settings import settings
+from app.storage.exceptions import CapacityExceededError
+
+
+def choose_chunk_size(size_hint: Optional[int]) -> int:
+	"""Buffer size for a stream of (roughly) size_hint bytes.
+
+	Small uploads are copied in a single read, large ones in the largest allowed chunks;
+	without a hint the maximum is used. Sizes are rounded up to 64 KiB.
+	"""
+	low, high = settings.UPLOAD_CHUNK_MIN_BYTES, settings.UPLOAD_CHUNK_MAX_BYTES
+	if not size_hint or size_hint <= 0:
+		return high
+	# +1 so a file that fits the buffer exactly is not followed by a second full-size read.
+	wanted = -(-(size_hint + 1) // 65536) * 65536
+	return max(low, min(high, wanted))
+
+
+def _preallocate(fd: int, size_bytes: int):
+	"""Reserve the file's blocks up front (fewer extent allocations while writing); best effort."""
+	if not settings.UPLOAD_PREALLOCATE or size_bytes <= 0 or not hasattr(os, "posix_fallocate"):
+		return
+	try:
+		os.posix_fallocate(fd, 0, size_bytes)
+	except OSError:
+		# Not supported by the filesystem (e.g. some overlay/tmpfs setups): write normally.
+		pass
+
+
+def _write_all(target, chunk):
+	"""Unbuffered writes are single os.write calls and may be short; retry until the chunk is out."""
+	view = memoryview(chunk)
+	while view:
+		written = target.write(view)
+		view = view[written:]
+
+
+def _copy_sync_stream(file_stream, full_path: Path, size_hint: Optional[int], limit: int) -> int:
+	"""Copy a blocking file object to full_path inside a single worker-thread call.
+
+	One preallocated buffer is reused for every chunk (readinto when the stream supports it),
+	so no per-chunk bytes objects are created and no thread hop happens per chunk.
+	"""
+	buffer = bytearray(choose_chunk_size(size_hint))
+	view = memoryview(buffer)
+	readinto = getattr(file_stream, "readinto", None)
+	bytes_written = 0
+	with open(full_path, "wb", buffering = 0) as target:
+		if size_hint:
+			_preallocate(target.fileno(), min(size_hint, limit))
+		while True:
+			if readinto is not None:
+				n = readinto(view)
+				chunk = view[:n] if n else None
+			else:
+				chunk = file_stream.read(len(buffer))
+				n = len(chunk) if chunk else 0
+			if not n:
+				break
+			if bytes_written + n > limit:
+				raise CapacityExceededError("File size limit reached during stream.")
+			_write_all(target, chunk)
+			bytes_written += n
+		# The hint may have overstated the size; drop any preallocated tail.
+		target.truncate(bytes_written)
+	return bytes_written
+
+
+async def stream_to_file(file_stream, full_path: Path, size_hint: Optional[int] = None) -> int:
+	"""Write file_stream to full_path and return the number of bytes written.
+
+	Accepts an async iterator of chunks, an object with an async read(), or a blocking
+	file object (e.g. UploadFile.file). Raises CapacityExceededError past MAX_FILE_SIZE_BYTES;
+	the caller owns cleanup of the partial file.
+	"""
+	limit = settings.MAX_FILE_SIZE_BYTES
+	if size_hint is not None and size_hint > limit:
+		raise CapacityExceededError("File size limit reached during stream.")
+
+	if not hasattr(file_stream, "__aiter__") and hasattr(file_stream, "read") \
+			and not asyncio.iscoroutinefunction(file_stream.read):
+		return await run_in(disk_executor, _copy_sync_stream, file_stream, full_path, size_hint, limit)
+
+	bytes_written = 0
+	async with aiofiles.open(full_path, "wb", executor = disk_executor) as f:
+		# async generator / async iterator
+		if hasattr(file_stream, "__aiter__"):
+			async for chunk in file_stream:
+				if not chunk:
+					continue
+				if bytes_written + len(chunk) > limit:
+					raise CapacityExceededError("File size limit reached during stream.")
+				await f.write(chunk)
+				bytes_written += len(chunk)
+		# async read() style stream
+		elif hasattr(file_stream, "read"):
+			chunk_size = choose_chunk_size(size_hint)
+			while True:
+				chunk = await file_stream.read(chunk_size)
+				if not chunk:
+					break
+				if bytes_written + len(chunk) > limit:
+					raise CapacityExceededError("File size limit reached during stream.")
+				await f.write(chunk)
+				bytes_written += len(chunk)
+		else:
+			raise TypeError(f"Unsupported file stream type: {type(file_stream)!r}")
+	return bytes_written
@@ -0,0 +1,150 @@
+"""HTTP load benchmark: text, upload, history and polling-fallback mixes against the real app.
+
+Boots the app in-process on local stand-ins (see benchmarks/harness.py), drives each scenario
+with an async load generator and prints JSON with p50/p95/p99 latency, RPS, error count and
+RSS per scenario, for diffing between commits.
+
+    python -m benchmarks.bench_api [--users 20] [--devices 3] [--requests 2000]
+        [--upload-kb 4 256 2048] [--storage local|r2-stub] [--scenarios text upload history polling]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.harness import latency_summary, local_stack, rss_mb
+
+# An actor issues one request per call and returns the operation name and whether it succeeded.
+Actor = Callable[[], Awaitable[tuple]]
+
+
+async def _drive(actors: List[Actor], total_requests: int) -> dict:
+	"""Run every actor concurrently until total_requests have been issued between them."""
+	latencies: Dict[str, List[float]] = defaultdict(list)
+	errors: Dict[str, int] = defaultdict(int)
+	budget = itertools.count()
+
+	async def loop(actor: Actor):
+		while next(budget) < total_requests:
+			started = time.perf_counter()
+			operation, ok = await actor()
+			latencies[operation].append(time.perf_counter() - started)
+			if not ok:
+				errors[operation] += 1
+
+	rss_before = rss_mb()
+	started = time.perf_counter()
+	await asyncio.gather(*(loop(actor) for actor in actors))
+	elapsed = time.perf_counter() - started
+	issued = sum(len(values) for values in latencies.values())
+	return {
+		"concurrency":len(actors),
+		"requests":issued,
+		"seconds":round(elapsed, 3),
+		"rps":round(issued / elapsed, 1) if elapsed else 0.0,
+		"rss_mb_before":rss_before,
+		"rss_mb_after":rss_mb(),
+		"operations":{
+			operation:{**latency_summary(values), "errors":errors[operation]}
+			for operation, values in sorted(latencies.items())
+		},
+	}
+
+
+def _text_actor(client, user: dict, device: str) -> Actor:
+	async def send():
+		response = await client.post(
+			"/api/v1/messages/text", json = {"content":"benchmark message", "device":device}, headers = user["headers"]
+		)
+		return "text", response.status_code == 200
+
+	return send
+
+
+def _history_actor(client, user: dict) -> Actor:
+	async def poll():
+		response = await client.get("/api/v1/messages/history", params = {"page":1}, headers = user["headers"])
+		return "history", response.status_code == 200
+
+	return poll
+
+
+def _upload_actor(client, user: dict, payload: bytes, label: str) -> Actor:
+	async def upload():
+		response = await client.post(
+			"/api/v1/messages/upload",
+			files = {"file":("bench.bin", payload, "application/octet-stream")},
+			data = {"device":"desktop"},
+			headers = user["headers"],
+		)
+		return label, response.status_code == 200
+
+	return upload
+
+
+def _build_scenarios(stack, users: List[dict], devices: int, upload_kb: List[int]) -> Dict[str, List[Actor]]:
+	client = stack.client
+	device_names = ["desktop", "phone"]
+	return {
+		# Every device of every user sends text.
+		"text":[
+			_text_actor(client, user, device_names[index % 2]) for user in users for index in range(devices)
+		],
+		# One upload stream per user, sizes mixed across users.
+		"upload":[
+			_upload_actor(client, user, os.urandom(size * 1024), f"upload_{size}kb")
+			for user, size in zip(users, itertools.cycle(upload_kb))
+		],
+		# Every device re-reads the first history page.
+		"history":[_history_actor(client, user) for user in users for _ in range(devices)],
+		# WebSocket-less clients: one device per user sends while the others poll history.
+		"polling":[
+			actor
+			for user in users
+			for actor in [_text_actor(client, user, "desktop")] + [
+				_history_actor(client, user) for _ in range(max(1, devices - 1))
+			]
+		],
+	}
+
+
+async def main(args) -> dict:
+	with tempfile.TemporaryDirectory() as directory:
+		async with local_stack(Path(directory), storage = args.storage, s3_latency_seconds = args.s3_latency_ms / 1000) \
+				as stack:
+			users = await stack.create_users(args.users)
+			scenarios = _build_scenarios(stack, users, args.devices, args.upload_kb)
+			# Warm up (imports, first connections, caches) outside the measurements.
+			await _drive(scenarios["text"][:1] + scenarios["history"][:1], 10)
+			results = {}
+			for name in args.scenarios:
+				results[name] = await _drive(scenarios[name], args.requests)
+	return {
+		"benchmark":"api",
+		"storage":args.storage,
+		"users":args.users,
+		"devices_per_user":args.devices,
+		"requests_per_scenario":args.requests,
+		"scenarios":results,
+	}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+	parser.add_argument("--users", type = int, default = 20)
+	parser.add_argument("--devices", type = int, default = 3)
+	parser.add_argument("--requests", type = int, default = 2000)
+	parser.add_argument("--upload-kb", type = int, nargs = "+", default = [4, 256, 2048])
+	parser.add_argument("--storage", choices = ("local", "r2-stub"), default = "local")
+	parser.add_argument("--s3-latency-ms", type = float, default = 0.0, help = "added to each stub S3 call")
+	parser.add_argument(
+		"--scenarios", nargs = "+", default = ["text", "upload", "history", "polling"],
+		choices = ["text", "upload", "history", "polling"],
+	)
+	print(json.dumps(asyncio.run(main(parser.parse_args())), indent = 2))
@@ -0,0 +1,175 @@
+"""Microbenchmarks for history serialization: MessageResponse and format_file_size.
+
+Measures the cost per message of FastAPI's response_model path for a page of ORM rows
+(validation from attributes, the imageUrl/fileSize computed fields, jsonable_encoder and JSON
+rendering), its parts on their own, the column-tuple fast path GET /messages/history uses
+(encode_message_rows) and format_file_size, for text, file and image messages at page sizes
+20/100/1000. Prints JSON.
+
+    python -m benchmarks.bench_serialization [--pages 20 100 1000] [--repeat 7]
+        [--max-us-per-message 0]
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from app.core.enums import DeviceType, MessageStatus, MessageType  # noqa: E402
+from app.core.orm_models import Message  # noqa: E402
+from app.core.utils import format_file_size  # noqa: E402
+from app.schemas.schemas import MessageResponse, encode_message_rows  # noqa: E402
+from app.storage.sqlalchemy_repo import HISTORY_COLUMNS  # noqa: E402
+
+KINDS = ("text", "file", "image")
+
+
+def make_messages(kind: str, count: int) -> List[Message]:
+	"""Detached ORM rows shaped like real history rows of one kind."""
+	now = datetime.now(timezone.utc)
+	messages = []
+	for index in range(count):
+		created = now - timedelta(seconds = index)
+		fields = {
+			"id":index + 1,
+			"user_id":1,
+			"status":MessageStatus.sent,
+			"is_deleted":False,
+			"device":DeviceType.desktop if index % 2 else DeviceType.phone,
+			"created_at":created,
+			"updated_at":created,
+		}
+		if kind == "text":
+			fields.update(type = MessageType.text, content = f"note {index}: " + "lorem ipsum " * 8)
+		else:
+			fields.update(
+				type = MessageType.image if kind == "image" else MessageType.file,
+				mime_type = "image/png" if kind == "image" else "application/pdf",
+				file_id = uuid.uuid4(),
+				file_name = f"file-{index}.{'png' if kind == 'image' else 'pdf'}",
+				file_path = f"1/{uuid.uuid4().hex}.{'png' if kind == 'image' else 'pdf'}",
+				file_size = 1536 + index * 7919,
+			)
+		messages.append(Message(**fields))
+	return messages
+
+
+_history_field = create_response_field(name = "Response_get_history", type_ = List[MessageResponse])
+
+
+def fastapi_history_response(messages: List[Message]) -> bytes:
+	"""What the route does for response_model=list[MessageResponse]: validate, encode, render."""
+	return JSONResponse(_serialize_sync(messages)).body
+
+
+def _serialize_sync(messages: List[Message]):
+	# For async endpoints serialize_response never awaits, so the coroutine finishes on its first step.
+	coroutine = serialize_response(field = _history_field, response_content = messages)
+	try:
+		coroutine.send(None)
+	except StopIteration as done:
+		return done.value
+	raise RuntimeError("serialize_response suspended unexpectedly")
+
+
+def validate_only(messages: List[Message]):
+	return [MessageResponse.model_validate(message) for message in messages]
+
+
+def dump_only(models: List[MessageResponse]):
+	return [model.model_dump(mode = "json", by_alias = True) for model in models]
+
+
+def jsonable_only(models: List[MessageResponse]):
+	return jsonable_encoder(models, by_alias = True)
+
+
+def to_rows(messages: List[Message]) -> List[tuple]:
+	"""The same messages as MessageRepository.get_history_rows returns them."""
+	return [(*(getattr(message, column.key) for column in HISTORY_COLUMNS), False) for message in messages]
+
+
+def format_sizes(sizes: List[int]):
+	return [format_file_size(size) for size in sizes]
+
+
+def _best_seconds(func: Callable, argument, repeat: int) -> float:
+	loops = 1
+	# Enough loops per sample that timer resolution does not matter.
+	while True:
+		started = time.perf_counter()
+		for _ in range(loops):
+			func(argument)
+		if time.perf_counter() - started > 0.05 or loops >= 1 << 16:
+			break
+		loops *= 2
+	best = float("inf")
+	for _ in range(repeat):
+		started = time.perf_counter()
+		for _ in range(loops):
+			func(argument)
+		best = min(best, (time.perf_counter() - started) / loops)
+	return best
+
+
+def cases(kind: str, page_size: int) -> Dict[str, tuple]:
+	"""Benchmark name -> (callable, argument); extended when new serialization paths are added."""
+	messages = make_messages(kind, page_size)
+	models = validate_only(messages)
+	sizes = [message.file_size or 0 for message in messages]
+	return {
+		"fastapi_response":(fastapi_history_response, messages),
+		"encode_message_rows":(encode_message_rows, to_rows(messages)),
+		"validate_from_attributes":(validate_only, messages),
+		"model_dump_json_mode":(dump_only, models),
+		"jsonable_encoder":(jsonable_only, models),
+		"format_file_size":(format_sizes, sizes),
+	}
+
+
+def main(pages: List[int], repeat: int) -> dict:
+	results = []
+	for kind in KINDS:
+		for page_size in pages:
+			for name, (func, argument) in cases(kind, page_size).items():
+				if name == "format_file_size" and kind == "text":
+					continue
+				seconds = _best_seconds(func, argument, repeat)
+				results.append({
+					"case":name,
+					"kind":kind,
+					"page_size":page_size,
+					"us_per_page":round(seconds * 1e6, 1),
+					"us_per_message":round(seconds * 1e6 / page_size, 3),
+				})
+	return {"benchmark":"serialization", "repeat":repeat, "results":results}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+	parser.add_argument("--pages", type = int, nargs = "+", default = [20, 100, 1000])
+	parser.add_argument("--repeat", type = int, default = 7)
+	parser.add_argument(
+		"--max-us-per-message", type = float, default = 0,
+		help = "fail when the encode_message_rows case exceeds this (0 disables)",
+	)
+	args = parser.parse_args()
+	report = main(args.pages, args.repeat)
+	report["failures"] = [
+		f"{row['kind']}/{row['page_size']}: {row['us_per_message']} us/message"
+		for row in report["results"]
+		if args.max_us_per_message and row["case"] == "encode_message_rows"
+		and row["us_per_message"] > args.max_us_per_message
+	]
+	print(json.dumps(report, indent = 2))
+	sys.exit(1 if report["failures"] else 0)
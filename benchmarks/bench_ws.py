@@ -0,0 +1,277 @@
+"""WebSocket fan-out benchmark and soak test for /ws/messages and ConnectionManager.
+
+Opens thousands of in-process clients against the real endpoint (ASGI messages, no sockets),
+then measures connect rate, memory per connection, delivery latency of per-user and global
+broadcasts, and fast-client latency while a share of clients is deliberately slow. Prints
+JSON and exits non-zero when a regression threshold is exceeded.
+
+    python -m benchmarks.bench_ws [--users 1000] [--devices 3] [--slow-fraction 0.05]
+        [--max-delivery-p99-ms 250] [--max-kb-per-connection 64] [--soak-seconds 0]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.harness import app, latency_summary, rss_mb
+from app.core.security import create_access_token
+from app.core.settings import settings
+from app.realtime.ws_manager import ws_manager
+
+WS_PATH = "/api/v1/ws/messages"
+
+
+class Deliveries:
+	"""Send times per event sequence and the delivery latencies observed by clients."""
+
+	def __init__(self):
+		self.sent_at: Dict[int, float] = {}
+		self.fast: List[float] = []
+		self.slow: List[float] = []
+		self.received = 0
+		self._target = 0
+		self._done = asyncio.Event()
+
+	def expect(self, count: int):
+		self._target = self.received + count
+		self._done.clear()
+		if self.received >= self._target:
+			self._done.set()
+
+	def record(self, seq: Optional[int], slow: bool):
+		self.received += 1
+		sent_at = self.sent_at.get(seq)
+		if sent_at is not None:
+			(self.slow if slow else self.fast).append(time.perf_counter() - sent_at)
+		if self.received >= self._target:
+			self._done.set()
+
+	async def wait(self, timeout: float) -> bool:
+		try:
+			await asyncio.wait_for(self._done.wait(), timeout)
+			return True
+		except asyncio.TimeoutError:
+			return False
+
+
+class InProcessWebSocket:
+	"""A WebSocket client speaking ASGI directly to the app.
+
+	A slow client takes send_delay seconds to "receive" each frame, which is what the
+	server's writer task sees from a client on a bad network.
+	"""
+
+	def __init__(self, user_id: int, device: str, deliveries: Deliveries, send_delay: float = 0.0):
+		self.user_id = user_id
+		self.deliveries = deliveries
+		self.send_delay = send_delay
+		self.closed_code: Optional[int] = None
+		self._inbox: asyncio.Queue = asyncio.Queue()
+		self._accepted = asyncio.Event()
+		token = create_access_token(user_id)
+		self.scope = {
+			"type":"websocket",
+			"asgi":{"version":"3.0"},
+			"scheme":"ws",
+			"path":WS_PATH,
+			"raw_path":WS_PATH.encode(),
+			"root_path":"",
+			"query_string":f"token={token}&device={device}".encode(),
+			"headers":[(b"host", b"bench.local")],
+			"client":("127.0.0.1", 40000 + user_id % 20000),
+			"server":("bench.local", 80),
+			"subprotocols":[],
+		}
+		self.task: Optional[asyncio.Task] = None
+
+	async def connect(self) -> bool:
+		self._inbox.put_nowait({"type":"websocket.connect"})
+		self.task = asyncio.create_task(app(self.scope, self._inbox.get, self._send))
+		accepted = asyncio.create_task(self._accepted.wait())
+		await asyncio.wait({accepted, self.task}, return_when = asyncio.FIRST_COMPLETED)
+		accepted.cancel()
+		return self._accepted.is_set()
+
+	async def _send(self, message: dict):
+		kind = message["type"]
+		if kind == "websocket.accept":
+			self._accepted.set()
+		elif kind == "websocket.close":
+			self.closed_code = message.get("code", 1000)
+		elif kind == "websocket.send":
+			if self.send_delay:
+				await asyncio.sleep(self.send_delay)
+			payload = json.loads(message["text"]) if message.get("text") is not None else {}
+			if payload.get("event") != "ping":
+				self.deliveries.record(payload.get("message_id"), slow = bool(self.send_delay))
+
+	async def close(self):
+		if self.task is None:
+			return
+		self._inbox.put_nowait({"type":"websocket.disconnect", "code":1000})
+		try:
+			await asyncio.wait_for(self.task, timeout = 5)
+		except (asyncio.TimeoutError, Exception):
+			self.task.cancel()
+
+
+async def _open_clients(users: int, devices: int, slow_fraction: float, slow_delay: float, deliveries: Deliveries):
+	clients = []
+	device_names = ["desktop", "phone"]
+	rng = random.Random(42)
+	for user_id in range(1, users + 1):
+		for index in range(devices):
+			delay = slow_delay if rng.random() < slow_fraction else 0.0
+			clients.append(InProcessWebSocket(user_id, device_names[index % 2], deliveries, send_delay = delay))
+
+	gc.collect()
+	rss_before = rss_mb()
+	started = time.perf_counter()
+	accepted = 0
+	for start in range(0, len(clients), 500):
+		results = await asyncio.gather(*(client.connect() for client in clients[start:start + 500]))
+		accepted += sum(results)
+	elapsed = time.perf_counter() - started
+	gc.collect()
+	rss_after = rss_mb()
+	return clients, {
+		"clients":len(clients),
+		"accepted":accepted,
+		"seconds":round(elapsed, 3),
+		"connects_per_second":round(accepted / elapsed, 1) if elapsed else 0.0,
+		"rss_mb_before":rss_before,
+		"rss_mb_after":rss_after,
+		"kb_per_connection":round((rss_after - rss_before) * 1024 / max(1, accepted), 2),
+	}
+
+
+async def _per_user_broadcasts(users: int, rounds: int, deliveries: Deliveries, seq_start: int) -> dict:
+	"""Every round sends one event to each user; latency is publish -> client receive."""
+	publish = []
+	seq = seq_start
+	started = time.perf_counter()
+	for _ in range(rounds):
+		deliveries.expect(ws_manager.connection_count())
+		for user_id in range(1, users + 1):
+			seq += 1
+			deliveries.sent_at[seq] = time.perf_counter()
+			call_started = time.perf_counter()
+			await ws_manager.broadcast_to_user(user_id, {"event":"message.updated", "message_id":seq})
+			publish.append(time.perf_counter() - call_started)
+		await deliveries.wait(timeout = 30)
+	return {
+		"events":seq - seq_start,
+		"seconds":round(time.perf_counter() - started, 3),
+		"publish":latency_summary(publish),
+	}, seq
+
+
+async def _global_broadcasts(rounds: int, deliveries: Deliveries, seq_start: int) -> dict:
+	"""broadcast_all() to every socket; also reports time until the last client has it."""
+	completion = []
+	seq = seq_start
+	for _ in range(rounds):
+		seq += 1
+		deliveries.expect(ws_manager.connection_count())
+		started = deliveries.sent_at[seq] = time.perf_counter()
+		await ws_manager.broadcast_all({"event":"message.updated", "message_id":seq})
+		if await deliveries.wait(timeout = 30):
+			completion.append(time.perf_counter() - started)
+	return {"rounds":rounds, "all_delivered":latency_summary(completion)}, seq
+
+
+async def _soak(users: int, seconds: float, rate: int, deliveries: Deliveries, seq_start: int) -> dict:
+	"""Random per-user events at `rate` per second; RSS is sampled to spot growth."""
+	rng = random.Random(7)
+	seq = seq_start
+	samples = [rss_mb()]
+	deadline = time.perf_counter() + seconds
+	next_sample = time.perf_counter() + 1
+	while time.perf_counter() < deadline:
+		for _ in range(rate // 10 or 1):
+			seq += 1
+			deliveries.sent_at[seq] = time.perf_counter()
+			await ws_manager.broadcast_to_user(rng.randint(1, users), {"event":"message.updated", "message_id":seq})
+		await asyncio.sleep(0.1)
+		if time.perf_counter() >= next_sample:
+			samples.append(rss_mb())
+			next_sample += 1
+	return {"seconds":seconds, "events":seq - seq_start, "rss_mb_samples":samples,
+		"rss_mb_growth":round(samples[-1] - samples[0], 1)}, seq
+
+
+def _check(results: dict, args) -> List[str]:
+	failures = []
+	fast_p99 = results["delivery"]["fast_clients"]["p99_ms"]
+	if fast_p99 > args.max_delivery_p99_ms:
+		failures.append(f"fast client delivery p99 {fast_p99} ms > {args.max_delivery_p99_ms} ms")
+	per_connection = results["connect"]["kb_per_connection"]
+	if per_connection > args.max_kb_per_connection:
+		failures.append(f"memory per connection {per_connection} KB > {args.max_kb_per_connection} KB")
+	rate = results["connect"]["connects_per_second"]
+	if rate < args.min_connects_per_second:
+		failures.append(f"connect rate {rate}/s < {args.min_connects_per_second}/s")
+	if results["connect"]["accepted"] < results["connect"]["clients"]:
+		failures.append("not every client was accepted")
+	soak = results.get("soak")
+	if soak and soak["rss_mb_growth"] > args.max_soak_rss_growth_mb:
+		failures.append(f"soak RSS growth {soak['rss_mb_growth']} MB > {args.max_soak_rss_growth_mb} MB")
+	return failures
+
+
+async def main(args) -> dict:
+	settings.REALTIME_MAX_SOCKETS_PER_USER = max(settings.REALTIME_MAX_SOCKETS_PER_USER, args.devices)
+	settings.REALTIME_SLOW_CONSUMER_SECONDS = args.slow_consumer_seconds
+	deliveries = Deliveries()
+	clients, connect = await _open_clients(
+		args.users, args.devices, args.slow_fraction, args.slow_delay_ms / 1000, deliveries
+	)
+	try:
+		per_user, seq = await _per_user_broadcasts(args.users, args.rounds, deliveries, 0)
+		global_, seq = await _global_broadcasts(args.rounds, deliveries, seq)
+		results = {"connect":connect, "per_user_broadcast":per_user, "global_broadcast":global_}
+		if args.soak_seconds > 0:
+			results["soak"], seq = await _soak(args.users, args.soak_seconds, args.soak_rate, deliveries, seq)
+		slow_clients = [client for client in clients if client.send_delay]
+		results["delivery"] = {
+			"fast_clients":latency_summary(deliveries.fast),
+			"slow_clients":latency_summary(deliveries.slow),
+			"slow_client_count":len(slow_clients),
+			"slow_clients_evicted":sum(1 for client in slow_clients if client.closed_code is not None),
+		}
+	finally:
+		await asyncio.gather(*(client.close() for client in clients))
+		await ws_manager.shutdown()
+
+	return {
+		"benchmark":"ws_fanout",
+		"users":args.users,
+		"devices_per_user":args.devices,
+		"slow_fraction":args.slow_fraction,
+		"results":results,
+		"failures":_check(results, args),
+	}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+	parser.add_argument("--users", type = int, default = 1000)
+	parser.add_argument("--devices", type = int, default = 3)
+	parser.add_argument("--rounds", type = int, default = 5)
+	parser.add_argument("--slow-fraction", type = float, default = 0.05)
+	parser.add_argument("--slow-delay-ms", type = float, default = 200, help = "per frame, for slow clients")
+	parser.add_argument("--slow-consumer-seconds", type = float, default = settings.REALTIME_SLOW_CONSUMER_SECONDS)
+	parser.add_argument("--soak-seconds", type = float, default = 0)
+	parser.add_argument("--soak-rate", type = int, default = 500, help = "events per second during the soak")
+	# Regression thresholds, loose enough for a laptop.
+	parser.add_argument("--max-delivery-p99-ms", type = float, default = 250)
+	parser.add_argument("--max-kb-per-connection", type = float, default = 64)
+	parser.add_argument("--min-connects-per-second", type = float, default = 500)
+	parser.add_argument("--max-soak-rss-growth-mb", type = float, default = 50)
+	report = asyncio.run(main(parser.parse_args()))
+	print(json.dumps(report, indent = 2))
+	sys.exit(1 if report["failures"] else 0)
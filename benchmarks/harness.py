@@ -0,0 +1,179 @@
+"""Boot the real FastAPI app in-process against local stand-ins, for benchmarks.
+
+- SQLite (aiosqlite) file database instead of Postgres; the global engine has asyncpg-only
+  connect_args, so get_db is overridden with an engine of our own.
+- fakeredis instead of Redis.
+- Local disk storage, or R2FileRepo talking to an in-process S3 stub ("r2-stub").
+
+Nothing listens on a socket: requests go through httpx's ASGI transport and WebSocket
+clients are driven over ASGI directly, so the numbers are the app's own cost.
+"""
+import os
+import shutil
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+from unittest.mock import patch
+
+# Stand-ins only; a developer's .env must not point the benchmark at real services.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("EMAIL_OUTBOX_ENABLED", "false")
+os.environ.setdefault("EMAIL_TRANSPORT", "local")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from fakeredis import aioredis as fake_aioredis  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.core import dependencies  # noqa: E402
+from app.core.database import Base, get_db  # noqa: E402
+from app.core.query_metrics import instrument_engine  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.core.settings import settings  # noqa: E402
+from app.main import app  # noqa: E402
+from app.storage.file_repo import FileRepo  # noqa: E402
+from app.storage.r2_repo import R2FileRepo  # noqa: E402
+from app.storage.redis_repo import RedisRepo  # noqa: E402
+from app.storage.sqlalchemy_repo import UserRepository  # noqa: E402
+
+
+class StubS3Client:
+	"""The boto3 S3 calls R2FileRepo makes, served from a local directory.
+
+	latency_seconds is added to every object operation to mimic a round-trip to R2.
+	"""
+
+	def __init__(self, root: Path, latency_seconds: float = 0.0):
+		self.root = root
+		self.latency_seconds = latency_seconds
+
+	def _path(self, bucket: str, key: str) -> Path:
+		return self.root / bucket / key
+
+	def _wait(self):
+		if self.latency_seconds:
+			time.sleep(self.latency_seconds)
+
+	def upload_file(self, filename: str, bucket: str, key: str):
+		self._wait()
+		target = self._path(bucket, key)
+		target.parent.mkdir(parents = True, exist_ok = True)
+		shutil.copyfile(filename, target)
+
+	def delete_object(self, Bucket: str, Key: str):
+		self._wait()
+		self._path(Bucket, Key).unlink(missing_ok = True)
+		return {}
+
+	def head_object(self, Bucket: str, Key: str):
+		self._wait()
+		return {"ContentLength":self._path(Bucket, Key).stat().st_size}
+
+	def get_object(self, Bucket: str, Key: str):
+		self._wait()
+		path = self._path(Bucket, Key)
+		return {"Body":path.open("rb"), "ContentLength":path.stat().st_size}
+
+	def generate_presigned_url(self, client_method: str, Params: dict, ExpiresIn: int):
+		return f"http://s3-stub.local/{Params['Bucket']}/{Params['Key']}?method={client_method}"
+
+
+class LocalStack:
+	def __init__(self, workdir: Path, storage: str, s3_latency_seconds: float):
+		self.workdir = workdir
+		self.engine = create_async_engine(f"sqlite+aiosqlite:///{workdir / 'bench.db'}")
+		instrument_engine(self.engine)
+		self.session_factory = async_sessionmaker(bind = self.engine, class_ = AsyncSession, expire_on_commit = False)
+		self.redis = fake_aioredis.FakeRedis(decode_responses = True)
+		self.upload_dir = workdir / "uploads"
+		if storage == "r2-stub":
+			self.file_repo = R2FileRepo(
+				upload_dir = self.upload_dir, endpoint = "http://s3-stub.local", bucket = "bench",
+				access_key_id = "bench", secret_access_key = "bench",
+			)
+			self.file_repo.client = StubS3Client(workdir / "s3", latency_seconds = s3_latency_seconds)
+		else:
+			self.file_repo = FileRepo(upload_dir = self.upload_dir)
+		self.app = app
+		self.client: Optional[httpx.AsyncClient] = None
+
+	def redis_repo(self) -> RedisRepo:
+		# RedisRepo builds its client from a URL; hand it the shared fake instead.
+		with patch("app.storage.redis_repo.aioredis.from_url", return_value = self.redis):
+			return RedisRepo("redis://bench.local")
+
+	async def get_db(self):
+		async with self.session_factory() as db:
+			yield db
+
+	async def create_users(self, count: int) -> List[dict]:
+		"""Users with access tokens; returns [{"id":..., "token":..., "headers":...}]."""
+		users = []
+		async with self.session_factory() as db:
+			repo = UserRepository(db)
+			for index in range(count):
+				name = f"bench-{index}-{time.monotonic_ns()}"
+				user = await repo.create_user(name, "not-a-real-hash", f"{name}@bench.local")
+				token = create_access_token(user.id)
+				users.append({"id":user.id, "token":token, "headers":{"Authorization":f"Bearer {token}"}})
+		return users
+
+
+@asynccontextmanager
+async def local_stack(workdir: Path, storage: str = "local", s3_latency_seconds: float = 0.0):
+	"""The app wired to SQLite, fakeredis and local/stub storage, with an httpx client."""
+	stack = LocalStack(workdir, storage, s3_latency_seconds)
+	settings.UPLOAD_DIR = str(stack.upload_dir)
+	async with stack.engine.begin() as conn:
+		await conn.run_sync(Base.metadata.create_all)
+	redis_repo = stack.redis_repo()
+	overrides = {
+		get_db:stack.get_db,
+		dependencies.get_redis_repo:lambda:redis_repo,
+		dependencies.get_file_repo:lambda:stack.file_repo,
+	}
+	app.dependency_overrides.update(overrides)
+	transport = httpx.ASGITransport(app = app)
+	try:
+		async with httpx.AsyncClient(transport = transport, base_url = "http://bench.local", timeout = 60) as client:
+			stack.client = client
+			yield stack
+	finally:
+		for key in overrides:
+			app.dependency_overrides.pop(key, None)
+		await stack.engine.dispose()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+	if not sorted_values:
+		return 0.0
+	index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+	return sorted_values[index]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+	"""p50/p95/p99/max in milliseconds."""
+	values = sorted(latencies)
+	return {
+		"count":len(values),
+		"p50_ms":round(percentile(values, 50) * 1000, 3),
+		"p95_ms":round(percentile(values, 95) * 1000, 3),
+		"p99_ms":round(percentile(values, 99) * 1000, 3),
+		"max_ms":round(values[-1] * 1000, 3) if values else 0.0,
+	}
+
+
+def rss_mb() -> float:
+	"""Current resident set size (Linux), else the peak reported by getrusage."""
+	try:
+		with open("/proc/self/statm") as statm:
+			pages = int(statm.read().split()[1])
+		return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+	except (OSError, ValueError, IndexError):
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# kilobytes on Linux, bytes on macOS
+		return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
@@ -206,6 +206,11 @@ const SendMeResponsive = () => {
         ws.onmessage = (event) => {
             try {
                 const payload = JSON.parse(event.data);
+                if (payload?.event === 'ping') {
+                    // Server heartbeat: answer so the connection is not reaped, no refresh needed.
+                    ws.send('pong');
+                    return;
+                }
                 const deletingId = deletingMessageIdRef.current;
                 if (
                     deletingId &&
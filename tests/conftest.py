@@ -1,9 +1,11 @@
 import asyncio
+from contextlib import contextmanager
 
 import pytest
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
 from app.core.database import Base
+from app.core.query_metrics import count_queries, instrument_engine
 from app.storage.sqlalchemy_repo import UserRepository, MessageRepository
 
 
@@ -16,7 +18,9 @@ def engine():
 	The 'sqlite+aiosqlite' prefix is required for async support.
 	Using ':memory:' ensures a fresh database for each test session.
 	"""
-	return create_async_engine("sqlite+aiosqlite:///:memory:", echo = False)
+	engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo = False)
+	instrument_engine(engine)
+	return engine
 
 
 # --- Schema Management ---
@@ -78,6 +82,26 @@ async def message_db(db_session: AsyncSession) -> MessageRepository:
 	return MessageRepository(db_session)
 
 
+# --- Query Budgets ---
+
+@pytest.fixture
+def assert_max_queries():
+	"""
+	Fail when the wrapped block runs more SQL statements than allowed:
+
+		with assert_max_queries(2):
+			await message_db.delete_message(message_id)
+	"""
+
+	@contextmanager
+	def _assert_max_queries(max_count: int):
+		with count_queries() as counter:
+			yield counter
+		assert counter.count <= max_count, f"expected at most {max_count} queries, ran {counter.count}"
+
+	return _assert_max_queries
+
+
 # --- Event Loop Management ---
 
 @pytest.fixture(scope = "session")
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from datetime import datetime, timezone
 from tempfile import TemporaryDirectory
@@ -41,6 +42,9 @@ class FakeMessageService:
 	async def get_history(self, user_id: int, page: int = 1):
 		return list(reversed(self.messages))
 
+	async def get_history_json(self, user_id: int, page: int = 1, content_chars: int = 0):
+		return json.dumps(await self.get_history(user_id, page)).encode()
+
 	async def delete_message(self, message_id: int, user_id: int):
 		return True
 
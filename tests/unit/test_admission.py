@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import security
+from app.core.admission import AdmissionRejected, UploadAdmissionController, UploadAdmissionMiddleware
+
+
+async def test_global_limit_queues_then_admits_on_release():
+	controller = UploadAdmissionController(max_concurrent = 1, max_waiters = 1, wait_seconds = 1)
+	first = await controller.acquire(1, 10)
+
+	waiter = asyncio.create_task(controller.acquire(2, 10))
+	await asyncio.sleep(0)
+	assert controller.stats()["waiting"] == 1
+
+	await controller.release(first)
+	second = await waiter
+	assert controller.stats()["in_flight"] == 1
+	await controller.release(second)
+	assert controller.stats()["in_flight_bytes"] == 0
+
+
+async def test_full_queue_is_rejected_immediately():
+	controller = UploadAdmissionController(max_concurrent = 1, max_waiters = 0, retry_after_seconds = 3)
+	ticket = await controller.acquire(1, 10)
+
+	with pytest.raises(AdmissionRejected) as exc_info:
+		await controller.acquire(2, 10)
+	assert exc_info.value.retry_after == 3
+	assert controller.stats()["rejected_total"] == 1
+	await controller.release(ticket)
+
+
+async def test_wait_times_out():
+	controller = UploadAdmissionController(max_concurrent = 1, max_waiters = 5, wait_seconds = 0.01)
+	ticket = await controller.acquire(1, 10)
+
+	with pytest.raises(AdmissionRejected, match = "timed out"):
+		await controller.acquire(2, 10)
+	assert controller.stats()["waiting"] == 0
+	await controller.release(ticket)
+
+
+async def test_per_user_limit_and_inflight_bytes():
+	controller = UploadAdmissionController(
+		max_concurrent = 10, max_per_user = 1, max_inflight_bytes = 100, max_waiters = 0
+	)
+	ticket = await controller.acquire(1, 60)
+
+	with pytest.raises(AdmissionRejected, match = "this user"):
+		await controller.acquire(1, 1)
+	with pytest.raises(AdmissionRejected, match = "queue full"):
+		await controller.acquire(2, 50)
+	other = await controller.acquire(2, 40)
+
+	await controller.release(ticket)
+	await controller.release(other)
+	# Oversized uploads still go through when nothing else is running.
+	await controller.release(await controller.acquire(3, 500))
+
+
+def test_middleware_rejects_with_503_and_retry_after():
+	controller = UploadAdmissionController(max_concurrent = 1, max_per_user = 1, retry_after_seconds = 7)
+	app = FastAPI()
+
+	@app.post("/upload")
+	async def upload(request: Request):
+		await request.body()
+		return {"stats":controller.stats()}
+
+	app.add_middleware(UploadAdmissionMiddleware, controller = controller, paths = ("/upload",))
+	client = TestClient(app)
+	headers = {"Authorization":f"Bearer {security.create_access_token(5)}"}
+
+	resp = client.post("/upload", content = b"x" * 10, headers = headers)
+	assert resp.status_code == 200
+	assert resp.json()["stats"]["in_flight_bytes"] == 10
+	assert controller.stats()["in_flight"] == 0
+
+	controller._per_user[5] = 1
+	rejected = client.post("/upload", content = b"x", headers = headers)
+	assert rejected.status_code == 503
+	assert rejected.headers["Retry-After"] == "7"
+
+	# Anonymous uploads never reach the controller, so they cannot use up its slots.
+	admitted = controller.stats()["admitted_total"]
+	for anonymous in ({}, {"Authorization":"Bearer not-a-token"}):
+		response = client.post("/upload", content = b"x", headers = anonymous)
+		assert response.status_code == 401
+		assert response.headers["WWW-Authenticate"] == "Basic"
+	assert controller.stats()["admitted_total"] == admitted
@@ -29,6 +29,20 @@ def test_request_otp_success():
 	assert resp.json()["message"] == "Verification code sent."
 
 
+def test_request_otp_queued_returns_202():
+	service = AsyncMock()
+	service.request_register_otp.return_value = {"message": "Verification code queued.", "delivery": "queued"}
+	client = build_app(service)
+
+	resp = client.post(
+		"/api/v1/auth/request-otp",
+		json={"email": "u@example.com", "username": "user1", "password": "password123"},
+	)
+
+	assert resp.status_code == 202
+	assert resp.json()["delivery"] == "queued"
+
+
 def test_request_otp_rate_limit():
 	service = AsyncMock()
 	service.request_register_otp.side_effect = RateLimitError("too fast")
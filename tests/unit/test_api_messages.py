@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from datetime import datetime, timezone
 from tempfile import TemporaryDirectory
@@ -9,12 +10,14 @@ from fastapi.testclient import TestClient
 from app.api import router as message_router_module
 from app.api.router import router as message_router
 from app.core import security
+from app.core.settings import settings
 from app.core.dependencies import (
 	get_current_user_id,
 	get_file_repo,
 	get_file_service,
 	get_message_service,
 )
+from app.services.exceptions import MessageNotFoundError, MessagePermissionError
 from app.storage.file_repo import FileRepo
 
 
@@ -40,7 +43,7 @@ def test_send_text_and_history(monkeypatch):
 		file_repo = FileRepo(upload_dir=Path(tmp))
 
 		message_service.create_text_message.return_value = _msg_payload(1)
-		message_service.get_history.return_value = [_msg_payload(1)]
+		message_service.get_history_json.return_value = json.dumps([_msg_payload(1)]).encode()
 
 		app = FastAPI()
 		app.include_router(message_router, prefix="/api/v1")
@@ -58,6 +61,30 @@ def test_send_text_and_history(monkeypatch):
 		history = client.get("/api/v1/messages/history")
 		assert history.status_code == 200
 		assert len(history.json()) == 1
+		message_service.get_history_json.assert_awaited_with(user_id = 1, page = 1, content_chars = 0)
+
+		client.get("/api/v1/messages/history", params = {"content_chars":200})
+		message_service.get_history_json.assert_awaited_with(user_id = 1, page = 1, content_chars = 200)
+
+
+def test_get_message_content(monkeypatch):
+	message_service = AsyncMock()
+	app = FastAPI()
+	app.include_router(message_router, prefix="/api/v1")
+	app.dependency_overrides[get_current_user_id] = lambda: 1
+	app.dependency_overrides[get_message_service] = lambda: message_service
+	client = TestClient(app)
+
+	message_service.get_message_content.return_value = "the whole text"
+	resp = client.get("/api/v1/messages/5/content")
+	assert resp.status_code == 200
+	assert resp.json() == {"id": 5, "content": "the whole text"}
+	message_service.get_message_content.assert_awaited_with(message_id = 5, user_id = 1)
+
+	message_service.get_message_content.side_effect = MessagePermissionError("Message Permission denied.")
+	assert client.get("/api/v1/messages/5/content").status_code == 403
+	message_service.get_message_content.side_effect = MessageNotFoundError("Message not found.")
+	assert client.get("/api/v1/messages/6/content").status_code == 404
 
 
 def test_upload_download_view(monkeypatch):
@@ -191,4 +218,19 @@ def test_direct_upload_api_flow(monkeypatch):
 	)
 	assert complete.status_code == 200
 	assert complete.json()["id"] == 3
+	assert "Server-Timing" not in complete.headers
 	ws_broadcast.assert_awaited()
+
+	monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", True)
+	timed = client.post(
+		"/api/v1/messages/upload-complete",
+		json={
+			"fileName":"demo.txt",
+			"fileSize":4,
+			"fileType":"text/plain",
+			"filePath":"1/demo.txt",
+			"device":"desktop",
+			"type":"file",
+		},
+	)
+	assert timed.headers["Server-Timing"].startswith("broadcast;dur=")
@@ -44,3 +44,17 @@ def test_ws_receive_user_event(monkeypatch):
 	with client.websocket_connect("/api/v1/ws/messages?token=ok") as websocket:
 		asyncio.run(ws_manager.send_personal_message(1, {"event":"message.updated", "message_id":7}))
 		assert websocket.receive_json() == {"event":"message.updated", "message_id":7}
+
+
+def test_ws_msgpack_subprotocol(monkeypatch):
+	msgpack = pytest.importorskip("msgpack")
+	app = FastAPI()
+	app.include_router(ws_router, prefix = "/api/v1")
+	client = TestClient(app)
+
+	monkeypatch.setattr("app.api.ws.get_user_id_from_token", lambda _token: 2)
+
+	with client.websocket_connect("/api/v1/ws/messages?token=ok", subprotocols = ["sendme.msgpack"]) as websocket:
+		assert websocket.accepted_subprotocol == "sendme.msgpack"
+		asyncio.run(ws_manager.send_personal_message(2, {"event":"message.deleted", "message_id":8}))
+		assert msgpack.unpackb(websocket.receive_bytes()) == {"event":"message.deleted", "message_id":8}
@@ -2,8 +2,10 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from app.core.enums import OtpStatus
 from app.services.auth_service import AuthService
 from app.services.exceptions import OtpInvalidError, OtpLockedError, RateLimitError
+from app.storage.exceptions import UserConstraintError
 
 
 @pytest.fixture
@@ -11,7 +13,7 @@ def mock_repos():
 	return {
 		"user_repo": AsyncMock(),
 		"token_repo": AsyncMock(),
-		"redis_repo": AsyncMock(),
+		"redis_repo": AsyncMock(**{"otp_request_status.return_value":OtpStatus.ok}),
 	}
 
 
@@ -27,8 +29,7 @@ def auth_service(mock_repos):
 @pytest.mark.asyncio
 class TestAuthService:
 	async def test_request_otp_success_create_user(self, auth_service, mock_repos, monkeypatch):
-		mock_repos["redis_repo"].is_otp_locked.return_value = False
-		mock_repos["redis_repo"].has_otp_cooldown.return_value = False
+		mock_repos["redis_repo"].begin_otp_request.return_value = OtpStatus.ok
 		mock_repos["user_repo"].get_user_by_email.return_value = None
 		mock_repos["user_repo"].get_user_by_username.return_value = None
 
@@ -46,24 +47,62 @@ class TestAuthService:
 			email = "user@test.com",
 			is_verified = False,
 		)
-		mock_repos["redis_repo"].set_otp.assert_awaited_once()
+		mock_repos["redis_repo"].begin_otp_request.assert_awaited_once_with("user@test.com", "123456")
 		mock_send.assert_awaited_once_with("user@test.com", "testuser", "123456")
 
+	async def test_request_otp_queues_email_when_outbox_configured(self, auth_service, mock_repos, monkeypatch):
+		mock_repos["redis_repo"].begin_otp_request.return_value = OtpStatus.ok
+		mock_repos["user_repo"].get_user_by_email.return_value = None
+		mock_repos["user_repo"].get_user_by_username.return_value = None
+		monkeypatch.setattr("app.core.security.hash_password", lambda _pw: "hashed")
+		mock_send = AsyncMock()
+		monkeypatch.setattr("app.services.auth_service.notification_service.send_verification_mail", mock_send)
+		auth_service.email_outbox = AsyncMock()
+
+		result = await auth_service.request_register_otp("user@test.com", "testuser", "password123")
+
+		assert result["delivery"] == "queued"
+		message = auth_service.email_outbox.enqueue.await_args.args[0]
+		assert message["to"] == ["user@test.com"]
+		mock_send.assert_not_awaited()
+		mock_repos["user_repo"].create_user.assert_awaited_once()
+
 	async def test_request_otp_rate_limited(self, auth_service, mock_repos):
-		mock_repos["redis_repo"].is_otp_locked.return_value = False
-		mock_repos["redis_repo"].has_otp_cooldown.return_value = True
+		mock_repos["redis_repo"].otp_request_status.return_value = OtpStatus.cooldown
 
 		with pytest.raises(RateLimitError):
 			await auth_service.request_register_otp("user@test.com", "testuser", "password123")
+		# Rejected before touching the database.
+		mock_repos["user_repo"].get_user_by_email.assert_not_awaited()
+		mock_repos["user_repo"].get_user_by_username.assert_not_awaited()
 
 	async def test_request_otp_locked(self, auth_service, mock_repos):
-		mock_repos["redis_repo"].is_otp_locked.return_value = True
+		mock_repos["redis_repo"].otp_request_status.return_value = OtpStatus.locked
 		with pytest.raises(OtpLockedError):
 			await auth_service.request_register_otp("user@test.com", "testuser", "password123")
+		mock_repos["user_repo"].get_user_by_email.assert_not_awaited()
+		mock_repos["redis_repo"].begin_otp_request.assert_not_awaited()
+
+	async def test_request_otp_taken_username_keeps_pending_code(self, auth_service, mock_repos):
+		mock_repos["user_repo"].get_user_by_email.return_value = None
+		mock_repos["user_repo"].get_user_by_username.return_value = MagicMock(id = 2)
+
+		with pytest.raises(UserConstraintError):
+			await auth_service.request_register_otp("user@test.com", "taken", "password123")
+		# A rejected request never writes OTP state, so a code already emailed stays valid.
+		mock_repos["redis_repo"].begin_otp_request.assert_not_awaited()
+
+	async def test_request_otp_loses_race_to_concurrent_request(self, auth_service, mock_repos):
+		mock_repos["redis_repo"].begin_otp_request.return_value = OtpStatus.cooldown
+		mock_repos["user_repo"].get_user_by_email.return_value = None
+		mock_repos["user_repo"].get_user_by_username.return_value = None
+
+		with pytest.raises(RateLimitError):
+			await auth_service.request_register_otp("user@test.com", "testuser", "password123")
+		mock_repos["user_repo"].create_user.assert_not_awaited()
 
 	async def test_register_with_otp_success(self, auth_service, mock_repos):
-		mock_repos["redis_repo"].is_otp_locked.return_value = False
-		mock_repos["redis_repo"].get_otp.return_value = "123456"
+		mock_repos["redis_repo"].verify_otp.return_value = OtpStatus.ok
 
 		user = MagicMock()
 		user.id = 1
@@ -77,16 +116,30 @@ class TestAuthService:
 
 		assert result["username"] == "testuser"
 		mock_repos["user_repo"].update_user.assert_awaited_once_with(user.id, {"is_verified": True})
-		mock_repos["redis_repo"].clear_otp_state.assert_awaited_once_with("user@test.com")
+		mock_repos["redis_repo"].verify_otp.assert_awaited_once_with("user@test.com", "123456")
+
+	async def test_register_with_otp_restores_code_when_db_write_fails(self, auth_service, mock_repos):
+		mock_repos["redis_repo"].verify_otp.return_value = OtpStatus.ok
+		mock_repos["user_repo"].get_user_by_email.return_value = MagicMock(id = 1, is_verified = False)
+		mock_repos["user_repo"].update_user.side_effect = RuntimeError("db down")
+
+		with pytest.raises(RuntimeError):
+			await auth_service.register_with_otp("user@test.com", "123456")
+		mock_repos["redis_repo"].restore_otp.assert_awaited_once_with("user@test.com", "123456")
 
 	async def test_register_with_otp_invalid(self, auth_service, mock_repos):
-		mock_repos["redis_repo"].is_otp_locked.return_value = False
-		mock_repos["redis_repo"].get_otp.return_value = "111111"
-		mock_repos["redis_repo"].incr_otp_attempts.return_value = 1
+		mock_repos["redis_repo"].verify_otp.return_value = OtpStatus.invalid
 
 		with pytest.raises(OtpInvalidError):
 			await auth_service.register_with_otp("user@test.com", "000000")
 
+	async def test_register_with_otp_locked(self, auth_service, mock_repos):
+		mock_repos["redis_repo"].verify_otp.return_value = OtpStatus.locked
+
+		with pytest.raises(OtpLockedError):
+			await auth_service.register_with_otp("user@test.com", "000000")
+		mock_repos["user_repo"].update_user.assert_not_awaited()
+
 	async def test_login_success(self, auth_service, mock_repos, monkeypatch):
 		monkeypatch.setattr("app.core.security.verify_password", lambda _p, _h: True)
 		monkeypatch.setattr("app.core.security.password_needs_rehash", lambda _h: False)
@@ -127,16 +180,21 @@ class TestAuthService:
 		fake_payload = {"type": "refresh", "sub": "99", "jti": "some-uuid"}
 		monkeypatch.setattr("app.core.security.decode_token", lambda _t: fake_payload)
 		monkeypatch.setattr("app.core.security.create_access_token", lambda _uid: "new_access_token")
-		mock_repos["token_repo"].get_unused_token.return_value = MagicMock()
+		monkeypatch.setattr("app.core.security.create_refresh_token", lambda _uid, _jti: "new_refresh_token")
+		mock_repos["token_repo"].rotate_token_record.return_value = True
 
 		result = await auth_service.refresh_access_token("valid_refresh_token")
 
 		assert result["access_token"] == "new_access_token"
-		mock_repos["token_repo"].get_unused_token.assert_awaited_once_with("some-uuid")
+		assert result["refresh_token"] == "new_refresh_token"
+		kwargs = mock_repos["token_repo"].rotate_token_record.await_args.kwargs
+		assert kwargs["old_jti"] == "some-uuid"
+		assert kwargs["user_id"] == 99
+		assert kwargs["new_jti"] != "some-uuid"
 
 	async def test_refresh_token_revoked(self, auth_service, mock_repos, monkeypatch):
 		monkeypatch.setattr("app.core.security.decode_token", lambda _t: {"type": "refresh", "sub": "99", "jti": "revoked-jti"})
-		mock_repos["token_repo"].get_unused_token.return_value = None
+		mock_repos["token_repo"].rotate_token_record.return_value = False
 
 		with pytest.raises(ValueError, match = "Refresh token has been revoked or used."):
 			await auth_service.refresh_access_token("revoked_token")
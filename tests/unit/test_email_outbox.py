@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fakeredis import aioredis as fake_aioredis
+
+from app.services.email_transport import EmailTransport, LocalTransport
+from app.services.email_worker import EmailOutboxWorker
+from app.storage.email_outbox import EmailOutbox
+
+MESSAGE = {"from":"SendMe <a@b.c>", "to":["u@example.com"], "subject":"Code", "html":"<p>1</p>"}
+
+
+class FlakyTransport(EmailTransport):
+	def __init__(self, failures: int):
+		self.failures = failures
+		self.sent = []
+
+	async def send(self, message: dict):
+		if self.failures:
+			self.failures -= 1
+			raise RuntimeError("provider down")
+		self.sent.append(message)
+
+
+@pytest.fixture
+def outbox():
+	return EmailOutbox(fake_aioredis.FakeRedis(decode_responses = True))
+
+
+async def test_enqueue_and_dequeue_in_order(outbox):
+	first = await outbox.enqueue({**MESSAGE, "subject":"1"})
+	await outbox.enqueue({**MESSAGE, "subject":"2"})
+
+	envelope = await outbox.dequeue(timeout = 0.1)
+	assert envelope["id"] == first
+	assert envelope["message"]["subject"] == "1"
+	assert envelope["attempts"] == 0
+	assert (await outbox.stats())["ready"] == 1
+
+
+async def test_failed_delivery_is_retried_with_backoff(outbox):
+	transport = FlakyTransport(failures = 1)
+	worker = EmailOutboxWorker(outbox, transport, retry_base_seconds = 0, max_attempts = 3)
+	await outbox.enqueue(MESSAGE)
+
+	assert await worker.deliver(await outbox.dequeue(timeout = 0.1)) is False
+	assert (await outbox.stats())["retrying"] == 1
+
+	assert await outbox.promote_due_retries() == 1
+	envelope = await outbox.dequeue(timeout = 0.1)
+	assert envelope["attempts"] == 1
+	assert await worker.deliver(envelope) is True
+	assert transport.sent == [MESSAGE]
+
+
+async def test_exhausted_message_is_dead_lettered(outbox):
+	worker = EmailOutboxWorker(outbox, FlakyTransport(failures = 5), max_attempts = 1)
+	await outbox.enqueue(MESSAGE)
+
+	await worker.deliver(await outbox.dequeue(timeout = 0.1))
+
+	dead = await outbox.get_dead_letters()
+	assert len(dead) == 1
+	assert dead[0]["error"] == "provider down"
+	# The rendered body (OTP code) is not kept and the recipient is masked.
+	assert dead[0]["message"] == {"subject":"Code", "to":["u***@example.com"]}
+	assert await outbox.stats() == {"ready":0, "retrying":0, "dead":1}
+
+
+async def test_dead_letters_are_capped_and_expire():
+	client = fake_aioredis.FakeRedis(decode_responses = True)
+	outbox = EmailOutbox(client, dead_letter_max = 2, dead_letter_ttl_seconds = 60)
+	for index in range(3):
+		await outbox.dead_letter({"id":str(index), "message":MESSAGE, "attempts":5}, "provider down")
+
+	assert [record["id"] for record in await outbox.get_dead_letters()] == ["2", "1"]
+	assert 0 < await client.ttl(outbox.dead_key) <= 60
+
+
+async def test_failure_is_not_retried_past_expiry(outbox):
+	worker = EmailOutboxWorker(outbox, FlakyTransport(failures = 1), retry_base_seconds = 30, max_attempts = 3)
+	await outbox.enqueue(MESSAGE, ttl_seconds = 10)
+
+	assert await worker.deliver(await outbox.dequeue(timeout = 0.1)) is False
+	assert await outbox.stats() == {"ready":0, "retrying":0, "dead":0}
+
+
+def test_retry_delay_doubles_up_to_max(outbox):
+	worker = EmailOutboxWorker(outbox, LocalTransport(), retry_base_seconds = 2, retry_max_seconds = 10)
+	assert [worker.retry_delay(n) for n in (1, 2, 3, 4)] == [2, 4, 8, 10]
+
+
+async def test_expired_message_is_dropped(outbox):
+	transport = LocalTransport()
+	worker = EmailOutboxWorker(outbox, transport)
+	await outbox.enqueue(MESSAGE, ttl_seconds = 300)
+	envelope = await outbox.dequeue(timeout = 0.1)
+	envelope["expires_at"] = 0
+
+	assert await worker.deliver(envelope) is False
+	assert transport.sent == []
+
+
+async def test_worker_run_delivers_queued_messages(outbox):
+	transport = LocalTransport()
+	worker = EmailOutboxWorker(outbox, transport, concurrency = 2)
+	for i in range(3):
+		await outbox.enqueue({**MESSAGE, "subject":str(i)})
+
+	stop_event = asyncio.Event()
+	task = asyncio.create_task(worker.run(stop_event, poll_seconds = 0.05))
+	for _ in range(50):
+		if len(transport.sent) == 3:
+			break
+		await asyncio.sleep(0.01)
+	stop_event.set()
+	await task
+	await worker.drain()
+
+	assert sorted(m["subject"] for m in transport.sent) == ["0", "1", "2"]
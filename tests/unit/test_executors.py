@@ -0,0 +1,61 @@
+import contextvars
+import threading
+
+from app.core.executors import InstrumentedThreadPool, executor_stats, run_in
+
+
+async def test_run_in_uses_dedicated_pool_and_records_stats():
+	pool = InstrumentedThreadPool("test", max_workers = 2)
+	try:
+		thread_name = await run_in(pool, lambda:threading.current_thread().name)
+		assert thread_name.startswith("sendme-test")
+		assert await run_in(pool, pow, 2, 10) == 1024
+
+		stats = pool.stats()
+		assert stats["completed"] == 2
+		assert stats["queued"] == 0
+		assert stats["active"] == 0
+		assert stats["max_workers"] == 2
+	finally:
+		pool.shutdown()
+
+
+def test_queue_depth_counts_waiting_tasks():
+	pool = InstrumentedThreadPool("depth", max_workers = 1)
+	release = threading.Event()
+	try:
+		running = pool.submit(release.wait)
+		waiting = pool.submit(lambda:None)
+		assert pool.stats()["queued"] >= 1
+		release.set()
+		running.result()
+		waiting.result()
+		assert pool.stats()["queued"] == 0
+		assert pool.stats()["completed"] == 2
+	finally:
+		pool.shutdown()
+
+
+def test_executor_stats_lists_named_pools():
+	assert set(executor_stats()) == {"disk", "storage", "cpu"}
+
+
+async def test_run_in_propagates_contextvars():
+	request_id = contextvars.ContextVar("request_id", default = None)
+	request_id.set("abc")
+	pool = InstrumentedThreadPool("ctx", max_workers = 1)
+	try:
+		assert await run_in(pool, request_id.get) == "abc"
+	finally:
+		pool.shutdown()
+
+
+async def test_pool_restarts_after_shutdown():
+	pool = InstrumentedThreadPool("restart", max_workers = 1)
+	assert await run_in(pool, pow, 2, 3) == 8
+	pool.shutdown()
+	try:
+		assert await run_in(pool, pow, 3, 2) == 9
+		assert pool.stats()["completed"] == 2
+	finally:
+		pool.shutdown()
@@ -226,6 +226,25 @@ class TestFileService:
 		redis_repo.delete_timer.assert_awaited_once_with(10)
 		redis_repo.decr_storage_used_bytes.assert_awaited_once_with(50)
 
+	async def test_delete_file_by_system_uses_deleted_row(self, file_service):
+		service, file_repo, message_repo, user_repo, redis_repo = file_service
+		message_repo.delete_message_row.return_value = SimpleNamespace(file_size = 50, file_path = "3/a.txt", user_id = 3)
+
+		assert await service.delete_file_by_system(message_id = 10) is True
+
+		message_repo.get_by_message_id.assert_not_awaited()
+		user_repo.update_used_capacity.assert_awaited_once_with(3, -50)
+		file_repo.delete.assert_awaited_once_with("3/a.txt", is_temp = False)
+		redis_repo.decr_storage_used_bytes.assert_awaited_once_with(50)
+
+	async def test_delete_file_by_system_not_found(self, file_service):
+		service, _, message_repo, user_repo, _ = file_service
+		message_repo.delete_message_row.return_value = None
+
+		with pytest.raises(RepoMessageNotFoundError):
+			await service.delete_file_by_system(message_id = 10)
+		user_repo.update_used_capacity.assert_not_awaited()
+
 	async def test_delete_existing_file_permission_denied(self, file_service):
 		service, _, message_repo, _, _ = file_service
 		message_repo.get_by_message_id.return_value = SimpleNamespace(user_id = 2, file_path = "1/a.txt")
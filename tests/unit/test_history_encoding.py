@@ -0,0 +1,84 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.core.enums import DeviceType, MessageStatus, MessageType
+from app.core.orm_models import Message
+from app.core.utils import format_file_size
+from app.schemas.schemas import MessageResponse, encode_message_rows
+from app.storage.sqlalchemy_repo import HISTORY_COLUMNS, MessageRepository
+
+_history_field = create_response_field(name = "Response_get_history", type_ = List[MessageResponse])
+
+
+async def _fastapi_body(messages) -> bytes:
+	"""What response_model=list[MessageResponse] renders for the same messages."""
+	return JSONResponse(await serialize_response(field = _history_field, response_content = messages)).body
+
+
+def _rows(messages):
+	return [(*(getattr(message, column.key) for column in HISTORY_COLUMNS), False) for message in messages]
+
+
+def _messages(created_at: datetime):
+	common = {"user_id":1, "status":MessageStatus.sent, "created_at":created_at, "updated_at":created_at}
+	return [
+		Message(id = 1, type = MessageType.text, content = "héllo \"quoted\"\n", device = DeviceType.phone, **common),
+		Message(
+			id = 2, type = MessageType.image, file_name = "a.png", mime_type = "image/png", file_path = "1/a.png",
+			file_size = 1536, device = DeviceType.desktop, **common,
+		),
+		Message(
+			id = 3, type = MessageType.file, file_name = "b.pdf", mime_type = "application/pdf",
+			file_path = "1/b.pdf", file_size = 5 * 1024 * 1024 + 17, device = DeviceType.desktop, **common,
+		),
+		# Zero-size file and an image without a path: fileSize and imageUrl stay null.
+		Message(id = 4, type = MessageType.file, file_name = "empty", file_path = "1/e", file_size = 0,
+			device = DeviceType.phone, **common),
+		Message(id = 5, type = MessageType.image, file_size = None, device = DeviceType.phone, **common),
+	]
+
+
+async def test_encoder_matches_fastapi_for_aware_and_naive_datetimes():
+	for created_at in (
+			datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo = timezone.utc),
+			datetime(2025, 1, 2, 3, 4, 5, tzinfo = timezone.utc),
+			datetime(2025, 1, 2, 3, 4, 5, 1, tzinfo = timezone(timedelta(hours = 2))),
+			datetime(2025, 1, 2, 3, 4, 5, 250000),
+	):
+		messages = _messages(created_at)
+		assert encode_message_rows(_rows(messages)) == await _fastapi_body(messages)
+
+
+async def test_history_rows_encode_like_orm_messages(db_session):
+	repo = MessageRepository(db_session)
+	now = datetime.now(timezone.utc)
+	for index, message in enumerate(_messages(now)):
+		data = {column.key:getattr(message, column.key) for column in Message.__table__.columns}
+		data.pop("id")
+		data["created_at"] = now - timedelta(seconds = index)
+		await repo.create_message({key:value for key, value in data.items() if value is not None})
+
+	rows = await repo.get_history_rows(user_id = 1, limit = 20, offset = 0)
+	orm_messages = await repo.get_by_user(user_id = 1, limit = 20, offset = 0)
+
+	assert len(rows) == 5
+	assert encode_message_rows(rows) == await _fastapi_body(orm_messages)
+
+
+def test_format_file_size_matches_log_based_formula():
+	def reference(byte_count):
+		units = ["Bytes", "KB", "MB", "GB", "TB"]
+		i = int(math.floor(math.log(byte_count, 1024)))
+		return f"{round(byte_count / math.pow(1024, i), 2)} {units[i]}"
+
+	values = [1, 7, 1023, 1024, 1025, 1536, 10 ** 6, 1024 ** 2 - 1, 1024 ** 2, 25 * 1024 ** 2 + 3, 1024 ** 4 - 1]
+	values += list(range(1, 5000, 37)) + [1024 ** 3 * 9 + 12345]
+	for value in values:
+		assert format_file_size(value) == reference(value)
+	assert format_file_size(0) == "0 Bytes"
+	assert format_file_size(-5) == "0 Bytes"
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+import time
+
+from app.core.loop_monitor import LoopMonitor
+
+
+def _blocking_call():
+	time.sleep(0.25)
+
+
+async def test_lag_is_measured_and_blocking_stack_is_logged(caplog):
+	monitor = LoopMonitor(interval_seconds = 0.01, capture_stacks = True, block_threshold_seconds = 0.05)
+	monitor.start()
+	with caplog.at_level(logging.WARNING, logger = "uvicorn.error"):
+		await asyncio.sleep(0.03)
+		_blocking_call()
+		await asyncio.sleep(0.05)
+		await monitor.stop()
+
+	assert monitor.max_lag_seconds >= 0.2
+	blocked = [record.getMessage() for record in caplog.records if "loop.blocked" in record.getMessage()]
+	assert len(blocked) == 1
+	assert "_blocking_call" in blocked[0]
+
+
+async def test_monitor_without_debug_starts_no_watchdog():
+	monitor = LoopMonitor(interval_seconds = 0.01, capture_stacks = False)
+	monitor.start()
+	await asyncio.sleep(0.03)
+	assert monitor._watchdog is None
+	await monitor.stop()
+	assert monitor._task is None
@@ -1,3 +1,4 @@
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -47,6 +48,21 @@ class TestMessageService:
 		# assert：offset (2-1)*10 = 10
 		message_repo.get_by_user.assert_called_once_with(1, 10, 10)
 
+	async def test_get_history_json_encodes_projected_rows(self, mock_repos):
+		service, message_repo, _, _, _ = mock_repos
+		message_repo.get_history_rows.return_value = []
+
+		assert await service.get_history_json(user_id = 1, page = 3, page_size = 10) == b"[]"
+		message_repo.get_history_rows.assert_called_once_with(1, 10, 20, content_chars = 0)
+
+	async def test_get_message_content_checks_owner(self, mock_repos):
+		service, message_repo, _, _, _ = mock_repos
+		message_repo.get_content.return_value = SimpleNamespace(user_id = 1, content = "full text")
+
+		assert await service.get_message_content(message_id = 9, user_id = 1) == "full text"
+		with pytest.raises(MessagePermissionError):
+			await service.get_message_content(message_id = 9, user_id = 2)
+
 	async def test_delete_text_message_success(self, mock_repos):
 		service, message_repo, _, _, redis_repo = mock_repos
 
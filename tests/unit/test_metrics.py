@@ -0,0 +1,128 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import (
+	REQUEST_DURATION, MetricsMiddleware, MetricsRegistry, MultiprocessStore, merge_snapshots, render,
+)
+from app.core.settings import settings
+from app.core.timing import STAGE_DURATION, stage, track
+from app.main import app
+
+
+def test_histogram_renders_cumulative_buckets():
+	registry = MetricsRegistry()
+	histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets = (0.1, 1.0))
+	child = histogram.labels("/a")
+	for value in (0.05, 0.5, 5):
+		child.observe(value)
+
+	text = render(registry.snapshot())
+
+	assert '# TYPE latency_seconds histogram' in text
+	assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+	assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+	assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+	assert 'latency_seconds_sum{route="/a"} 5.55' in text
+	assert 'latency_seconds_count{route="/a"} 3' in text
+
+
+def test_counters_gauges_and_collectors():
+	registry = MetricsRegistry()
+	registry.counter("jobs_total", "Jobs.").inc(2)
+	registry.gauge("queue_depth", "Depth.", ("queue",)).labels('we"ird').set(4)
+	registry.add_collector(lambda:[("sockets", "Open sockets.", {"device":"phone"}, 3)])
+
+	text = render(registry.snapshot())
+
+	assert "jobs_total 2" in text
+	assert 'queue_depth{queue="we\\"ird"} 4' in text
+	assert 'sockets{device="phone"} 3' in text
+
+
+def test_worker_snapshots_are_summed(tmp_path):
+	first, second = MetricsRegistry(), MetricsRegistry()
+	for registry, amount in ((first, 1), (second, 2)):
+		registry.counter("jobs_total", "Jobs.").inc(amount)
+		registry.histogram("latency_seconds", "Latency.", buckets = (1.0,)).observe(amount)
+
+	store = MultiprocessStore(str(tmp_path), stale_seconds = 60)
+	store.write(first.snapshot())
+	other = MultiprocessStore(str(tmp_path), stale_seconds = 60)
+	other.path = tmp_path / "worker-other.json"
+	other.write(second.snapshot())
+
+	merged = merge_snapshots(store.read_all())
+	assert merged["jobs_total"]["samples"]["[]"] == 3
+	assert merged["latency_seconds"]["samples"]["[]"] == [1, 1, 3]
+
+	store.remove()
+	assert len(store.read_all()) == 1
+
+
+def test_middleware_labels_requests_by_route_template():
+	app = FastAPI()
+	app.add_middleware(MetricsMiddleware)
+
+	@app.get("/items/{item_id}")
+	async def read_item(item_id: int):
+		return {"id":item_id}
+
+	client = TestClient(app)
+	client.get("/items/1")
+	client.get("/items/2")
+	client.get("/missing")
+
+	samples = REQUEST_DURATION.snapshot()["samples"]
+	assert samples['["GET", "/items/{item_id}", "200"]'][-1] > 0
+	assert sum(samples['["GET", "/items/{item_id}", "200"]'][:-1]) == 2
+	assert '["GET", "<unmatched>", "404"]' in samples
+
+
+def test_stages_are_recorded_only_inside_a_tracked_request():
+	with stage("outside"):
+		pass
+	with track("upload") as timer:
+		with stage("quota"):
+			pass
+		try:
+			with stage("move_to_final"):
+				raise OSError("disk full")
+		except OSError:
+			pass
+
+	assert [name for name, _ in timer.spans] == ["quota", "move_to_final"]
+	assert STAGE_DURATION.labels("upload", "quota").value()[-2] >= 0
+	assert STAGE_DURATION.labels("upload", "outside").value()[:-1] == [0] * (len(STAGE_DURATION.buckets) + 1)
+	header = timer.server_timing()
+	assert header.startswith("quota;dur=")
+	assert "move_to_final;dur=" in header and header.split(", ")[-1].startswith("total;dur=")
+
+
+def test_gauges_merge_by_multiprocess_mode():
+	first, second = MetricsRegistry(), MetricsRegistry()
+	for registry, amount in ((first, 2), (second, 5)):
+		registry.gauge("in_flight", "In flight.").set(amount)
+		registry.gauge("wait_max", "Longest wait.", multiprocess_mode = "max").set(amount)
+		registry.add_collector(lambda amount = amount:[
+			("pool_size", "Threads per worker.", {"pool":"disk"}, 4, "max"),
+			("queued", "Queued.", {"pool":"disk"}, amount),
+		])
+
+	merged = merge_snapshots([first.snapshot(), second.snapshot()])
+
+	assert merged["in_flight"]["samples"]["[]"] == 7
+	assert merged["wait_max"]["samples"]["[]"] == 5
+	assert merged["pool_size"]["samples"]['["disk"]'] == 4
+	assert merged["queued"]["samples"]['["disk"]'] == 7
+
+
+def test_metrics_endpoint_requires_a_token(monkeypatch):
+	client = TestClient(app)
+	monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+	assert client.get(settings.METRICS_PATH).status_code == 404
+
+	monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+	assert client.get(settings.METRICS_PATH).status_code == 401
+	response = client.get(settings.METRICS_PATH, headers = {"Authorization":"Bearer scrape-secret"})
+	assert response.status_code == 200
+	assert "sendme_executor_wait_seconds_total" in response.text
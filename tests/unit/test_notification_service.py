@@ -28,8 +28,8 @@ async def test_send_verification_mail_resend_logic(notification_service):
 	# 2. Patch the Resend SDK's send method.
 	# Since we use asyncio.to_thread in the service, we mock the underlying synchronous call.
 	with patch("resend.Emails.send") as mock_resend_send:
-		# 3. Patch the Jinja2 template loader ('load') to avoid I/O operations during unit tests.
-		with patch("app.services.notification_service.load.get_template") as mock_get_template:
+		# 3. Patch the template lookup to avoid I/O operations during unit tests.
+		with patch.object(notification_service, "get_template") as mock_get_template:
 			# Create a mock template and define its render behavior
 			mock_template = MagicMock()
 			mock_template.render.return_value = "<html>Mocked Email Body</html>"
@@ -71,7 +71,7 @@ async def test_send_verification_mail_api_failure(notification_service):
 	"""
 	# Simulate an unexpected exception from the Resend SDK
 	with patch("resend.Emails.send", side_effect = Exception("API Connection Timeout")):
-		with patch("app.services.notification_service.load.get_template"):
+		with patch.object(notification_service, "get_template"):
 			with pytest.raises(EmailDeliveryError) as exc_info:
 				await notification_service.send_verification_mail(
 					"fail@test.com", "user", "000000"
@@ -79,3 +79,18 @@ async def test_send_verification_mail_api_failure(notification_service):
 
 			# Verify the custom error message is passed through
 			assert "Failed to deliver verification email" in str(exc_info.value)
+
+
+def test_verification_mail_escapes_username(notification_service):
+	message = notification_service.build_verification_mail("u@example.com", "<script>x</script>", "123456")
+
+	assert "<script>" not in message["html"]
+	assert "&lt;script&gt;" in message["html"]
+	assert "123456" in message["html"]
+
+
+def test_templates_are_compiled_once(notification_service):
+	notification_service.warm_up()
+	template = notification_service.get_template("verification_code.html")
+
+	assert notification_service.get_template("verification_code.html") is template
@@ -0,0 +1,64 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.enums import MessageType
+from app.core.query_metrics import (
+	QUERIES_PER_REQUEST, QueryCountMiddleware, count_queries, normalize_sql, redact_parameters,
+)
+from app.core.settings import settings
+from app.storage.sqlalchemy_repo import MessageRepository
+
+
+def test_normalize_sql_collapses_parameters_and_in_lists():
+	first = normalize_sql("SELECT id FROM messages\n WHERE user_id = $1 AND id IN ($2, $3, $4) LIMIT 20")
+	second = normalize_sql("SELECT id FROM messages WHERE user_id = ? AND id IN (?, ?) LIMIT 50")
+
+	assert first == second == "SELECT id FROM messages WHERE user_id = ? AND id IN (?) LIMIT ?"
+
+
+def test_redact_parameters_hides_values():
+	assert redact_parameters(("secret@example.com", 7, None)) == "(str[18], int, None)"
+	assert redact_parameters({"password":"hunter2"}) == "{password: str[7]}"
+	assert redact_parameters([(1, b"xy"), (2, b"z")]) == "2 rows of (int, bytes[2])"
+
+
+async def test_queries_are_counted_per_context(db_session, assert_max_queries):
+	repo = MessageRepository(db_session)
+	message = await repo.create_message({"user_id":1, "type":MessageType.text, "content":"hi", "file_size":0})
+
+	with count_queries() as counter:
+		await repo.get_by_message_id(message.id)
+	assert counter.count == 1
+
+	with assert_max_queries(1):
+		await repo.delete_message(message.id)
+
+
+async def test_slow_queries_are_logged_without_parameter_values(db_session, monkeypatch, caplog):
+	monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 1e-9)
+	repo = MessageRepository(db_session)
+
+	with caplog.at_level(logging.WARNING, logger = "uvicorn.error"):
+		await repo.create_message({"user_id":1, "type":MessageType.text, "content":"top secret", "file_size":0})
+
+	slow = [record.getMessage() for record in caplog.records if "db.slow_query" in record.getMessage()]
+	assert slow and "INSERT INTO messages" in slow[0]
+	assert "top secret" not in "".join(slow)
+
+
+def test_middleware_observes_queries_per_route():
+	app = FastAPI()
+
+	@app.get("/items/{item_id}")
+	async def item(item_id: int):
+		return {"id":item_id}
+
+	app.add_middleware(QueryCountMiddleware)
+	child = QUERIES_PER_REQUEST.labels("GET", "/items/{item_id}")
+	before = child.value()[0]
+
+	assert TestClient(app).get("/items/1").status_code == 200
+	# No statements ran, so the request lands in the first (0) bucket.
+	assert child.value()[0] == before + 1
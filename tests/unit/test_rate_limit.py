@@ -0,0 +1,118 @@
+from fakeredis import aioredis as fake_aioredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import security
+from app.core.rate_limit import LocalTokenBuckets, RateLimiter, RateLimitMiddleware, RateLimitRule, _client_ip
+from app.core.settings import settings
+
+
+class BrokenRedis:
+	def register_script(self, _script):
+		async def _fail(**_kwargs):
+			raise ConnectionError("redis down")
+
+		return _fail
+
+
+def build_client(limiter: RateLimiter) -> TestClient:
+	app = FastAPI()
+
+	@app.get("/limited")
+	async def limited():
+		return {"ok":True}
+
+	@app.get("/free")
+	async def free():
+		return {"ok":True}
+
+	app.add_middleware(RateLimitMiddleware, limiter = limiter)
+	return TestClient(app)
+
+
+def test_rule_parse():
+	rule = RateLimitRule.parse("login", "10/60", "ip")
+	assert (rule.capacity, rule.period_seconds, rule.per) == (10, 60.0, "ip")
+	assert RateLimitRule.parse("off", "") is None
+	assert RateLimitRule.parse("off", "0/60") is None
+
+
+def test_local_bucket_refills_over_time():
+	buckets = LocalTokenBuckets()
+	assert buckets.take("k", capacity = 2, rate = 1, now = 0) == (True, 1, 0)
+	assert buckets.take("k", capacity = 2, rate = 1, now = 0) == (True, 0, 1000)
+	assert buckets.take("k", capacity = 2, rate = 1, now = 0.5) == (False, 0, 500)
+	assert buckets.take("k", capacity = 2, rate = 1, now = 1.5)[0] is True
+
+
+async def test_redis_bucket_is_shared_and_refills():
+	client = fake_aioredis.FakeRedis(decode_responses = True)
+	rule = RateLimitRule("text", 2, 2)
+	first = RateLimiter([], redis_client = client)
+	second = RateLimiter([], redis_client = client)
+
+	assert (await first.hit(rule, "user:1", now = 100)).allowed is True
+	assert (await second.hit(rule, "user:1", now = 100)).allowed is True
+	denied = await first.hit(rule, "user:1", now = 100)
+	assert denied.allowed is False
+	assert denied.retry_after == 1
+	assert (await second.hit(rule, "user:1", now = 101)).allowed is True
+	assert (await first.hit(rule, "user:2", now = 100)).allowed is True
+
+
+def test_middleware_sets_headers_and_rejects_with_retry_after():
+	limiter = RateLimiter(
+		[("GET", "/limited", RateLimitRule("limited", 2, 60, "ip"))],
+		redis_client = fake_aioredis.FakeRedis(decode_responses = True),
+	)
+	client = build_client(limiter)
+
+	ok = client.get("/limited")
+	assert ok.status_code == 200
+	assert ok.headers["RateLimit-Limit"] == "2"
+	assert ok.headers["RateLimit-Remaining"] == "1"
+	assert ok.headers["RateLimit-Policy"] == "2;w=60"
+
+	client.get("/limited")
+	denied = client.get("/limited")
+	assert denied.status_code == 429
+	assert denied.headers["Retry-After"] == "30"
+	assert denied.json() == {"detail":"Too many requests."}
+
+	assert "RateLimit-Limit" not in client.get("/free").headers
+
+
+def test_middleware_keys_authenticated_requests_by_user():
+	limiter = RateLimiter([("GET", "/limited", RateLimitRule("limited", 1, 60, "user"))])
+	client = build_client(limiter)
+	alice = {"Authorization":f"Bearer {security.create_access_token(1)}"}
+	bob = {"Authorization":f"Bearer {security.create_access_token(2)}"}
+
+	assert client.get("/limited", headers = alice).status_code == 200
+	assert client.get("/limited", headers = alice).status_code == 429
+	assert client.get("/limited", headers = bob).status_code == 200
+
+
+def test_falls_back_to_local_buckets_when_redis_is_down():
+	limiter = RateLimiter(
+		[("GET", "/limited", RateLimitRule("limited", 1, 60, "ip"))], redis_client = BrokenRedis()
+	)
+	client = build_client(limiter)
+
+	assert client.get("/limited").status_code == 200
+	assert client.get("/limited").status_code == 429
+
+
+def test_client_ip_takes_rightmost_hop_outside_trusted_proxies(monkeypatch):
+	monkeypatch.setattr(settings, "RATE_LIMIT_TRUST_FORWARDED_FOR", True)
+	monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", "10.0.0.0/8")
+	from_proxy = {"client":("10.1.2.3", 5000)}
+	spoofed = {"x-forwarded-for":"6.6.6.6, 203.0.113.7, 10.0.0.5"}
+
+	assert _client_ip(from_proxy, spoofed) == "203.0.113.7"
+	assert _client_ip(from_proxy, {"x-forwarded-for":"junk, 203.0.113.7"}) == "203.0.113.7"
+	# Direct connections cannot choose their bucket with the header.
+	assert _client_ip({"client":("198.51.100.9", 5000)}, spoofed) == "198.51.100.9"
+
+	monkeypatch.setattr(settings, "RATE_LIMIT_TRUST_FORWARDED_FOR", False)
+	assert _client_ip(from_proxy, spoofed) == "10.1.2.3"
@@ -0,0 +1,67 @@
+import pytest
+from fakeredis import aioredis as fake_aioredis
+
+from app.core.enums import OtpStatus
+from app.storage.redis_repo import RedisRepo
+
+EMAIL = "user@example.com"
+
+
+@pytest.fixture
+def redis_repo(monkeypatch):
+	client = fake_aioredis.FakeRedis(decode_responses = True)
+	monkeypatch.setattr("app.storage.redis_repo.aioredis.from_url", lambda *_args, **_kwargs: client)
+	return RedisRepo("redis://test")
+
+
+async def test_begin_otp_request_sets_otp_and_cooldown(redis_repo):
+	assert await redis_repo.begin_otp_request(EMAIL, "123456", otp_ex = 300, cooldown_ex = 60) == OtpStatus.ok
+
+	assert await redis_repo.get_otp(EMAIL) == "123456"
+	assert 0 < await redis_repo.client.ttl(f"auth:otp:cooldown:{EMAIL}") <= 60
+	assert await redis_repo.begin_otp_request(EMAIL, "654321") == OtpStatus.cooldown
+	assert await redis_repo.get_otp(EMAIL) == "123456"
+
+
+async def test_begin_otp_request_rejects_locked_email(redis_repo):
+	await redis_repo.lock_otp(EMAIL, ex = 600)
+
+	assert await redis_repo.begin_otp_request(EMAIL, "123456") == OtpStatus.locked
+	assert await redis_repo.get_otp(EMAIL) is None
+
+
+async def test_verify_otp_consumes_code_on_success(redis_repo):
+	await redis_repo.begin_otp_request(EMAIL, "123456")
+
+	assert await redis_repo.verify_otp(EMAIL, "123456") == OtpStatus.ok
+	assert await redis_repo.verify_otp(EMAIL, "123456") == OtpStatus.invalid
+	assert await redis_repo.has_otp_cooldown(EMAIL) is False
+
+
+async def test_verify_otp_counts_attempts_with_ttl_and_locks(redis_repo):
+	await redis_repo.begin_otp_request(EMAIL, "123456")
+
+	assert await redis_repo.verify_otp(EMAIL, "000000", max_attempts = 2, attempts_ex = 300) == OtpStatus.invalid
+	assert 0 < await redis_repo.client.ttl(f"auth:otp:attempts:{EMAIL}") <= 300
+	assert await redis_repo.verify_otp(EMAIL, "000000", max_attempts = 2, lock_ex = 600) == OtpStatus.invalid
+	assert await redis_repo.is_otp_locked(EMAIL) is True
+	assert await redis_repo.verify_otp(EMAIL, "123456") == OtpStatus.locked
+
+
+async def test_restore_otp_does_not_replace_newer_code(redis_repo):
+	await redis_repo.begin_otp_request(EMAIL, "123456")
+	assert await redis_repo.verify_otp(EMAIL, "123456") == OtpStatus.ok
+
+	assert await redis_repo.restore_otp(EMAIL, "123456") is True
+	assert await redis_repo.restore_otp(EMAIL, "999999") is False
+	assert await redis_repo.get_otp(EMAIL) == "123456"
+
+
+async def test_otp_request_status_is_read_only(redis_repo):
+	assert await redis_repo.otp_request_status(EMAIL) == OtpStatus.ok
+	await redis_repo.begin_otp_request(EMAIL, "123456")
+	assert await redis_repo.otp_request_status(EMAIL) == OtpStatus.cooldown
+	await redis_repo.lock_otp(EMAIL, ex = 600)
+	assert await redis_repo.otp_request_status(EMAIL) == OtpStatus.locked
+
+	assert await redis_repo.get_otp(EMAIL) == "123456"
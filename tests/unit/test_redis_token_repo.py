@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fakeredis import aioredis as fake_aioredis
+from redis.crc import key_slot
+
+from app.storage.exceptions import TokenNotFoundErrorByJti
+from app.storage.redis_token_repo import RedisRefreshTokenRepository, _token_key, _user_tokens_key
+from app.storage.sqlalchemy_repo import RefreshTokenRepository
+
+
+def _expires(days: int = 1) -> datetime:
+	return datetime.now(timezone.utc) + timedelta(days = days)
+
+
+@pytest.fixture
+def redis_client():
+	return fake_aioredis.FakeRedis(decode_responses = True)
+
+
+async def test_create_and_get_token_uses_native_ttl(redis_client):
+	repo = RedisRefreshTokenRepository(redis_client)
+	await repo.create_token_record(1, "jti-1", _expires())
+
+	token = await repo.get_unused_token("jti-1", 1)
+
+	assert token.user_id == 1
+	assert 0 < await redis_client.ttl("auth:refresh:{u1}:jti-1") <= 86400
+	assert await redis_client.smembers("auth:refresh:{u1}:set") == {"jti-1"}
+	with pytest.raises(TokenNotFoundErrorByJti):
+		await repo.get_unused_token("jti-1", 2)
+
+
+async def test_expired_token_is_not_stored(redis_client):
+	repo = RedisRefreshTokenRepository(redis_client)
+	await repo.create_token_record(1, "old", datetime.now(timezone.utc) - timedelta(minutes = 1))
+
+	with pytest.raises(TokenNotFoundErrorByJti):
+		await repo.get_unused_token("old", 1)
+
+
+async def test_rotate_token_is_single_use(redis_client):
+	repo = RedisRefreshTokenRepository(redis_client)
+	await repo.create_token_record(1, "jti-1", _expires())
+
+	assert await repo.rotate_token_record("jti-1", 1, "jti-2", _expires()) is True
+	assert await repo.rotate_token_record("jti-1", 1, "jti-3", _expires()) is False
+	assert await repo.rotate_token_record("jti-2", 2, "jti-4", _expires()) is False
+
+	assert (await repo.get_unused_token("jti-2", 1)).user_id == 1
+	assert await redis_client.smembers("auth:refresh:{u1}:set") == {"jti-2"}
+
+
+async def test_delete_token_and_all_user_tokens(redis_client):
+	repo = RedisRefreshTokenRepository(redis_client)
+	for jti in ("a", "b", "c"):
+		await repo.create_token_record(5, jti, _expires())
+	await repo.create_token_record(6, "other", _expires())
+
+	assert await repo.delete_token_record("a", 6) is False
+	assert await repo.delete_token_record("a", 5) is True
+	assert await repo.delete_token_record("a", 5) is False
+	assert await redis_client.smembers("auth:refresh:{u5}:set") == {"b", "c"}
+	assert await repo.delete_all_user_tokens(5) == 2
+
+	assert await redis_client.exists("auth:refresh:{u5}:b", "auth:refresh:{u5}:c", "auth:refresh:{u5}:set") == 0
+	assert (await repo.get_unused_token("other", 6)).user_id == 6
+
+
+async def test_legacy_sql_token_is_migrated_on_rotation(redis_client, db_session):
+	sql_repo = RefreshTokenRepository(db_session)
+	await sql_repo.create_token_record(9, "legacy", _expires())
+	repo = RedisRefreshTokenRepository(redis_client, fallback = sql_repo)
+
+	assert (await repo.get_unused_token("legacy", 9)).user_id == 9
+	assert await repo.rotate_token_record("legacy", 9, "fresh", _expires()) is True
+	assert await repo.rotate_token_record("legacy", 9, "again", _expires()) is False
+
+	assert await redis_client.get("auth:refresh:{u9}:fresh") == "9"
+	with pytest.raises(TokenNotFoundErrorByJti):
+		await sql_repo.get_unused_token("legacy")
+
+
+def test_keys_of_a_user_share_one_cluster_slot():
+	# Every script touches only these keys, so they must hash to the same slot.
+	keys = [_user_tokens_key(42), _token_key(42, "a"), _token_key(42, "b")]
+	assert len({key_slot(key.encode()) for key in keys}) == 1
@@ -0,0 +1,81 @@
+import asyncio
+
+from app.core.scheduler import MaintenanceScheduler
+
+
+async def test_run_job_records_removed_rows():
+	scheduler = MaintenanceScheduler()
+
+	async def _purge():
+		return 3
+
+	job = scheduler.add_job("purge", 60, _purge)
+	assert await scheduler.run_job(job) == 3
+	assert await scheduler.run_job(job) == 3
+
+	assert scheduler.stats()["purge"]["runs"] == 2
+	assert scheduler.stats()["purge"]["total_removed"] == 6
+
+
+async def test_failing_job_is_contained():
+	scheduler = MaintenanceScheduler()
+
+	async def _broken():
+		raise RuntimeError("boom")
+
+	job = scheduler.add_job("broken", 60, _broken)
+	assert await scheduler.run_job(job) == 0
+	assert job.runs == 0
+
+
+async def test_jobs_respect_concurrency_limit():
+	scheduler = MaintenanceScheduler(concurrency = 1)
+	running = 0
+	peak = 0
+
+	async def _job():
+		nonlocal running, peak
+		running += 1
+		peak = max(peak, running)
+		await asyncio.sleep(0.01)
+		running -= 1
+		return 1
+
+	scheduler.add_job("a", 60, _job)
+	scheduler.add_job("b", 60, _job)
+	scheduler.start()
+	await asyncio.sleep(0.05)
+	await scheduler.stop()
+
+	assert peak == 1
+	assert scheduler.stats()["a"]["runs"] == 1
+	assert scheduler.stats()["b"]["runs"] == 1
+
+
+async def test_batched_job_releases_slot_between_batches():
+	scheduler = MaintenanceScheduler(concurrency = 1)
+	backlog = 5
+	order = []
+
+	async def _purge_batch():
+		nonlocal backlog
+		removed = min(backlog, 2)
+		backlog -= removed
+		order.append("purge")
+		return removed
+
+	async def _cleanup():
+		order.append("cleanup")
+		return 0
+
+	scheduler.add_job("purge", 60, _purge_batch, batch_size = 2, backlog_pause_seconds = 0.001)
+	scheduler.add_job("cleanup", 0.002, _cleanup)
+	scheduler.start()
+	await asyncio.sleep(0.05)
+	await scheduler.stop()
+
+	assert backlog == 0
+	assert scheduler.stats()["purge"]["runs"] == 3
+	assert scheduler.stats()["purge"]["total_removed"] == 5
+	# The other job got the slot while the purge was still working through its backlog.
+	assert order.index("cleanup") < len(order) - 1 - order[::-1].index("purge")
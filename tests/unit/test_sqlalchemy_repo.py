@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, timezone
 
 import pytest
+from sqlalchemy import text
 
 from app.core.enums import MessageStatus, MessageType
 from app.storage.exceptions import MessageNotFoundError, TokenNotFoundErrorByJti, UserConstraintError, UserNotFoundErrorById
@@ -144,3 +145,118 @@ async def test_delete_all_user_tokens(db_session):
 	await repo.delete_all_user_tokens(user_id)
 	with pytest.raises(TokenNotFoundErrorByJti):
 		await repo.get_unused_token("jti1")
+
+
+async def test_rotate_token_record_consumes_old_token_once(db_session):
+	repo = RefreshTokenRepository(db_session)
+	expires = datetime.now(timezone.utc) + timedelta(days = 1)
+	await repo.create_token_record(7, "old-jti", expires)
+
+	assert await repo.rotate_token_record("old-jti", 7, "new-jti", expires) is True
+	assert await repo.rotate_token_record("old-jti", 7, "other-jti", expires) is False
+
+	assert (await repo.get_unused_token("new-jti")).user_id == 7
+	with pytest.raises(TokenNotFoundErrorByJti):
+		await repo.get_unused_token("old-jti")
+
+
+async def test_rotate_token_record_rejects_other_user(db_session):
+	repo = RefreshTokenRepository(db_session)
+	expires = datetime.now(timezone.utc) + timedelta(days = 1)
+	await repo.create_token_record(7, "owned-jti", expires)
+
+	assert await repo.rotate_token_record("owned-jti", 8, "new-jti", expires) is False
+	assert (await repo.get_unused_token("owned-jti")).user_id == 7
+
+
+async def test_delete_expired_tokens_in_batches(db_session):
+	repo = RefreshTokenRepository(db_session)
+	past = datetime.now(timezone.utc) - timedelta(hours = 1)
+	for i in range(3):
+		await repo.create_token_record(200, f"expired-{i}", past)
+	await repo.create_token_record(200, "live", datetime.now(timezone.utc) + timedelta(days = 1))
+
+	assert await repo.delete_expired_tokens(limit = 2) == 2
+	assert await repo.delete_expired_tokens(limit = 2) == 1
+	assert await repo.delete_expired_tokens(limit = 2) == 0
+	assert (await repo.get_unused_token("live")).user_id == 200
+
+
+async def test_expired_token_batches_use_the_expires_at_index(db_session):
+	plan = await db_session.execute(text(
+		"EXPLAIN QUERY PLAN SELECT jti FROM refresh_tokens WHERE expires_at <= CURRENT_TIMESTAMP LIMIT 100"
+	))
+
+	assert "ix_refresh_tokens_expires_at" in " ".join(str(row[-1]) for row in plan)
+
+
+async def test_history_rows_truncate_content_in_the_query(db_session):
+	repo = MessageRepository(db_session)
+	now = datetime.now(timezone.utc)
+	long_text = await repo.create_message(
+		{"user_id":300, "type":MessageType.text, "content":"x" * 50, "file_size":0, "created_at":now}
+	)
+	await repo.create_message(
+		{"user_id":300, "type":MessageType.text, "content":"short", "file_size":0, "created_at":now - timedelta(seconds = 1)}
+	)
+
+	full = await repo.get_history_rows(300)
+	cut = await repo.get_history_rows(300, content_chars = 10)
+
+	assert [(row.content, bool(row.content_truncated)) for row in full] == [("x" * 50, False), ("short", False)]
+	assert [(row.content, bool(row.content_truncated)) for row in cut] == [("x" * 10, True), ("short", False)]
+	assert (await repo.get_content(long_text.id)) == (300, "x" * 50)
+	with pytest.raises(MessageNotFoundError):
+		await repo.get_content(999999)
+
+
+async def test_get_all_by_user_returns_projected_rows(db_session):
+	repo = MessageRepository(db_session)
+	message = await repo.create_message(
+		{"user_id":301, "type":MessageType.file, "file_path":"301/a.bin", "file_size":3, "content":"unused"}
+	)
+
+	rows = await repo.get_all_by_user(301)
+
+	assert [(row.id, row.type, row.file_path) for row in rows] == [(message.id, MessageType.file, "301/a.bin")]
+
+
+async def test_user_writes_are_single_statements(user_db, assert_max_queries):
+	with assert_max_queries(1):
+		user = await user_db.create_user("returning_user", "password", _email("returning_user"))
+	assert user.id is not None and user.max_quota_bytes > 0 and user.created_at is not None
+
+	with assert_max_queries(1):
+		updated = await user_db.update_user(user.id, {"is_verified":True, "not_a_column":1})
+	assert updated.is_verified is True
+
+	with pytest.raises(UserNotFoundErrorById):
+		await user_db.update_user(999999, {"is_verified":True})
+
+
+async def test_message_writes_are_single_statements(db_session, assert_max_queries):
+	repo = MessageRepository(db_session)
+	with assert_max_queries(1):
+		message = await repo.create_message(
+			{"user_id":302, "type":MessageType.file, "file_path":"302/a.bin", "file_size":42}
+		)
+	assert message.id is not None and message.status == MessageStatus.processing and message.file_id is not None
+
+	with assert_max_queries(1):
+		await repo.update_message(message.id, MessageStatus.sent)
+	assert (await repo.get_by_message_id(message.id)).status == MessageStatus.sent
+	with pytest.raises(MessageNotFoundError):
+		await repo.update_message(999999, MessageStatus.sent)
+
+	with assert_max_queries(1):
+		deleted = await repo.delete_message_row(message.id)
+	assert (deleted.file_size, deleted.file_path, deleted.user_id) == (42, "302/a.bin", 302)
+	assert await repo.delete_message_row(message.id) is None
+	assert await repo.delete_message(message.id) == 0
+
+
+async def test_create_token_record_is_single_statement(db_session, assert_max_queries):
+	repo = RefreshTokenRepository(db_session)
+	with assert_max_queries(1):
+		token = await repo.create_token_record(303, "returning-jti", datetime.now(timezone.utc) + timedelta(days = 1))
+	assert token.jti == "returning-jti" and token.created_at is not None
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.router import router as message_router
+from app.realtime.encoding import EncodedEvent
+from app.realtime.sse import event_stream, format_sse
+from app.realtime.ws_manager import ConnectionManager
+
+
+class FakeRequest:
+	def __init__(self):
+		self.disconnected = False
+
+	async def is_disconnected(self):
+		return self.disconnected
+
+
+def test_format_sse_frame():
+	frame = format_sse(EncodedEvent({"event":"message.deleted", "message_id":3}), event_id = "abc-1")
+	assert frame == 'id: abc-1\nevent: message.deleted\ndata: {"event":"message.deleted","message_id":3}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_event_stream_delivers_and_unsubscribes():
+	manager = ConnectionManager()
+	request = FakeRequest()
+	stream = event_stream(request, manager, user_id = 1, keepalive_seconds = 0.01)
+
+	assert (await stream.__anext__()).startswith("retry:")
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":5})
+	frame = await stream.__anext__()
+	assert "event: message.updated" in frame
+	assert '"message_id":5' in frame
+
+	assert await stream.__anext__() == ": keepalive\n\n"
+	request.disconnected = True
+	with pytest.raises(StopAsyncIteration):
+		await asyncio.wait_for(stream.__anext__(), timeout = 1)
+	assert manager.subscriber_count(1) == 0
+
+
+def test_events_endpoint_requires_token():
+	app = FastAPI()
+	app.include_router(message_router, prefix = "/api/v1")
+	client = TestClient(app)
+
+	resp = client.get("/api/v1/messages/events")
+	assert resp.status_code == 401
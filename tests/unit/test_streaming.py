@@ -0,0 +1,72 @@
+import io
+from io import BytesIO
+
+import pytest
+
+from app.storage.exceptions import CapacityExceededError
+from app.storage.streaming import choose_chunk_size, stream_to_file
+
+
+class ReadOnlyStream:
+	"""A blocking stream without readinto()."""
+
+	def __init__(self, data: bytes):
+		self._stream = BytesIO(data)
+
+	def read(self, size: int = -1) -> bytes:
+		return self._stream.read(size)
+
+
+def test_choose_chunk_size_scales_with_hint(monkeypatch):
+	monkeypatch.setattr("app.storage.streaming.settings.UPLOAD_CHUNK_MIN_BYTES", 64 * 1024)
+	monkeypatch.setattr("app.storage.streaming.settings.UPLOAD_CHUNK_MAX_BYTES", 4 * 1024 * 1024)
+
+	assert choose_chunk_size(None) == 4 * 1024 * 1024
+	assert choose_chunk_size(10) == 64 * 1024
+	assert choose_chunk_size(300 * 1024) == 320 * 1024
+	assert choose_chunk_size(100 * 1024 * 1024) == 4 * 1024 * 1024
+
+
+async def test_sync_stream_is_copied_in_chunks(tmp_path, monkeypatch):
+	monkeypatch.setattr("app.storage.streaming.settings.UPLOAD_CHUNK_MAX_BYTES", 64 * 1024)
+	data = bytes(range(256)) * 1000
+	target = tmp_path / "copy.bin"
+
+	assert await stream_to_file(BytesIO(data), target) == len(data)
+	assert target.read_bytes() == data
+
+	fallback = tmp_path / "fallback.bin"
+	assert await stream_to_file(ReadOnlyStream(data), fallback) == len(data)
+	assert fallback.read_bytes() == data
+
+
+class ShortWriteFile(io.FileIO):
+	"""Accepts at most 1000 bytes per write(), like an os.write interrupted mid-chunk."""
+
+	def write(self, data) -> int:
+		return super().write(memoryview(data)[:1000])
+
+
+async def test_short_writes_are_retried(tmp_path, monkeypatch):
+	monkeypatch.setattr("app.storage.streaming.open", lambda path, *_args, **_kwargs: ShortWriteFile(path, "wb"), raising = False)
+	data = bytes(range(256)) * 100
+	target = tmp_path / "short-writes.bin"
+
+	assert await stream_to_file(BytesIO(data), target, size_hint = len(data)) == len(data)
+	assert target.read_bytes() == data
+
+
+async def test_overstated_size_hint_is_truncated(tmp_path):
+	target = tmp_path / "short.bin"
+
+	assert await stream_to_file(BytesIO(b"short"), target, size_hint = 4096) == 5
+	assert target.read_bytes() == b"short"
+
+
+async def test_size_limit_is_enforced(tmp_path, monkeypatch):
+	monkeypatch.setattr("app.storage.streaming.settings.MAX_FILE_SIZE_BYTES", 10)
+
+	with pytest.raises(CapacityExceededError):
+		await stream_to_file(BytesIO(b"x" * 11), tmp_path / "big.bin")
+	with pytest.raises(CapacityExceededError):
+		await stream_to_file(BytesIO(b""), tmp_path / "declared.bin", size_hint = 11)
@@ -0,0 +1,52 @@
+import pytest
+
+from app.core import security
+from app.core.security import get_user_id_from_token
+from app.core.token_cache import VerifiedTokenCache, verified_token_cache
+
+
+def test_cache_hit_miss_and_expiry():
+	cache = VerifiedTokenCache(max_entries = 10)
+
+	assert cache.get("token", now = 100) is None
+	cache.put("token", 7, exp = 200)
+	assert cache.get("token", now = 150) == 7
+	assert cache.get("token", now = 200) is None
+	assert len(cache) == 0
+	assert cache.stats() == {"entries":0, "hits":1, "misses":2}
+
+
+def test_cache_evicts_least_recently_used():
+	cache = VerifiedTokenCache(max_entries = 2)
+	cache.put("a", 1, exp = 1000)
+	cache.put("b", 2, exp = 1000)
+	assert cache.get("a", now = 0) == 1
+
+	cache.put("c", 3, exp = 1000)
+
+	assert cache.get("b", now = 0) is None
+	assert cache.get("a", now = 0) == 1
+	assert cache.get("c", now = 0) == 3
+
+
+def test_get_user_id_from_token_uses_cache(monkeypatch):
+	verified_token_cache.clear()
+	token = security.create_access_token(42)
+
+	assert get_user_id_from_token(token) == 42
+
+	def _fail_decode(*_args, **_kwargs):
+		raise AssertionError("token should not be decoded again")
+
+	monkeypatch.setattr("app.core.security.jwt.decode", _fail_decode)
+	assert get_user_id_from_token(token) == 42
+	assert verified_token_cache.hits == 1
+
+
+def test_get_user_id_from_token_does_not_cache_invalid_tokens():
+	verified_token_cache.clear()
+	refresh_token = security.create_refresh_token(42, "jti")
+
+	with pytest.raises(ValueError):
+		get_user_id_from_token(refresh_token)
+	assert len(verified_token_cache) == 0
@@ -1,8 +1,16 @@
+import asyncio
+import json
 from unittest.mock import AsyncMock
 
 import pytest
 
-from app.realtime.ws_manager import ConnectionManager
+from app.realtime.ws_manager import RESET_EVENT, ConnectionManager
+
+
+async def _drain():
+	"""Let socket writer tasks run."""
+	for _ in range(5):
+		await asyncio.sleep(0)
 
 
 @pytest.mark.asyncio
@@ -12,10 +20,10 @@ async def test_connect_and_disconnect():
 
 	await manager.connect(1, ws)
 	ws.accept.assert_awaited_once()
-	assert ws in manager._connections[1]
+	assert manager.get_channel(1, ws) is not None
 
 	manager.disconnect(1, ws)
-	assert 1 not in manager._connections
+	assert manager.connection_count(1) == 0
 
 
 @pytest.mark.asyncio
@@ -23,21 +31,364 @@ async def test_send_personal_message_success():
 	manager = ConnectionManager()
 	ws1 = AsyncMock()
 	ws2 = AsyncMock()
-	manager._connections[1] = {ws1, ws2}
+	await manager.connect(1, ws1)
+	await manager.connect(1, ws2)
 
 	payload = {"event":"message.updated", "message_id":1}
 	await manager.send_personal_message(1, payload)
+	await _drain()
 
-	ws1.send_json.assert_awaited_once_with(payload)
-	ws2.send_json.assert_awaited_once_with(payload)
+	ws1.send_text.assert_awaited_once_with(json.dumps(payload, separators = (",", ":")))
+	ws2.send_text.assert_awaited_once_with(json.dumps(payload, separators = (",", ":")))
+	manager.disconnect(1, ws1)
+	manager.disconnect(1, ws2)
 
 
 @pytest.mark.asyncio
 async def test_broadcast_alias():
 	manager = ConnectionManager()
 	ws = AsyncMock()
-	manager._connections[9] = {ws}
+	await manager.connect(9, ws)
 
 	payload = {"event":"message.deleted", "message_id":99}
 	await manager.broadcast_to_user(9, payload)
-	ws.send_json.assert_awaited_once_with(payload)
+	await _drain()
+	ws.send_text.assert_awaited_once_with(json.dumps(payload, separators = (",", ":")))
+	manager.disconnect(9, ws)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_returns_before_slow_socket_sends():
+	manager = ConnectionManager()
+	release = asyncio.Event()
+
+	async def _blocked_send(_payload):
+		await release.wait()
+
+	slow = AsyncMock()
+	slow.send_text.side_effect = _blocked_send
+	fast = AsyncMock()
+	await manager.connect(1, slow)
+	await manager.connect(1, fast)
+
+	await asyncio.wait_for(manager.broadcast_to_user(1, {"event":"message.deleted", "message_id":1}), timeout = 0.1)
+	await _drain()
+
+	fast.send_text.assert_awaited_once()
+	release.set()
+	manager.disconnect(1, slow)
+	manager.disconnect(1, fast)
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_coalesces_updates(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_SEND_QUEUE_SIZE", 2)
+	manager = ConnectionManager()
+	release = asyncio.Event()
+
+	async def _blocked_send(_payload):
+		await release.wait()
+
+	ws = AsyncMock()
+	ws.send_text.side_effect = _blocked_send
+	await manager.connect(1, ws)
+	await manager.send_personal_message(1, {"event":"message.deleted", "message_id":1})
+	await _drain()  # writer is now blocked sending message 1
+
+	for message_id in (2, 3, 2):
+		await manager.send_personal_message(1, {"event":"message.updated", "message_id":message_id})
+	channel = manager.get_channel(1, ws)
+	assert [event.payload["message_id"] for event in channel.queue] == [3, 2]
+	assert channel.dropped == 0
+
+	# Updates for different messages merge into one without an id, forcing a full refetch.
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":4})
+	assert [event.payload for event in channel.queue] == [
+		{"event":"message.updated", "message_id":2}, {"event":"message.updated"},
+	]
+	assert channel.dropped == 0
+	release.set()
+	manager.disconnect(1, ws)
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_evicted(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_SEND_QUEUE_SIZE", 1)
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_SLOW_CONSUMER_SECONDS", 0)
+	manager = ConnectionManager()
+	async def _stalled_send(_payload):
+		await asyncio.Event().wait()
+
+	ws = AsyncMock()
+	ws.send_text.side_effect = _stalled_send
+	await manager.connect(1, ws)
+	await manager.send_personal_message(1, {"event":"message.deleted", "message_id":1})
+	await _drain()
+
+	for message_id in (2, 3, 4):
+		await manager.send_personal_message(1, {"event":"message.deleted", "message_id":message_id})
+		await asyncio.sleep(0.001)
+	await _drain()
+
+	assert manager.connection_count(1) == 0
+	ws.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_consumer_draining_a_frame_at_a_time_is_still_evicted(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_SEND_QUEUE_SIZE", 4)
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_SLOW_CONSUMER_SECONDS", 0.05)
+	manager = ConnectionManager()
+	frame_taken = asyncio.Event()
+	allow_one = asyncio.Semaphore(0)
+
+	async def _trickle_send(_payload):
+		await allow_one.acquire()
+		frame_taken.set()
+
+	ws = AsyncMock()
+	ws.send_text.side_effect = _trickle_send
+	await manager.connect(1, ws)
+
+	message_id = 0
+	for _ in range(20):
+		# Keep the queue topped up, then let the client take exactly one frame.
+		while len(manager.get_channel(1, ws).queue) < 4:
+			message_id += 1
+			await manager.send_personal_message(1, {"event":"message.deleted", "message_id":message_id})
+			await _drain()
+		message_id += 1
+		await manager.send_personal_message(1, {"event":"message.deleted", "message_id":message_id})
+		if manager.connection_count(1) == 0:
+			break
+		frame_taken.clear()
+		allow_one.release()
+		await frame_taken.wait()
+		await asyncio.sleep(0.01)
+	await _drain()
+
+	assert manager.connection_count(1) == 0
+	ws.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_send_disconnects_socket():
+	manager = ConnectionManager()
+	ws = AsyncMock()
+	ws.send_text.side_effect = RuntimeError("closed")
+	await manager.connect(1, ws)
+
+	await manager.send_personal_message(1, {"event":"message.deleted", "message_id":1})
+	await _drain()
+
+	assert manager.connection_count(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_subscribe_replays_events_after_last_event_id():
+	manager = ConnectionManager()
+	first = manager.subscribe(1)
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":1})
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":2})
+	first_id, _ = first.queue.get_nowait()
+	manager.unsubscribe(first)
+
+	resumed = manager.subscribe(1, last_event_id = first_id)
+	_, event = resumed.queue.get_nowait()
+	assert event.payload == {"event":"message.updated", "message_id":2}
+	assert resumed.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_resets_when_gap_left_buffer():
+	manager = ConnectionManager(replay_buffer_size = 2)
+	subscription = manager.subscribe(1)
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":1})
+	first_id, _ = subscription.queue.get_nowait()
+	manager.unsubscribe(subscription)
+	for message_id in (2, 3, 4):
+		await manager.send_personal_message(1, {"event":"message.updated", "message_id":message_id})
+
+	resumed = manager.subscribe(1, last_event_id = first_id)
+	assert resumed.queue.get_nowait() == (None, RESET_EVENT)
+	assert [resumed.queue.get_nowait()[1].payload["message_id"] for _ in range(2)] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_resets_after_user_buffer_was_evicted():
+	manager = ConnectionManager(replay_max_users = 1)
+	subscription = manager.subscribe(1)
+	for message_id in (1, 2, 3):
+		await manager.send_personal_message(1, {"event":"message.updated", "message_id":message_id})
+	first_id, _ = subscription.queue.get_nowait()
+	manager.unsubscribe(subscription)
+	await manager.send_personal_message(2, {"event":"message.updated", "message_id":4})
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":5})
+
+	resumed = manager.subscribe(1, last_event_id = first_id)
+	assert resumed.queue.get_nowait() == (None, RESET_EVENT)
+	assert resumed.queue.get_nowait()[1].payload["message_id"] == 5
+	assert resumed.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_resets_on_unknown_event_id():
+	manager = ConnectionManager()
+	subscription = manager.subscribe(1, last_event_id = "otherepoch-5")
+	assert subscription.queue.get_nowait() == (None, RESET_EVENT)
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.SSE_QUEUE_SIZE", 1)
+	manager = ConnectionManager(replay_buffer_size = 0)
+	subscription = manager.subscribe(1)
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":1})
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":2})
+
+	assert subscription.overflowed is True
+	assert manager.subscriber_count(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_broadcast_all_encodes_once(monkeypatch):
+	calls = []
+
+	def _encode(payload):
+		calls.append(payload)
+		return json.dumps(payload)
+
+	monkeypatch.setattr("app.realtime.encoding.encode_json", _encode)
+	manager = ConnectionManager()
+	sockets = [AsyncMock() for _ in range(3)]
+	for user_id, ws in enumerate(sockets):
+		await manager.connect(user_id, ws)
+
+	await manager.broadcast_all({"event":"maintenance"})
+	await _drain()
+
+	assert len(calls) == 1
+	for user_id, ws in enumerate(sockets):
+		ws.send_text.assert_awaited_once_with('{"event": "maintenance"}')
+		manager.disconnect(user_id, ws)
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_msgpack_socket_receives_binary_frames():
+	msgpack = pytest.importorskip("msgpack")
+	manager = ConnectionManager()
+	ws = AsyncMock()
+	await manager.connect(1, ws, subprotocol = "sendme.msgpack")
+
+	await manager.send_personal_message(1, {"event":"message.updated", "message_id":1})
+	await _drain()
+
+	ws.accept.assert_awaited_once_with(subprotocol = "sendme.msgpack")
+	frame = ws.send_bytes.await_args.args[0]
+	assert msgpack.unpackb(frame) == {"event":"message.updated", "message_id":1}
+	manager.disconnect(1, ws)
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_connect_rejects_over_per_user_cap(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_MAX_SOCKETS_PER_USER", 1)
+	manager = ConnectionManager()
+	first, second = AsyncMock(), AsyncMock()
+
+	assert await manager.connect(1, first) is True
+	assert await manager.connect(1, second) is False
+	second.accept.assert_not_awaited()
+	second.close.assert_awaited_once()
+
+	manager.disconnect(1, first)
+	assert manager._heartbeat_task is None
+
+
+@pytest.mark.asyncio
+async def test_sweep_pings_then_reaps_silent_socket(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_PING_INTERVAL_SECONDS", 10)
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_PONG_TIMEOUT_SECONDS", 5)
+	manager = ConnectionManager()
+	ws = AsyncMock()
+	await manager.connect(1, ws)
+	channel = manager.get_channel(1, ws)
+	start = channel.last_seen
+
+	assert manager.sweep(now = start + 11) == 0
+	await _drain()
+	ws.send_text.assert_awaited_once_with('{"event":"ping"}')
+
+	assert manager.sweep(now = start + 17) == 1
+	await _drain()
+	assert manager.connection_count(1) == 0
+	ws.close.assert_awaited_once_with(code = 1001, reason = "heartbeat timeout")
+
+
+@pytest.mark.asyncio
+async def test_touch_answers_pending_ping(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_PING_INTERVAL_SECONDS", 10)
+	manager = ConnectionManager()
+	ws = AsyncMock()
+	await manager.connect(1, ws)
+	channel = manager.get_channel(1, ws)
+
+	manager.sweep(now = channel.last_seen + 11)
+	assert channel.ping_sent_at is not None
+	manager.touch(1, ws)
+	assert channel.ping_sent_at is None
+	assert manager.sweep() == 0
+
+	manager.disconnect(1, ws)
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_sweep_reaps_idle_socket(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_IDLE_TIMEOUT_SECONDS", 30)
+	manager = ConnectionManager()
+	ws = AsyncMock()
+	await manager.connect(1, ws)
+
+	assert manager.sweep(now = manager.get_channel(1, ws).last_seen + 31) == 1
+	await _drain()
+	assert manager.connection_count(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_registry_introspection_by_shard_and_device():
+	manager = ConnectionManager(shard_count = 4)
+	sockets = [(1, AsyncMock(), "phone"), (5, AsyncMock(), "desktop"), (2, AsyncMock(), "phone")]
+	for user_id, ws, device in sockets:
+		await manager.connect(user_id, ws, device = device)
+
+	assert manager.connection_count() == 3
+	assert manager.shard_counts() == [0, 2, 1, 0]
+	assert manager.device_counts() == {"phone":2, "desktop":1}
+	assert manager.stats()["users"] == 3
+
+	for user_id, ws, _ in sockets:
+		manager.disconnect(user_id, ws)
+	assert manager.shard_counts() == [0, 0, 0, 0]
+	await _drain()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_all_reaches_every_shard_in_batches(monkeypatch):
+	monkeypatch.setattr("app.realtime.ws_manager.settings.REALTIME_BROADCAST_BATCH_SIZE", 2)
+	manager = ConnectionManager(shard_count = 3)
+	sockets = {user_id:AsyncMock() for user_id in range(10)}
+	for user_id, ws in sockets.items():
+		await manager.connect(user_id, ws)
+
+	await manager.broadcast_all({"event":"system.notice"})
+	await _drain()
+
+	for ws in sockets.values():
+		ws.send_text.assert_awaited_once_with('{"event":"system.notice"}')
+	for user_id, ws in sockets.items():
+		manager.disconnect(user_id, ws)
+	await _drain()